@@ -1,8 +1,9 @@
-import os, sys, yaml
+import os, sys
+from time import perf_counter
 import numpy as np
 import pyqtgraph as pg
 from PyQt6 import QtCore, QtGui
-from lib import ScanalyzerGUI, DataProcessing, FileFunctions, Spectralyzer
+from lib import ScanalyzerGUI, DataProcessing, FileFunctions, Spectralyzer, ThumbnailCache
 from PyQt6.QtWidgets import QApplication as QApp
 
 
@@ -38,7 +39,7 @@ class Scanalyzer(QtCore.QObject):
         icon_folder = os.path.join(scanalyzer_folder, "icons") # The directory of the icon files
         
         data_folder = sys_folder # Set current folder to the config file; read from the config file later to reset it to a data folder
-        metadata_file = os.path.join(data_folder, "metadata.yml") # Metadata file that is populated with all the scan and spectroscopy metadata of the files in the data folder
+        metadata_file = os.path.join(data_folder, "metadata.sqlite") # Metadata index that is populated with all the scan and spectroscopy metadata of the files in the data folder
         output_folder_name = "Extracted Files"
 
         self.paths = {
@@ -81,6 +82,27 @@ class Scanalyzer(QtCore.QObject):
         self.file_functions = FileFunctions()
         self.data = DataProcessing()
 
+        self.thumbnail_cache = None
+        self.ingestion_start_time = perf_counter() # Of the header stage that is reported by on_ingestion_progress
+
+        # While browsing through the files, the cached previews are shown right away. The scan is only decoded once browsing pauses
+        self.browse_timer = QtCore.QTimer()
+        self.browse_timer.setSingleShot(True)
+        self.browse_timer.setInterval(250)
+        self.browse_timer.timeout.connect(lambda: self.load_process_display(new_scan = True))
+
+        # Mipmap pyramid of the processed scan. Levels are shown according to the zoom; only the visible region is uploaded when a level exceeds max_display_size
+        self.image_pyramid = []
+        self.displayed_region = None # (level, first row, last row, first column, last column), in pixels of that level
+        self.max_display_size = 2048
+        self.updating_display = False
+
+        # Scans that are still being recorded are followed by polling the file for new lines
+        self.live_tail = None
+        self.live_timer = QtCore.QTimer()
+        self.live_timer.setInterval(1000)
+        self.live_timer.timeout.connect(self.on_live_poll)
+
     def connect_buttons(self) -> None:
         buttons = self.gui.buttons
         radio_buttons = self.gui.radio_buttons
@@ -103,7 +125,7 @@ class Scanalyzer(QtCore.QObject):
                        
                        ["spec_info", self.load_process_display], ["spec_locations", self.on_toggle_spec_locations], ["spectralyzer", self.open_spectralyzer],
                        
-                       ["save_png", self.on_save_png], ["save_svg", self.on_save_svg], ["save_hdf5", self.on_save_png], ["reset", self.create_file_name],
+                       ["save_png", self.on_save_png], ["save_svg", self.on_save_svg], ["save_hdf5", self.on_save_hdf5], ["reset", self.create_file_name],
                        ["output_folder", lambda: self.open_folder("output_folder")], ["info", self.gui.info_box.exec], ["exit", self.on_exit]
                        ]
         
@@ -150,6 +172,7 @@ class Scanalyzer(QtCore.QObject):
         self.hist_item.sigLevelChangeFinished.connect(self.histogram_scale_changed)
         
         self.gui.dataDropped.connect(self.on_receive_filename)
+        self.gui.image_view.getView().getViewBox().sigRangeChanged.connect(self.on_view_range_changed)
 
         return
 
@@ -161,16 +184,17 @@ class Scanalyzer(QtCore.QObject):
         self.file_index += index
         if self.file_index < 0: self.file_index = len(scan_dict) - 2 # scan_dict has 1 element called scan_dict, which should be disregarded
         if self.file_index > len(self.files_dict.get("scan_files")) - 2: self.file_index = 0
-        self.load_process_display(new_scan = True)
+        if self.show_preview(): self.browse_timer.start() # Restarted on every step, so only the scan where browsing stops is decoded
+        else: self.load_process_display(new_scan = True)
         return
 
     def on_select_file(self) -> None:
-        file_path, _ = self.gui.dialog.getOpenFileName(None, "Open file", self.paths["data_folder"], "SXM files (*.sxm);;Dat files (*.dat);;HDF5 files (*.hdf5)")
+        file_path, _ = self.gui.dialog.getOpenFileName(None, "Open file", self.paths["data_folder"], "SXM files (*.sxm);;Dat files (*.dat);;HDF5 files (*.hdf5);;Archives (*.zip *.session.hdf5 *.sxm.gz)")
         if file_path: self.load_folder(file_path)
         return
 
     def on_receive_filename(self, file_name: str) -> None:
-        if os.path.exists(file_name): self.load_folder(file_name)
+        if self.file_functions.archives.exists(file_name): self.load_folder(file_name)
         
         return
 
@@ -211,11 +235,11 @@ class Scanalyzer(QtCore.QObject):
     def load_folder(self, file_path: str = "") -> None:
         buttons = self.gui.buttons
         labels = self.gui.labels
-        folder_name = file_path
+        archives = self.file_functions.archives
         
-        # Get the folder from the file name
-        if os.path.isfile(file_path): folder_name = os.path.dirname(file_path)
-        if not os.path.isdir(folder_name):
+        # Get the folder from the file name. Zip archives are opened as folders
+        folder_name = archives.get_folder(file_path)
+        if folder_name is None:
             print("Error loading files")
             return
 
@@ -227,8 +251,8 @@ class Scanalyzer(QtCore.QObject):
         try:
             # Set the paths according to what file was selected
             self.paths["data_folder"] = folder_name
-            self.paths["metadata_file"] = os.path.join(self.paths["data_folder"], "metadata.yml") # Set the metadata.yml file accordingly as well
-            self.paths["output_folder"] = os.path.join(self.paths["data_folder"], self.paths["output_folder_name"]) # Set the output folder name
+            self.paths["metadata_file"] = archives.get_sidecar_path(self.paths["data_folder"], "metadata.sqlite") # Set the metadata index accordingly as well (next to the archive for archives)
+            self.paths["output_folder"] = archives.get_sidecar_path(self.paths["data_folder"], self.paths["output_folder_name"]) # Set the output folder name
 
 
 
@@ -238,7 +262,7 @@ class Scanalyzer(QtCore.QObject):
                 print(f"Error creating the files dictionary: {error}")
             [scan_file_names, spec_file_names] = self.file_functions.get_file_name_lists(files_dict)
             
-            # 2. Try to find the files dictionary already present in the metadata.yml file, considering it exists
+            # 2. Try to find the files dictionary already present in the metadata index, considering it exists
             (loaded_files_dict, error) = self.file_functions.load_metadata_file(self.paths["metadata_file"])
             if "spectroscopy_files" in loaded_files_dict.keys() and "scan_files" in loaded_files_dict.keys(): # File loaded successfully. Roll with it
                 [loaded_scan_file_names, loaded_spec_file_names] = self.file_functions.get_file_name_lists(loaded_files_dict)
@@ -263,31 +287,29 @@ class Scanalyzer(QtCore.QObject):
                 print(f"Scan entries: {corrupt_scan_files}")
                 print(f"Spectroscopy entries: {corrupt_spec_files}")
                 rebuild_metadata = True
+            
+            # Files that were saved again or are still growing since the metadata file was written are detected by their fingerprints
+            (changed_scan_files, changed_spec_files) = self.file_functions.find_changed_files(loaded_files_dict, folder_name)
+            changed_scan_files = [file_name for file_name in changed_scan_files if file_name in scan_file_names]
+            changed_spec_files = [file_name for file_name in changed_spec_files if file_name in spec_file_names]
+            if len(changed_scan_files) > 0 or len(changed_spec_files) > 0:
+                print("I found files that changed since the metadata file was written")
+                print(f"Scans: {changed_scan_files}")
+                print(f"Spectroscopy files: {changed_spec_files}")
+                rebuild_metadata = True
                 
-            # 3. Update the metadata.yml file if new files are found
+            # 3. Update the metadata index if new files are found
             if rebuild_metadata:
-                # 3a: Populate it with spectroscopy headers
-                (files_dict, error) = self.file_functions.populate_spectroscopy_headers(files_dict, folder_name)
-                if error:
-                    print(f"Error populating spectroscopy headers: {error}")
-                    return
-                
-                # 3b: Populate it with scan headers
-                (files_dict, error) = self.file_functions.populate_scan_headers(files_dict, folder_name)
+                # 3a-c: Read the headers of the new and changed files only, reuse the loaded metadata of the other files, and associate the affected spectra with scans
+                (files_dict, error) = self.file_functions.refresh_files_dict(files_dict, loaded_files_dict, folder_name, (changed_scan_files, changed_spec_files), progress_callback = self.on_ingestion_progress)
                 if error:
-                    print(f"Error populating scan headers: {error}")
+                    print(f"Error refreshing the scan and spectroscopy metadata: {error}")
                     return
                 
-                # 3c: Use the scan headers and spectroscopy headers to associate spectra with scans, and update the dictionary accordingly
-                (files_dict, error) = self.file_functions.populate_associated_scans(files_dict)
-                if error:
-                    print(f"Error associating spectra and scans: {error}")
-                    return
-                
-                # 3d: Save the fully populated dicts to a metadata.yml file
+                # 3d: Save the fully populated dicts to the metadata index
                 error = self.file_functions.save_files_dict(files_dict, folder_name)
                 if error:
-                    print(f"Error saving the files_dict to the metadata.yml file: {error}")
+                    print(f"Error saving the files_dict to the metadata index: {error}")
                     return
                 
                 print(f"Loaded all scan and spectroscopy metadata and saved to file {self.paths["metadata_file"]}")
@@ -297,19 +319,19 @@ class Scanalyzer(QtCore.QObject):
             else:
                 self.files_dict = loaded_files_dict
 
+            # 5: Build the thumbnail previews of new and changed scans in the background
+            if self.thumbnail_cache: self.thumbnail_cache.stop()
+            self.thumbnail_cache = ThumbnailCache(self.file_functions, folder_name)
+            self.thumbnail_cache.build_in_background(self.file_functions.get_file_name_lists(self.files_dict)[0])
+
 
             
-            # Match the requested file (full path) to the entry in the scan_files dict to extract the key. The key is an integer and is called self.file_index            
+            # Match the requested file (full path) to the entry in the scan_files dict to extract the key. The key is an integer and is called self.file_index
+            # A map from file name to key is used, instead of comparing every entry with the requested file on disk
             scan_dict = self.files_dict.get("scan_files")
+            scan_indices = {os.path.normpath(single_file_dict.get("file_name")): key for key, single_file_dict in scan_dict.items() if isinstance(single_file_dict, dict)}
             self.file_index = 0 # Initialize to zero and update when a matching file name is found
-            for key, single_file_dict in scan_dict.items():
-                if not isinstance(single_file_dict, dict): continue
-                
-                dict_file_path = os.path.join(self.paths["data_folder"], single_file_dict.get("file_name"))
-                
-                if os.path.samefile(dict_file_path, file_path):
-                    self.file_index = key
-                    break
+            if os.path.normpath(file_path) != os.path.normpath(folder_name): self.file_index = scan_indices.get(os.path.relpath(file_path, folder_name), 0)
             if self.file_index > len(scan_dict) - 2: self.file_index = 0 # Roll over if the selected file index is too large
             
             # Update folder/contents labels
@@ -335,7 +357,40 @@ class Scanalyzer(QtCore.QObject):
         
         return
 
+    def on_ingestion_progress(self, n_done: int, n_total: int, description: str = "headers") -> None:
+        if n_done == 0: self.ingestion_start_time = perf_counter()
+        
+        # Update the splash screen about once per percent, to keep the event loop cost low on large folders. The last update reports the throughput
+        if n_done < n_total and n_done % max(1, n_total // 100) != 0: return
+        message = f"Reading {description}: {n_done} / {n_total}"
+        if n_done == n_total and n_total > 0:
+            elapsed_time = perf_counter() - self.ingestion_start_time
+            message = f"Read {n_total} {description} in {elapsed_time:.2f} s ({n_total / max(elapsed_time, 1E-9):.0f} files/s)"
+            print(message)
+        self.gui.splash_screen.showMessage(message, QtCore.Qt.AlignmentFlag.AlignBottom | QtCore.Qt.AlignmentFlag.AlignHCenter)
+        QApp.processEvents()
+        return
+
+    def show_preview(self) -> bool:
+        # Show the thumbnail of the selected channel from the thumbnail cache. Returns False if the scan has no current thumbnail
+        scan_file_entry = self.files_dict.get("scan_files", {}).get(self.file_index)
+        if not self.thumbnail_cache or not isinstance(scan_file_entry, dict): return False
+        preview = self.thumbnail_cache.get_preview(scan_file_entry.get("file_name"), self.channel)
+        if preview is None: return False
+
+        self.gui.buttons["select_file"].setText(scan_file_entry.get("file_name"))
+        [w, h] = (scan_file_entry.get("frame") or {}).get("scan_range (nm)") or preview.shape[::-1]
+        self.displayed_region = None # The pyramid of the previous scan does not belong to the preview
+        self.updating_display = True
+        self.gui.image_view.setImage(preview, autoRange = False)
+        self.gui.image_view.getImageItem().setRect(QtCore.QRectF(- w / 2, - h / 2, w, h))
+        self.updating_display = False
+        return True
+
     def load_process_display(self, new_scan: bool = False) -> None:
+        if self.browse_timer.isActive(): # A preview is shown, and the scan itself was not decoded yet
+            self.browse_timer.stop()
+            new_scan = True
         if new_scan or not hasattr(self, "current_scan"):
             (self.current_scan, channel, frame, error) = self.load_scan_file()
             self.frame = frame
@@ -374,11 +429,18 @@ class Scanalyzer(QtCore.QObject):
 
         # Load the scan object using nanonispy2. Update the channels combobox according to the channels present in the scan
         try:
-            (scan_object, error) = self.file_functions.get_scan(scan_file_path, units = {"length": "nm", "current": "pA"})
+            (scan_object, error) = self.file_functions.get_scan(scan_file_path, units = {"length": "nm", "current": "pA"}, lazy = True, dtype = self.data.get_real_dtype())
             if error: raise
 
             channels = scan_object.channels
             comboboxes["channels"].renewItems(channels)
+
+            # Follow the file if the scan is unfinished, as it may still be recording
+            self.live_timer.stop()
+            self.live_tail = None
+            if scan_object.lines < scan_object.lines_uncropped and not self.file_functions.archives.is_virtual(scan_file_path): # Archived scans are not recorded anymore
+                self.live_tail = self.file_functions.sxm.open_live_tail(scan_file_path)
+                self.live_timer.start()
         except Exception as e:
             print(f"{e}")        
         
@@ -407,6 +469,24 @@ class Scanalyzer(QtCore.QObject):
 
         return (image, selected_channel, frame, error)
 
+    def on_live_poll(self) -> None:
+        # Only the lines recorded since the previous poll are read from the file
+        try:
+            if not self.live_tail.poll():
+                if self.live_tail.abandoned: self.live_timer.stop() # An aborted scan is not followed forever
+                return
+            
+            (scan_object, error) = self.file_functions.sxm.get_scan_object(self.live_tail.file_path, units = {"length": "nm", "current": "pA"}, live_tail = self.live_tail, dtype = self.data.get_real_dtype())
+            if error: raise Exception(error)
+            (self.current_scan, selected_channel, self.frame, error) = self.data.pick_image_from_scan_object(scan_object)
+            self.load_process_display()
+            
+            if self.live_tail.finished: self.live_timer.stop()
+        except Exception as e:
+            print(f"Problem refreshing the scan that is being recorded: {e}")
+            self.live_timer.stop()
+        return
+
     def check_if_saved_files_exist(self):
         self.paths["output_file_basename"] = self.gui.line_edits["file_name"].text()
 
@@ -519,6 +599,7 @@ class Scanalyzer(QtCore.QObject):
         except: pass
             
         # Upload the scan image to the pyqtgraph ImageView    
+        self.updating_display = True
         try:
             scan_range_nm = frame.get("scan_range (nm)")
             angle_deg = frame.get("angle (deg)")
@@ -529,8 +610,15 @@ class Scanalyzer(QtCore.QObject):
             x = offset_nm[0]
             y = offset_nm[1]
             
+            # Start from the finest pyramid level that fits the display size. on_view_range_changed refines it when zooming in
+            # The pyramid is only rebuilt when the processed image changes, not when the limits or the histogram are redrawn
+            if len(self.image_pyramid) < 1 or self.image_pyramid[0] is not scan: self.image_pyramid = self.data.build_image_pyramid(scan)
+            self.scan_box = [w, h]
+            level = next((index for index, level_image in enumerate(self.image_pyramid) if max(level_image.shape[:2]) <= self.max_display_size), len(self.image_pyramid) - 1)
+            self.displayed_region = (level, 0, self.image_pyramid[level].shape[0], 0, self.image_pyramid[level].shape[1])
+
             self.gui.image_view.clear()
-            self.gui.image_view.setImage(scan, autoRange = True) # Show the scan in the app
+            self.gui.image_view.setImage(self.image_pyramid[level], autoRange = True) # Show the scan in the app
             image_item = self.gui.image_view.getImageItem()
             
             box = QtCore.QRectF(- w / 2, - h / 2, w, h) # Add dimensions to the ImageView object
@@ -550,6 +638,8 @@ class Scanalyzer(QtCore.QObject):
             self.gui.image_view.autoRange()
         except:
             pass
+        self.updating_display = False
+        self.on_view_range_changed()
         
         # Spectroscopy locations
         if self.data.processing_flags["spec_locations"]:
@@ -570,6 +660,50 @@ class Scanalyzer(QtCore.QObject):
         
         self.hist_item.sigLevelChangeFinished.connect(self.histogram_scale_changed)
 
+    def on_view_range_changed(self) -> None:
+        # Show the pyramid level with about one scan pixel per screen pixel. Levels larger than max_display_size are cropped to the visible region plus a margin
+        if self.updating_display or len(self.image_pyramid) < 1 or self.displayed_region is None: return
+        
+        try:
+            image_item = self.gui.image_view.getImageItem()
+            view_box = self.gui.image_view.getView().getViewBox()
+            (level, first_row, last_row, first_column, last_column) = self.displayed_region
+            (rows, columns) = self.image_pyramid[0].shape[:2]
+            [w, h] = self.scan_box
+
+            # Visible region in full-resolution pixels. Local coordinates of the image item are pixels of the displayed crop
+            visible_rect = image_item.mapRectFromView(view_box.viewRect())
+            row_range = np.clip((np.array([visible_rect.top(), visible_rect.bottom()]) + first_row) * 2 ** level, 0, rows)
+            column_range = np.clip((np.array([visible_rect.left(), visible_rect.right()]) + first_column) * 2 ** level, 0, columns)
+
+            # Full-resolution pixels per screen pixel determine the level
+            pixels_per_screen_pixel = view_box.viewPixelSize()[0] / (w / columns)
+            new_level = int(np.clip(np.floor(np.log2(max(pixels_per_screen_pixel, 1))), 0, len(self.image_pyramid) - 1))
+            level_image = self.image_pyramid[new_level]
+            (level_rows, level_columns) = level_image.shape[:2]
+
+            if max(level_rows, level_columns) <= self.max_display_size: region = (new_level, 0, level_rows, 0, level_columns)
+            else:
+                [row_start, row_end] = np.sort(row_range) / 2 ** new_level
+                [column_start, column_end] = np.sort(column_range) / 2 ** new_level
+                (row_margin, column_margin) = (.5 * (row_end - row_start), .5 * (column_end - column_start))
+                region = (new_level, int(max(0, row_start - row_margin)), int(min(level_rows, np.ceil(row_end + row_margin))), int(max(0, column_start - column_margin)), int(min(level_columns, np.ceil(column_end + column_margin))))
+
+                # Keep the current crop while the visible region stays inside it
+                if new_level == level and first_row <= row_start and row_end <= last_row and first_column <= column_start and column_end <= last_column: return
+            if region == self.displayed_region: return
+
+            (_, first_row, last_row, first_column, last_column) = region
+            scale = 2 ** new_level
+            image_item.setImage(level_image[first_row : last_row, first_column : last_column], autoLevels = False)
+            image_item.setRect(QtCore.QRectF(- w / 2 + w * first_column * scale / columns, - h / 2 + h * first_row * scale / rows, w * (last_column - first_column) * scale / columns, h * (last_row - first_row) * scale / rows))
+            image_item.setTransformOriginPoint(image_item.transform().inverted()[0].map(QtCore.QPointF(0, 0))) # Keep rotating around the center of the full scan
+            self.displayed_region = region
+        except Exception as e:
+            print(f"Error updating the displayed region: {e}")
+        
+        return
+
     def read_metadata(self, scan_object: object) -> None:
         bias = scan_object.bias
         bias_V = bias.to("V").magnitude
@@ -597,53 +731,25 @@ class Scanalyzer(QtCore.QObject):
 
 
  
-        # Create a metadata file if it does not yet exist:
-        if not os.path.exists(self.paths["metadata_file"]):
-            try:
-                with open(self.paths["metadata_file"], "w") as file:
-                    yaml.safe_dump(self.files_dict, file)
-            except Exception as e:
-                print(f"Failed to write/parse the metadata file. {e}")
-        
-        # Read the scan / spectrum file dictionaries from the metadata file
+        # Update the entry of this scan in the metadata index with the metadata read from the scan file
         try:
-            with open(self.paths["metadata_file"], "r") as file:
-                metadata_obj = yaml.safe_load(file)
-        except Exception as e:
-            print(f"Failed to write/parse the metadata file. {e}")
-            return
-        
-        # Update the metadata file information with the metadata read from the scan file
-        try:
-            scan_dict = metadata_obj.get("scan_files")
-            spec_dict = metadata_obj.get("spectroscopy_files")
-            file_dict = scan_dict.get(self.file_index)
-            
+            file_dict = dict(self.files_dict.get("scan_files", {}).get(self.file_index) or {})
             file_dict.update({
-                "bias (V)": f"{bias_V:.3f}",
-                "setpoint (pA)": f"{setpoint_pA:.3f}",
-                "feedback": f"{feedback}",
-                "date_time": date_time.strftime("%Y-%m-%d %H:%M:%S"),
+                "bias (V)": bias_V,
+                "setpoint (pA)": setpoint_pA,
+                "feedback": bool(feedback),
+                "date_time_str": date_time.strftime("%Y-%m-%d %H:%M:%S"),
                 "frame": {
-                    "scan_range (nm)": f"({scan_range_nm[0]:.3f}, {scan_range_nm[1]:.3f})",
-                    "offset (nm)": f"({offset_nm[0]:.3f}, {offset_nm[1]:.3f})",
-                    "angle (deg)": f"{angle_deg:.3f}"
+                    "dict_name": "frame_dict",
+                    "offset (nm)": offset_nm,
+                    "scan_range (nm)": scan_range_nm,
+                    "angle_deg": angle_deg
                 }
             })
-            scan_dict.update({self.file_index: file_dict})
-
-            new_files_dict = {
-                "scan_files": scan_dict,
-                "spectroscopy_files": spec_dict
-            }          
-            try:
-                with open(self.paths["metadata_file"], "w") as file:
-                    yaml.safe_dump(new_files_dict, file)
-            except Exception as e:
-                print(f"Failed to write/parse the metadata file. {e}")
-                
+            error = self.file_functions.update_file_metadata(self.paths["data_folder"], "scan_files", self.file_index, file_dict)
+            if error: print(f"Failed to update the metadata index. {error}")
         except Exception as e:
-            print("Error. Failed to update the metadata dictionaries.")
+            print(f"Error. Failed to update the metadata dictionaries. {e}")
 
         return
 
@@ -924,6 +1030,38 @@ class Scanalyzer(QtCore.QObject):
         
         return
 
+    def on_save_hdf5(self) -> None:
+        try:
+            scan_file_path = os.path.join(self.paths["data_folder"], self.scan_file_name)
+            output_file_name = os.path.join(self.paths["output_folder"], self.paths["output_file_basename"] + ".hdf5")
+            os.makedirs(self.paths["output_folder"], exist_ok = True)
+
+            match self.gui.buttons["use_dialog"].state_index:
+                case 0:
+                    pass
+                case 1:
+                    if os.path.isfile(output_file_name): (output_file_name, _) = self.gui.dialog.getSaveFileName(self.gui, "Save file", output_file_name, "hdf5 files (*.hdf5 *.h5)")
+                case _:
+                    (output_file_name, _) = self.gui.dialog.getSaveFileName(self.gui, "Save file", output_file_name, "hdf5 files (*.hdf5 *.h5)")
+            if not isinstance(output_file_name, str) or output_file_name == "": return
+
+            # All channels and directions are exported, with the current processing applied to every image
+            error = self.file_functions.h5.export_scan(scan_file_path, output_file_name, process = lambda image: self.data.operate_scan(image)[0])
+            if error: raise Exception(error)
+
+            msg_box = self.gui.message_box
+            msg_box.setWindowTitle("Success")
+            msg_box.setText("hdf5 file saved")
+            QtCore.QTimer.singleShot(1000, msg_box.close)
+            msg_box.exec()
+            
+            self.check_if_saved_files_exist()
+        
+        except Exception as e:
+            print(f"Error saving the hdf5 file: {e}")
+        
+        return
+
     # Open folders
     def open_folder(self, paths_entry: str = "") -> None:
         if paths_entry in list(self.paths.keys()):
@@ -936,6 +1074,9 @@ class Scanalyzer(QtCore.QObject):
         self.on_exit
 
     def on_exit(self) -> None:
+        if self.thumbnail_cache: self.thumbnail_cache.stop() # Saves the thumbnails that were built so far
+        self.file_functions.archives.close() # Closes the open archives
+        self.file_functions.h5_files.close() # Closes the HDF5 files of lazy datasets
         try:
             scan_dict = self.files_dict.get("scan_files")
             last_file_name = scan_dict[self.file_index].get("file_name")
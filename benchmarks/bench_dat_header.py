@@ -0,0 +1,59 @@
+""" Header throughput of get_spectroscopy_header on 10k .dat files, versus the previous reader """
+import os, sys, time, tempfile
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.io_functions import IOFunctions
+from benchmarks.fixtures import write_synthetic_dat
+
+
+
+def legacy_header_read(io: IOFunctions, file_path: str) -> dict:
+    """ The line-by-line reader with pint Quantities, as it was before the byte-level scan """
+    [x, y, z, dt_object] = [False for _ in range(4)]
+    with open(file_path, "rb") as file:
+        for line in file:
+            decoded = line.decode()
+            (quantity, unit, backward_bool, error) = io.split_physical_quantity(decoded)
+            if not error and isinstance(quantity, str):
+                match quantity.lower():
+                    case "x": x = io.ureg.Quantity(io.get_scientific_numbers(decoded)[0], unit)
+                    case "y": y = io.ureg.Quantity(io.get_scientific_numbers(decoded)[0], unit)
+                    case "z": z = io.ureg.Quantity(io.get_scientific_numbers(decoded)[0], unit)
+            if "Saved Date" in decoded:
+                try: dt_object = datetime.strptime(decoded, "Saved Date\t%d.%m.%Y %H:%M:%S\t")
+                except: pass
+            if x and y and z and dt_object: break
+    return {"coords (nm)": [x.to("nm").magnitude, y.to("nm").magnitude, z.to("nm").magnitude], "date_time": dt_object}
+
+def files_per_second(function, file_paths: list) -> float:
+    start = time.perf_counter()
+    for file_path in file_paths: function(file_path)
+    return len(file_paths) / (time.perf_counter() - start)
+
+def threaded_files_per_second(io: IOFunctions, file_paths: list) -> float:
+    start = time.perf_counter()
+    io.read_headers_concurrently(dict(enumerate(file_paths)), io.get_spectroscopy_header)
+    return len(file_paths) / (time.perf_counter() - start)
+
+
+
+if __name__ == "__main__":
+    n_files = 10000
+    io = IOFunctions()
+    with tempfile.TemporaryDirectory() as folder:
+        file_paths = [os.path.join(folder, f"Bias_{index:05d}.dat") for index in range(n_files)]
+        for index, file_path in enumerate(file_paths): write_synthetic_dat(file_path, points = 64, position = [index * 1E-10, -2E-9, 1E-9], minute = index, seed = index)
+
+        # Both readers agree on the coordinates and times
+        for file_path in file_paths[:100]:
+            (header, error) = io.get_spectroscopy_header(file_path)
+            legacy_header = legacy_header_read(io, file_path)
+            assert not error and header["date_time"] == legacy_header["date_time"]
+            assert all(abs(new - old) < 1E-9 for (new, old) in zip(header["coords (nm)"], legacy_header["coords (nm)"]))
+
+        results = {
+            "legacy line-by-line reader": files_per_second(lambda file_path: legacy_header_read(io, file_path), file_paths),
+            "get_spectroscopy_header": files_per_second(io.get_spectroscopy_header, file_paths),
+            "read_headers_concurrently": threaded_files_per_second(io, file_paths),
+        }
+        for name, rate in results.items(): print(f"{name:<30}{rate:>10.0f} files/s")
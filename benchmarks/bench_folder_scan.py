@@ -0,0 +1,111 @@
+""" File system calls made by load_folder to enumerate a folder of 10k files """
+import os, sys, time, tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.io_functions import IOFunctions
+from benchmarks.fixtures import write_synthetic_folder
+
+
+
+class SyscallCounter:
+    """ Counts the stat, listdir, scandir and getcwd calls of the os module """
+    # os.path uses them as well, and a DirEntry.stat() counts as a stat
+    def __init__(self):
+        self.counts = {}
+        self.originals = {name: getattr(os, name) for name in ["stat", "lstat", "listdir", "scandir", "getcwd"]}
+
+    def count(self, name: str) -> None:
+        self.counts.update({name: self.counts.get(name, 0) + 1})
+
+    def wrap(self, name: str):
+        original = self.originals[name]
+        def wrapper(*args, **kwargs):
+            self.count(name)
+            return original(*args, **kwargs)
+        return wrapper
+
+    def wrap_scandir(self):
+        counter = self
+        class CountingEntry:
+            def __init__(self, entry): self.entry = entry
+            def __getattr__(self, name): return getattr(self.entry, name)
+            def stat(self, *args, **kwargs):
+                counter.count("stat")
+                return self.entry.stat(*args, **kwargs)
+
+        class CountingScandir:
+            def __init__(self, *args): self.iterator = counter.originals["scandir"](*args)
+            def __enter__(self): return self
+            def __exit__(self, *args): self.iterator.close()
+            def __iter__(self): return (CountingEntry(entry) for entry in self.iterator)
+
+        def scandir(*args):
+            self.count("scandir")
+            return CountingScandir(*args)
+        return scandir
+
+    def __enter__(self) -> "SyscallCounter":
+        self.counts = {}
+        for name in self.originals: setattr(os, name, self.wrap_scandir() if name == "scandir" else self.wrap(name))
+        return self
+
+    def __exit__(self, *args) -> None:
+        for name, original in self.originals.items(): setattr(os, name, original)
+
+def legacy_folder_scan(io: IOFunctions, file_path: str, files_dict: dict) -> int:
+    """ Folder enumeration of load_folder as it was, with listdir and samefile """
+    folder_name = file_path
+    if os.path.isfile(file_path): folder_name = os.path.dirname(file_path)
+    if not os.path.isdir(folder_name): return -1
+
+    if os.path.isfile(folder_name): folder_name = os.path.dirname(folder_name) # create_empty_files_dict
+    if not os.path.isdir(folder_name): return -1
+    all_files = os.listdir(folder_name)
+    dat_files = [os.path.join(folder_name, file) for file in all_files if file.endswith(".dat")]
+    sxm_files = [os.path.join(folder_name, file) for file in all_files if file.endswith(".sxm")]
+
+    for dict_name in ["scan_files", "spectroscopy_files"]: # Change detection of the indexed files
+        for single_file_dict in files_dict[dict_name].values():
+            if isinstance(single_file_dict, dict): io.fingerprints.is_current(os.path.join(folder_name, single_file_dict["file_name"]), single_file_dict["fingerprint"])
+
+    for key, single_file_dict in files_dict["scan_files"].items():
+        if not isinstance(single_file_dict, dict): continue
+        if os.path.samefile(os.path.join(folder_name, single_file_dict.get("file_name")), file_path): return key
+    return 0
+
+def folder_scan(io: IOFunctions, file_path: str, files_dict: dict) -> int:
+    """ Folder enumeration of load_folder from a single scandir pass """
+    folder_name = io.archives.get_folder(file_path)
+    (new_files_dict, error) = io.create_empty_files_dict(folder_name)
+    io.find_changed_files(files_dict, folder_name)
+
+    scan_indices = {os.path.normpath(single_file_dict.get("file_name")): key for key, single_file_dict in files_dict["scan_files"].items() if isinstance(single_file_dict, dict)}
+    return scan_indices.get(os.path.relpath(file_path, folder_name), 0)
+
+
+
+if __name__ == "__main__":
+    (n_scans, n_spectra) = (8000, 2000)
+    with tempfile.TemporaryDirectory() as folder:
+        file_paths = write_synthetic_folder(folder, n_files = n_scans, pixels = 2, lines = 2)
+        for index in range(n_spectra):
+            with open(os.path.join(folder, f"Bias_{index:05d}.dat"), "w") as file: file.write("Experiment\tbias spectroscopy\t\n")
+
+        # The index as it is loaded from metadata.yml, with the fingerprints of all files
+        io = IOFunctions()
+        (files_dict, error) = io.create_empty_files_dict(folder)
+        for dict_name in ["scan_files", "spectroscopy_files"]:
+            for single_file_dict in files_dict[dict_name].values():
+                if isinstance(single_file_dict, dict): single_file_dict.update({"fingerprint": io.fingerprints.get(single_file_dict["path"])})
+        selected_file = sorted(file_paths)[-1]
+
+        print(f"Folder of {n_scans} scans and {n_spectra} spectra, opened on its last scan")
+        for name, function in [("listdir + samefile", legacy_folder_scan), ("scandir + name map", folder_scan)]:
+            io.fingerprints.entries.clear()
+            with SyscallCounter() as counter: file_index = function(io, selected_file, files_dict)
+            
+            io.fingerprints.entries.clear()
+            start = time.perf_counter()
+            function(io, selected_file, files_dict)
+            elapsed_time = time.perf_counter() - start
+            counts = ", ".join(f"{key} {value}" for key, value in sorted(counter.counts.items()))
+            print(f"{name:<22}{sum(counter.counts.values()):>8} calls ({counts}){elapsed_time * 1E3:>10.1f} ms, index {file_index}")
@@ -0,0 +1,60 @@
+""" Time to the first image of an exported NSID HDF5 file, eager versus lazy """
+import os, sys, time, tempfile
+import numpy as np
+import h5py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.io_functions import IOFunctions
+from lib.file_functions import FileFunctions
+from benchmarks.fixtures import write_synthetic_sxm
+
+
+
+def time_to_first_image(function, repeats: int = 3) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        image = function()
+        timings.append(time.perf_counter() - start)
+    return (min(timings) * 1E3, image) # Milliseconds
+
+def write_stacked_hdf5(io: IOFunctions, sxm_path: str, hdf5_path: str, compression: str = None) -> None:
+    """ NSID file with all channels in a single (channels, directions, y, x) dataset """
+    file_data = io.read_sxm(sxm_path)
+    file_data.update({"dataset": np.asarray(file_data["dataset"])})
+    with h5py.File(hdf5_path, "w") as root:
+        (entry_group, [group]) = io.h5.setup_file(root, "Scan")
+        dataset = io.h5.create_dataset(group, "data", data = file_data["dataset"], chunks = (1, 1) + file_data["dataset"].shape[2:], compression = compression)
+        axes_datasets = [io.h5.create_dataset(group, name, {"units": "none"}, data = np.arange(length)) for (name, length) in zip(file_data["axes"], dataset.shape)]
+        io.h5.attach_axes_to_dataset(dataset, axes_datasets)
+
+def eager_first_image(io: IOFunctions | FileFunctions, file_path: str) -> np.ndarray:
+    dataset = io.read_hdf5(file_path)["dataset"]
+    return dataset[0] if dataset.ndim == 3 else dataset[0, 0] # The channels of an exported scan are separate groups, of which the default one is read
+
+def lazy_first_image(io: IOFunctions | FileFunctions, file_path: str) -> np.ndarray:
+    io.h5_files.close() # Include opening the file
+    return io.read_hdf5(file_path, lazy = True)["dataset"].get_image(channel = 0, direction = 0)
+
+
+
+if __name__ == "__main__":
+    io = IOFunctions()
+    readers = [io, FileFunctions()]
+    channels = [(f"LI_Demod_{index}_X", "A") for index in range(8)]
+    with tempfile.TemporaryDirectory() as folder:
+        sxm_path = os.path.join(folder, "Synthetic.sxm")
+        write_synthetic_sxm(sxm_path, pixels = 1024, lines = 1024, channels = channels)
+        
+        for (layout, compression) in [("channel groups", None), ("channel groups", "gzip"), ("single dataset", None), ("single dataset", "gzip")]:
+            hdf5_path = os.path.join(folder, f"Synthetic_{layout}_{compression}.hdf5")
+            if layout == "single dataset": write_stacked_hdf5(io, sxm_path, hdf5_path, compression)
+            else:
+                error = io.h5.export_scan(sxm_path, hdf5_path, compression = compression)
+                if error: raise Exception(error)
+            
+            for reader in readers:
+                (eager_time, eager_image) = time_to_first_image(lambda: eager_first_image(reader, hdf5_path))
+                (lazy_time, lazy_image) = time_to_first_image(lambda: lazy_first_image(reader, hdf5_path))
+                assert np.array_equal(eager_image, lazy_image)
+                print(f"{type(reader).__name__:<14}{len(channels)} channels of 2 x 1024 x 1024 as {layout:<15} compression {str(compression):<5}: eager reader {eager_time:>7.1f} ms, lazy handle {lazy_time:>6.1f} ms")
+        for reader in readers: reader.h5_files.close()
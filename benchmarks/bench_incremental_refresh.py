@@ -0,0 +1,61 @@
+""" Refreshing the metadata of a folder after one new scan: full populate versus refresh_files_dict """
+import os, sys, time, tempfile
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.io_functions import IOFunctions
+from benchmarks.fixtures import write_synthetic_sxm, write_synthetic_dat
+
+
+
+def write_scan(folder: str, index: int, date_time: datetime) -> None:
+    """ A small scan recorded at date_time """
+    file_path = os.path.join(folder, f"Scan_{index:05d}.sxm")
+    write_synthetic_sxm(file_path, pixels = 4, lines = 4, seed = index)
+    with open(file_path, "rb") as file: data = file.read()
+    data = data.replace(b"20.07.2026", date_time.strftime("%d.%m.%Y").encode(), 1).replace(b"12:34:56", date_time.strftime("%H:%M:%S").encode(), 1)
+    with open(file_path, "wb") as file: file.write(data)
+
+def full_refresh(io: IOFunctions, folder: str) -> dict:
+    (files_dict, error) = io.create_empty_files_dict(folder)
+    (files_dict, error) = io.populate_spectroscopy_headers(files_dict, folder)
+    (files_dict, error) = io.populate_scan_headers(files_dict, folder)
+    (files_dict, error) = io.populate_associated_scans(files_dict)
+    return files_dict
+
+def incremental_refresh(io: IOFunctions, folder: str, loaded_files_dict: dict) -> tuple[dict, float]:
+    """ The refreshed files_dict and the time spent in refresh_files_dict """
+    (files_dict, error) = io.create_empty_files_dict(folder)
+    changed_file_names = io.find_changed_files(loaded_files_dict, folder)
+    start = time.perf_counter()
+    (files_dict, error) = io.refresh_files_dict(files_dict, loaded_files_dict, folder, changed_file_names)
+    return (files_dict, time.perf_counter() - start)
+
+def associations(files_dict: dict) -> dict:
+    return {value["file_name"]: value.get("associated_scan_name") for value in files_dict["spectroscopy_files"].values() if isinstance(value, dict)}
+
+
+
+if __name__ == "__main__":
+    (n_scans, n_spectra) = (1000, 4000)
+    io = IOFunctions()
+    with tempfile.TemporaryDirectory() as folder:
+        for index in range(n_scans): write_scan(folder, index, datetime(2026, 7, 20, 4) + timedelta(minutes = index)) # The spectra are recorded from 12:00 to 13:00
+        for index in range(n_spectra): write_synthetic_dat(os.path.join(folder, f"Bias_{index:05d}.dat"), points = 16, minute = index, seed = index)
+
+        # The metadata index as it was saved before the new scan
+        io.save_files_dict(full_refresh(io, folder), folder)
+        (loaded_files_dict, error) = io.load_metadata_file(os.path.join(folder, "metadata.sqlite"))
+        write_scan(folder, n_scans, datetime(2026, 7, 20, 12, 30, 15)) # Between two earlier scans, while the spectra were recorded
+
+        start = time.perf_counter()
+        full_files_dict = full_refresh(io, folder)
+        full_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        (files_dict, refresh_time) = incremental_refresh(io, folder, loaded_files_dict)
+        incremental_time = time.perf_counter() - start
+        assert associations(files_dict) == associations(full_files_dict)
+
+        print(f"Folder of {n_scans} scans and {n_spectra} spectra, after one new scan")
+        print(f"{'populate all headers':<26}{full_time * 1E3:>10.1f} ms")
+        print(f"{'refresh_files_dict':<26}{incremental_time * 1E3:>10.1f} ms, of which {refresh_time * 1E3:.1f} ms after the folder scan and change detection")
@@ -0,0 +1,59 @@
+""" Saving, opening and updating the metadata of a 20k-file folder: metadata.yml versus SQLite """
+import os, sys, time, tempfile, yaml
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.io_functions import IOFunctions, MetadataIndex
+
+
+
+def synthetic_files_dict(n_scans: int, n_spectra: int) -> dict:
+    """ A files_dict as save_files_dict writes it, with the entries that load_folder populates """
+    fingerprint = lambda index: {"file_size": 1048576 + index, "mtime_ns": 1784550000000000000 + index, "inode": 1000 + index, "hash": f"{index:016x}"}
+    scans_dict = {"dict_name": "scan_files"}
+    for index in range(n_scans):
+        scans_dict.update({index: {"dict_name": "single_file_dict", "file_name": f"Scan_{index:05d}.sxm", "date_time_str": f"2026-07-{1 + index // 1440:02d} {index // 60 % 24:02d}:{index % 60:02d}:00",
+                                   "fingerprint": fingerprint(index), "channels": ["Z (m)", "Current (A)", "LI_Demod_1_X (A)", "LI_Demod_1_Y (A)"],
+                                   "frame": {"dict_name": "frame_dict", "offset (nm)": [index * .1, -index * .1], "scan_range (nm)": [20., 20.], "angle_deg": 0.}}})
+    specs_dict = {"dict_name": "spectroscopy_files"}
+    for index in range(n_spectra):
+        specs_dict.update({index: {"dict_name": "single_file_dict", "file_name": f"Bias_{index:05d}.dat", "date_time_str": f"2026-07-{1 + index // 1440:02d} {index // 60 % 24:02d}:{index % 60:02d}:30",
+                                   "x (nm)": index * .1, "y (nm)": -2., "z (nm)": 1., "associated_scan_name": f"Scan_{index % n_scans:05d}.sxm", "associated_scan_path": None, "fingerprint": fingerprint(n_scans + index)}})
+    return {"dict_name": "files_dict", "scan_files": scans_dict, "spectroscopy_files": specs_dict}
+
+def timed(function) -> tuple[object, float]:
+    start = time.perf_counter()
+    result = function()
+    return (result, time.perf_counter() - start)
+
+def save_yaml(files_dict: dict, path: str) -> None:
+    with open(path, "w") as file: yaml.safe_dump(files_dict, file)
+
+def load_yaml(path: str) -> dict:
+    with open(path, "r") as file: return yaml.safe_load(file)
+
+
+
+if __name__ == "__main__":
+    (n_scans, n_spectra) = (5000, 15000)
+    io = IOFunctions()
+    files_dict = synthetic_files_dict(n_scans, n_spectra)
+    with tempfile.TemporaryDirectory() as folder:
+        (yaml_path, index_path) = (os.path.join(folder, "metadata.yml"), os.path.join(folder, "metadata.sqlite"))
+        index = MetadataIndex(index_path)
+
+        (_, yaml_save_time) = timed(lambda: save_yaml(files_dict, yaml_path))
+        (yaml_dict, yaml_load_time) = timed(lambda: load_yaml(yaml_path))
+        (error, index_save_time) = timed(lambda: index.save(files_dict))
+        ((index_dict, error), index_load_time) = timed(index.load)
+        assert not error and index_dict == yaml_dict # The index loads the same files_dict as metadata.yml
+
+        # A single scan whose metadata changes: metadata.yml is rewritten as a whole, the index updates one row
+        single_file_dict = dict(index_dict["scan_files"][n_scans // 2], **{"bias (V)": -0.5})
+        (_, yaml_update_time) = timed(lambda: save_yaml({**yaml_dict, "scan_files": {**yaml_dict["scan_files"], n_scans // 2: single_file_dict}}, yaml_path))
+        (_, index_update_time) = timed(lambda: index.update("scan_files", n_scans // 2, single_file_dict))
+        (spectra, query_time) = timed(lambda: index.find_spectra(box = (100., 110., -5., 5.)))
+
+        print(f"Metadata of {n_scans} scans and {n_spectra} spectra")
+        print(f"{'':<20}{'save':>10}{'open':>10}{'update':>10}")
+        print(f"{'metadata.yml':<20}{yaml_save_time * 1E3:>8.0f}ms{yaml_load_time * 1E3:>8.0f}ms{yaml_update_time * 1E3:>8.0f}ms")
+        print(f"{'metadata.sqlite':<20}{index_save_time * 1E3:>8.0f}ms{index_load_time * 1E3:>8.0f}ms{index_update_time * 1E3:>8.0f}ms")
+        print(f"Spectra in a 10 nm window: {len(spectra)} in {query_time * 1E3:.1f} ms")
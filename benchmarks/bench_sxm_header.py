@@ -0,0 +1,57 @@
+""" Per-file cost of parsing an .sxm header: single-pass tokenizer versus line-by-line and nanonispy2 """
+import os, sys, time, tempfile
+import numpy as np
+import nanonispy2 as nap
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.io_functions import IOFunctions
+from benchmarks.fixtures import write_synthetic_folder
+
+
+
+def legacy_header_read(io: IOFunctions, file_path: str) -> dict:
+    """ The line-by-line reader with one np.where lookup per tag, as it was before the tokenizer """
+    raw_header = []
+    with open(file_path, "rb") as file:
+        for line in file:
+            raw_header.append(line.decode())
+            if ":SCANIT_END:" in raw_header[-1]: break
+    header = np.array(raw_header, dtype = np.str_)
+
+    sct_dict = {}
+    for nanonis_tag, sct_tag in zip([":SCAN_RANGE:\n", ":SCAN_ANGLE:\n", ":SCAN_OFFSET:\n", ":REC_TIME:\n", ":REC_DATE:\n", ":SCAN_PIXELS:\n", ":SCAN_DIR:\n", ":BIAS:\n"], ["scan_range (m)", "angle (deg)", "offset (m)", "start_time", "scan_date", "grid_size", "up_or_down", "V_nanonis (V)"]):
+        values_split = header[np.where(header == nanonis_tag)[0][0] + 1].split()
+        if nanonis_tag in [":REC_TIME:\n", ":REC_DATE:\n", ":SCAN_DIR:\n"]: sct_dict.update({sct_tag: values_split[0]})
+        else: sct_dict.update({sct_tag: [io.get_scientific_numbers(value)[0] for value in values_split]})
+
+    z_controller_data = header[np.where(header == ":Z-CONTROLLER:\n")[0][0] + 2].split("\t")
+    channel_data_index = np.where(header == ":DATA_INFO:\n")[0][0]
+    channels = []
+    for channel_index in range(100):
+        channel_data = header[channel_data_index + 2 + channel_index].split()
+        if len(channel_data) < 1: break
+        channels.append(f"{channel_data[1]} ({channel_data[2]})")
+    sct_dict.update({"z_controller": z_controller_data, "channels": channels})
+    return sct_dict
+
+def time_per_file(function, file_paths: list, repeats: int = 5) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for file_path in file_paths: function(file_path)
+        timings.append((time.perf_counter() - start) / len(file_paths))
+    return min(timings) * 1E6 # Microseconds per file
+
+
+
+if __name__ == "__main__":
+    io = IOFunctions()
+    with tempfile.TemporaryDirectory() as folder:
+        file_paths = write_synthetic_folder(folder, n_files = 200, pixels = 64, lines = 64, channels = [(f"LI_Demod_{index}_X", "A") for index in range(16)])
+
+        results = {
+            "SXMFunctions.tokenize_header": time_per_file(io.sxm.tokenize_header, file_paths),
+            "SXMFunctions.read_header_full": time_per_file(io.sxm.read_header_full, file_paths),
+            "legacy line-by-line reader": time_per_file(lambda file_path: legacy_header_read(io, file_path), file_paths),
+            "nanonispy2 Scan (header and data)": time_per_file(lambda file_path: nap.read.Scan(file_path).header, file_paths),
+        }
+    for name, microseconds in results.items(): print(f"{name:<36}{microseconds:>10.1f} µs/file")
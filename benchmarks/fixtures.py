@@ -0,0 +1,84 @@
+import os
+import numpy as np
+from lib.io_functions import IOFunctions, SXMHeader
+
+
+
+io = IOFunctions() # For the .sxm writer
+
+def write_synthetic_sxm(file_path: str, pixels: int = 256, lines: int = 256, channels: list = [("Z", "m"), ("Current", "A"), ("LI_Demod_1_X", "A"), ("LI_Demod_1_Y", "A")], up_or_down: str = "down", unfinished_lines: int = 0, seed: int = 0) -> np.ndarray:
+    """ Write a random .sxm file and return its payload in file order """
+    rng = np.random.default_rng(seed)
+    tags = {
+        ":NANONIS_VERSION:": ["2"],
+        ":SCANIT_TYPE:": ["              FLOAT            MSBFIRST"],
+        ":REC_DATE:": [],
+        ":REC_TIME:": [],
+        ":REC_TEMP:": ["      290.0000000000"],
+        ":ACQ_TIME:": ["       123.4"],
+        ":SCAN_PIXELS:": [],
+        ":SCAN_FILE:": [os.path.abspath(file_path)],
+        ":SCAN_TIME:": ["             1.000E+0             1.000E+0"],
+        ":SCAN_RANGE:": [],
+        ":SCAN_OFFSET:": [],
+        ":SCAN_ANGLE:": [],
+        ":SCAN_DIR:": [],
+        ":BIAS:": [],
+        ":Z-CONTROLLER:": ["\tName\ton\tSetpoint\tP-gain\tI-gain\tT-const", "\tlog Current\t1\t1.000E-10 A\t1.000E-12 m\t1.000E-9 m/s\t1.000E-3 s"],
+        ":COMMENT:": ["Synthetic scan for benchmarking"]
+    } # Tags without values are filled in from the fields of the header
+    header = SXMHeader(tags = tags, pixels = pixels, lines = lines, up_or_down = up_or_down, scan_range = [2E-8, 2E-8], offset = [1E-9, -2E-9], angle = 0., bias = -0.5, scan_date = "20.07.2026", start_time = "12:34:56")
+
+    payload = (rng.standard_normal((len(channels), 2, lines, pixels)) * 1E-9).astype(">f4")
+    if unfinished_lines: payload[:, :, lines - unfinished_lines:] = np.nan
+
+    # The writer takes the scan as get_scan_object returns it: backward lines from left to right and the first line at the bottom
+    tensor = payload.copy()
+    tensor[:, 1] = tensor[:, 1, :, ::-1]
+    if up_or_down == "down": tensor = tensor[:, :, ::-1]
+
+    error = io.sxm.write_sxm(file_path, tensor, [f"{name} ({unit})" for (name, unit) in channels], header)
+    if error: raise Exception(error)
+    return payload
+
+def write_synthetic_folder(folder: str, n_files: int = 50, **kwargs) -> list:
+    os.makedirs(folder, exist_ok = True)
+    file_paths = [os.path.join(folder, f"Synthetic_{index:03d}.sxm") for index in range(n_files)]
+    for index, file_path in enumerate(file_paths): write_synthetic_sxm(file_path, seed = index, **kwargs)
+    return file_paths
+
+def write_synthetic_dat(file_path: str, points: int = 256, position: list = [1E-9, 2E-9, 3E-9], minute: int = 0, seed: int = 0) -> np.ndarray:
+    """ Write a random bias spectroscopy .dat file and return its (point, column) data """
+    rng = np.random.default_rng(seed)
+    columns = ["Bias calc (V)", "Current (A)", "LI Demod 1 X (A)", "LI Demod 1 Y (A)", "Z (m)", "Current [bwd] (A)", "LI Demod 1 X [bwd] (A)", "LI Demod 1 Y [bwd] (A)"]
+    header = [
+        ("Experiment", "bias spectroscopy"), ("Saved Date", f"20.07.2026 12:{minute % 60:02d}:30"), ("User", ""), ("Date", f"20.07.2026 12:{minute % 60:02d}:00"),
+        ("X (m)", f"{position[0]:.6E}"), ("Y (m)", f"{position[1]:.6E}"), ("Z (m)", f"{position[2]:.6E}"), ("Z offset (m)", "0E+0"), ("Settling time (s)", "2E-3"),
+        ("Integration time (s)", "5E-3"), ("Z-Ctrl hold", "TRUE"), ("Final Z (m)", "N/A"), ("Start time", f"20.07.2026 12:{minute % 60:02d}:00"),
+        ("Bias Spectroscopy>Channels", ";".join(columns[1:5])), ("Bias Spectroscopy>Sweep Start (V)", "-1E+0"), ("Bias Spectroscopy>Sweep End (V)", "1E+0"),
+        ("Bias Spectroscopy>Num Pixel", str(points)), ("Bias Spectroscopy>Backward sweep", "TRUE"), ("Comment01", "Synthetic spectrum for benchmarking")
+    ]
+
+    data = rng.standard_normal((points, len(columns))) * 1E-10
+    data[:, 0] = np.linspace(-1, 1, points)
+    with open(file_path, "wb") as file:
+        file.write("".join(f"{key}\t{value}\t\r\n" for (key, value) in header).encode())
+        file.write(b"\r\n[DATA]\r\n" + ("\t".join(columns) + "\r\n").encode())
+        file.write("".join("\t".join(f"{value:.6E}" for value in row) + "\r\n" for row in data).encode())
+    return data
+
+def write_synthetic_3ds(file_path: str, pixels: int = 8, lines: int = 6, points: int = 32, channels: list = ["Current (A)", "LI Demod 1 X (A)"], lines_done: int = None, seed: int = 0) -> np.ndarray:
+    """ Write a random .3ds grid and return its data in file order """
+    rng = np.random.default_rng(seed)
+    header = [f'Grid dim="{pixels} x {lines}"', "Grid settings=1.0E-9;2.0E-9;5.0E-9;5.0E-9;0.0E+0", "Filetype=Linear", 'Sweep Signal="Bias (V)"',
+              'Fixed parameters="Sweep Start;Sweep End"', 'Experiment parameters="X (m);Y (m);Z (m)"', "# Parameters (4 byte)=5",
+              f"Experiment size (bytes)={4 * points * len(channels)}", f"Points={points}", f'Channels="{";".join(channels)}"', "Delay before measuring (s)=0.0E+0",
+              'Experiment="Grid Spectroscopy"', 'Start time="20.07.2026 12:00:00"', 'End time="20.07.2026 13:00:00"', "User=", "Comment="]
+    
+    data = (rng.standard_normal((lines, pixels, 5 + points * len(channels))) * 1E-10).astype(">f4")
+    (data[:, :, 0], data[:, :, 1]) = (-1, 1) # Sweep start and end (V)
+    if lines_done is not None: data = data[:lines_done] # A grid that is still being recorded
+    with open(file_path, "wb") as file:
+        file.write(("\r\n".join(header) + "\r\n:HEADER_END:\r\n").encode())
+        file.write(data.tobytes())
+    return data
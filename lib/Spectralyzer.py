@@ -19,7 +19,7 @@ class Spectralyzer:
         self.show_scan(scan_image, scan_frame)
         
         self.connect_buttons()        
-        if os.path.exists(data_folder_path): self.load_folder(data_folder_path)
+        if self.file_functions.archives.exists(data_folder_path): self.load_folder(data_folder_path)
         self.set_focus_row(0)
 
 
@@ -41,7 +41,7 @@ class Spectralyzer:
         icon_folder = os.path.join(scanalyzer_folder, "icons") # The directory of the icon files
         
         data_folder = sys_folder # Set current folder to the config file; read from the config file later to reset it to a data folder
-        metadata_file = os.path.join(data_folder, "metadata.yml") # Metadata file that is populated with all the scan and spectroscopy metadata of the files in the data folder
+        metadata_file = os.path.join(data_folder, "metadata.sqlite") # Metadata index that is populated with all the scan and spectroscopy metadata of the files in the data folder
         output_folder_name = "Extracted Files"
 
         self.paths = {
@@ -211,14 +211,14 @@ class Spectralyzer:
         return
 
     def on_select_file(self) -> None:
-        file_path, _ = QtWidgets.QFileDialog.getOpenFileName(None, "Open file", self.paths["data_folder"], "Dat files (*.dat)")
+        file_path, _ = QtWidgets.QFileDialog.getOpenFileName(None, "Open file", self.paths["data_folder"], "Dat files (*.dat);;Grid files (*.3ds);;Archives (*.zip *.session.hdf5 *.dat.gz)")
         if file_path: self.load_folder(file_path)
         return
 
     def load_folder(self, path) -> None:
-        if os.path.isfile(path): folder_name = os.path.dirname(path)
-        elif os.path.isdir(path): folder_name = path
-        else:
+        archives = self.file_functions.archives
+        folder_name = archives.get_folder(path) # Zip archives are opened as folders
+        if folder_name is None:
             print("Error. Invalid file/folder.")
             return
 
@@ -228,8 +228,8 @@ class Spectralyzer:
         try:
             # Set the paths according to what file was selected
             self.paths["data_folder"] = folder_name
-            self.paths["metadata_file"] = os.path.join(folder_name, "metadata.yml") # Set the metadata.yml file accordingly as well
-            self.paths["output_folder"] = os.path.join(folder_name, self.paths["output_folder_name"]) # Set the output folder name
+            self.paths["metadata_file"] = archives.get_sidecar_path(folder_name, "metadata.sqlite") # Set the metadata index accordingly as well (next to the archive for archives)
+            self.paths["output_folder"] = archives.get_sidecar_path(folder_name, self.paths["output_folder_name"]) # Set the output folder name
             self.gui.buttons["open_folder"].setText(folder_name)
 
 
@@ -238,9 +238,10 @@ class Spectralyzer:
             (files_dict, error) = self.file_functions.create_empty_files_dict(folder_name)
             if error:
                 print(f"Error creating the files dictionary: {error}")
+            grid_files = files_dict.get("grid_files", {}) # Grids are listed anew every time, since they are not part of the metadata index
             [scan_file_names, spec_file_names] = self.file_functions.get_file_name_lists(files_dict)
             
-            # 2. Try to find the files dictionary already present in the metadata.yml file, considering it exists
+            # 2. Try to find the files dictionary already present in the metadata index, considering it exists
             (loaded_files_dict, error) = self.file_functions.load_metadata_file(self.paths["metadata_file"])
             if "spectroscopy_files" in loaded_files_dict.keys() and "scan_files" in loaded_files_dict.keys(): # File loaded successfully. Roll with it
                 [loaded_scan_file_names, loaded_spec_file_names] = self.file_functions.get_file_name_lists(loaded_files_dict)
@@ -265,31 +266,29 @@ class Spectralyzer:
                 print(f"Scan entries: {corrupt_scan_files}")
                 print(f"Spectroscopy entries: {corrupt_spec_files}")
                 rebuild_metadata = True
-                
-            # 3. Update the metadata.yml file if new files are found
-            if rebuild_metadata:
-                # 3a: Populate it with spectroscopy headers
-                (files_dict, error) = self.file_functions.populate_spectroscopy_headers(files_dict, folder_name)
-                if error:
-                    print(f"Error populating spectroscopy headers: {error}")
-                    return
             
-                # 3b: Populate it with scan headers
-                (files_dict, error) = self.file_functions.populate_scan_headers(files_dict, folder_name)
-                if error:
-                    print(f"Error populating scan headers: {error}")
-                    return
+            # Files that were saved again or are still growing since the metadata file was written are detected by their fingerprints
+            (changed_scan_files, changed_spec_files) = self.file_functions.find_changed_files(loaded_files_dict, folder_name)
+            changed_scan_files = [file_name for file_name in changed_scan_files if file_name in scan_file_names]
+            changed_spec_files = [file_name for file_name in changed_spec_files if file_name in spec_file_names]
+            if len(changed_scan_files) > 0 or len(changed_spec_files) > 0:
+                print("I found files that changed since the metadata file was written")
+                print(f"Scans: {changed_scan_files}")
+                print(f"Spectroscopy files: {changed_spec_files}")
+                rebuild_metadata = True
                 
-                # 3c: Use the scan headers and spectroscopy headers to associate spectra with scans, and update the dictionary accordingly
-                (files_dict, error) = self.file_functions.populate_associated_scans(files_dict)
+            # 3. Update the metadata index if new files are found
+            if rebuild_metadata:
+                # 3a-c: Read the headers of the new and changed files only, reuse the loaded metadata of the other files, and associate the affected spectra with scans
+                (files_dict, error) = self.file_functions.refresh_files_dict(files_dict, loaded_files_dict, folder_name, (changed_scan_files, changed_spec_files))
                 if error:
-                    print(f"Error associating spectra and scans: {error}")
+                    print(f"Error refreshing the scan and spectroscopy metadata: {error}")
                     return
                 
-                # 3d. Save the fully populated dicts to a metadata.yml file
+                # 3d. Save the fully populated dicts to the metadata index
                 error = self.file_functions.save_files_dict(files_dict, folder_name)
                 if error:
-                    print(f"Error saving the files_dict to the metadata.yml file: {error}")
+                    print(f"Error saving the files_dict to the metadata index: {error}")
                     return
                 
                 print(f"Loaded all scan and spectroscopy metadata and saved to file {self.paths["metadata_file"]}")
@@ -300,6 +299,7 @@ class Spectralyzer:
                 self.files_dict = loaded_files_dict
 
             # 5: Populate the spectroscopy dictionary with spectroscopy objects, from which the spectra can be extracted
+            self.files_dict.update({"grid_files": grid_files})
             (self.files_dict, error) = self.file_functions.populate_spec_objects(self.files_dict, folder_name)
             if error:
                 print(f"Error retrieving spectroscopy objects: {error}")
@@ -340,6 +340,16 @@ class Spectralyzer:
                 [all_channels.append(str(channel)) for channel in channels]
                 spec_list.append([spec_file_name, associated_scan_name, spec_object, spec_x, spec_y, spec_z, datetime])
             
+            # Every recorded pixel of a grid is listed as a spectrum, named like Grid001.3ds[x, y]. Its sweeps are only read when it is plotted
+            for key, single_grid_file in self.files_dict.get("grid_files", {}).items():
+                if not isinstance(single_grid_file, dict) or single_grid_file.get("grid") is None: continue
+                grid = single_grid_file.get("grid")
+                [all_channels.append(str(channel)) for channel in single_grid_file.get("channels")]
+                for y in range(grid.lines_done):
+                    for x in range(grid.pixels):
+                        (spec_x, spec_y) = grid.get_position(x, y)
+                        spec_list.append([f"{single_grid_file.get("file_name")}[{x}, {y}]", None, grid.get_spectrum(x, y, lazy = True), spec_x, spec_y, np.nan, single_grid_file.get("date_time_str")])
+            
             all_channels_set = set(all_channels) # Duplicate entries are automatically removed from sets
             all_channels_filt_set = {item for item in all_channels_set if not "[filt]" in item}
             all_channels_filt_set_2 = {item for item in all_channels_filt_set if not "[bwd]" in item}
@@ -2,6 +2,6 @@ from .st_widgets import STWidgets, rotate_icon, make_layout, make_line
 from .gui_scanalyzer import ScanalyzerGUI
 from .gui_spectralyzer import SpectralyzerGUI
 from .file_functions import FileFunctions
-from .io_functions import IOFunctions
+from .io_functions import IOFunctions, ThumbnailCache
 from .data_processing import DataProcessing
 from .Spectralyzer import Spectralyzer
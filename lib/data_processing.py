@@ -13,6 +13,7 @@ class DataProcessing():
     def __init__(self):
         self.processing_flags = self.create_scan_processing_flage()
         self.spec_processing_flags = self.create_spec_processing_flags()
+        self.operated_scan = (None, None, None) # (Input image, operation flags, processed image) of the last operate_scan call
         
     def create_scan_processing_flage(self) -> dict:
         processing_flags = {
@@ -32,6 +33,7 @@ class DataProcessing():
             "normal": False,
             "projection": "re",
             "phase": 0,
+            "precision": "float32", # Floating point precision of the processed data. Can be 'float32' or 'float64'; complex data uses the matching complex64 or complex128
             "min_method": "full", # Method to determine the lower limit of the data. Can be 'full', 'absolute', 'percentiles' or 'deviations'
             "min_method_value": 0, # Argument to calculate the min_limit on the basis of the provided min_method
             "min_limit": 0, # This key will hold the numerical value of the limit as determined by applying the min_method to the data using the min_method_value
@@ -99,6 +101,14 @@ class DataProcessing():
         
         return tagged_name
 
+    def get_real_dtype(self, image: np.ndarray = None) -> np.dtype:
+        # The real floating point type of an image (float32 for complex64), falling back to the precision flag
+        if isinstance(image, np.ndarray) and np.issubdtype(image.dtype, np.inexact): return np.finfo(image.dtype).dtype
+        return np.dtype(self.processing_flags.get("precision", "float32"))
+
+    def get_complex_dtype(self, image: np.ndarray = None) -> np.dtype:
+        return np.result_type(self.get_real_dtype(image), np.complex64)
+
     def pick_image_from_scan_object(self, scan_object) -> tuple[np.ndarray, str, dict, bool | str]:
         error = False
 
@@ -111,13 +121,13 @@ class DataProcessing():
             
             # Initialize to fail and update to success if the requested channel is found
             selected_channel = channels[0]
-            tensor_slice = scan_tensor[0]
+            channel_index = 0
             for index in range(len(channels)):
                 if channels[index] == requested_channel:
                     selected_channel = requested_channel
-                    tensor_slice = scan_tensor[index]
+                    channel_index = index
                     break
-            image = tensor_slice[int(self.processing_flags.get("direction") == "backward")]
+            image = scan_tensor[channel_index, int(self.processing_flags.get("direction") == "backward")] # Index channel and direction together so that a lazy tensor only decodes this slice
             
             # Update the frame to the processing flags
             self.processing_flags.update({"frame": frame})
@@ -314,9 +324,14 @@ class DataProcessing():
         limits = [0, 1]
 
         try:
-            # Apply matrix operations
-            (processed_scan, error) = self.operate_scan(image)
-            if error: raise Exception(error)
+            # Apply matrix operations. A limit change leaves them unchanged, so the previous processed image (and the pyramid built from it) is reused
+            flags = self.processing_flags
+            operations = repr([flags[name] for name in ["background", "sobel", "normal", "laplace", "gaussian", "gaussian_width (nm)", "fft", "projection", "phase", "precision", "scan_range (nm)"]])
+            (operated_image, operated_flags, processed_scan) = self.operated_scan
+            if image is not operated_image or operations != operated_flags:
+                (processed_scan, error) = self.operate_scan(image)
+                if error: raise Exception(error)
+                self.operated_scan = (image, operations, processed_scan)
 
             # Calculate the image statistics and display them
             (statistics, error) = self.get_image_statistics(processed_scan)
@@ -339,12 +354,22 @@ class DataProcessing():
         gaussian_sigma = flags["gaussian_width (nm)"]
         scan_range_nm = flags["scan_range (nm)"]
         
+        image = np.asarray(image, dtype = self.get_real_dtype())
+        
+        # Complex arrays are only created when they are needed: for a phase, a complex projection, or a gradient that is processed further
+        projected = False
+        keep_complex = flags["phase"] != 0 or flags["projection"] in ["arg (hue)", "complex"] or any([flags[name] for name in ["normal", "laplace", "gaussian", "fft"]])
+
         # Background subtraction
         (image, error) = self.subtract_background(image, mode = flags["background"])
         if error: return (image, error)
         
         # Matrix operations
-        if flags["sobel"]: (image, error) = self.image_gradient(image, scan_range_nm)
+        if flags["sobel"]:
+            if keep_complex: (image, error) = self.image_gradient(image, scan_range_nm)
+            else:
+                (image, error) = self.project_gradient(image, flags["projection"], scan_range_nm)
+                projected = True
         if error: return (image, error)
         
         if flags["normal"]: (image, error) = self.compute_normal(image, scan_range_nm)
@@ -365,6 +390,7 @@ class DataProcessing():
             return (image, error)
 
         # Perform the correct projection
+        if projected: return (image, error)
         try:
             match flags["projection"]:
                 case "im": image = np.imag(image)
@@ -379,6 +405,20 @@ class DataProcessing():
             pass    
         return (image, error)
  
+    def build_image_pyramid(self, image: np.ndarray, min_size: int = 256) -> list[np.ndarray]:
+        """ Mipmap levels of an image, from the image itself down to min_size """
+        # Every next level is a 2 x 2 block mean of the previous one
+        pyramid = [image]
+        while max(pyramid[-1].shape[:2]) > min_size:
+            level = pyramid[-1]
+            (rows, columns) = level.shape[:2]
+            
+            # Pad odd sizes by repeating the last row/column, so that no data is dropped and blocks stay aligned with the full-resolution pixels
+            if rows % 2 or columns % 2: level = np.pad(level, [(0, rows % 2), (0, columns % 2)] + [(0, 0)] * (level.ndim - 2), mode = "edge")
+            reduced = level.reshape(level.shape[0] // 2, 2, level.shape[1] // 2, 2, *level.shape[2:]).mean(axis = (1, 3))
+            pyramid.append(reduced.astype(image.dtype, copy = False))
+        return pyramid
+
     def calculate_limits(self, image: np.ndarray) -> tuple[list, bool | str]:
         error = False
         limits = [0, 1]
@@ -443,7 +483,7 @@ class DataProcessing():
         try:
             phase = self.processing_flags.get("phase", 0)
             if phase == 0: return(image, error)
-            phase_factor = np.exp(1j * phase * np.pi / 180)
+            phase_factor = self.get_complex_dtype(image).type(np.exp(1j * phase * np.pi / 180)) # A complex128 factor would promote float32 images to complex128
             phase_shifted_image = phase_factor * image
             
             return(phase_shifted_image, error)
@@ -482,20 +522,47 @@ class DataProcessing():
         return (filtered_image, error)
 
     def image_gradient(self, image: np.ndarray, scan_range = None) -> tuple[np.ndarray, bool | str]:
+        (ddx, ddy, error) = self.image_gradient_components(image, scan_range)
+        if error: return (image, error)
+        
+        gradient_image = np.empty(ddx.shape, dtype = self.get_complex_dtype(ddx))
+        (gradient_image.real, gradient_image.imag) = (ddx, ddy)
+
+        return (gradient_image, error)
+
+    def project_gradient(self, image: np.ndarray, projection: str = "re", scan_range = None) -> tuple[np.ndarray, bool | str]:
+        """ Real-valued projection of the gradient ddx + i ddy """
+        # Computed without creating the complex array
+        (ddx, ddy, error) = self.image_gradient_components(image, scan_range)
+        if error: return (image, error)
+
+        match projection:
+            case "im": projected_image = ddy
+            case "abs": projected_image = np.hypot(ddx, ddy)
+            case "abs^2": projected_image = ddx ** 2 + ddy ** 2
+            case "arg (b/w)": projected_image = np.arctan2(ddy, ddx)
+            case "log(abs)": projected_image = np.log(np.hypot(ddx, ddy))
+            case _: projected_image = ddx
+
+        return (projected_image, error)
+
+    def image_gradient_components(self, image: np.ndarray, scan_range = None) -> tuple[np.ndarray, np.ndarray, bool | str]:
         error = False
 
         if not isinstance(image, np.ndarray):
             error = "Error. The provided image is not a numpy array."
-            return (image, error)
-                
-        sobel_x = .125 * np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]], dtype = float)
-        sobel_y = .125 * np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]], dtype = float)
+            return (image, image, error)
+        
+        # Kernels in the precision of the image, so that convolve2d does not promote float32 images to float64
+        kernel_dtype = self.get_real_dtype(image)
+        sobel_x = .125 * np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]], dtype = kernel_dtype)
+        sobel_y = .125 * np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]], dtype = kernel_dtype)
         try:
             ddx = convolve2d(image, sobel_x, mode = "valid") # These are the gradients computed using normalized sobel kernels
             ddy = convolve2d(image, sobel_y, mode = "valid")
         except:
             error = "Error. Calculating gradient failed."
-            return (image, error)
+            return (image, image, error)
 
         if isinstance(scan_range, np.ndarray) or isinstance(scan_range, list):
             # If a scan range is provided, the gradients will be calculated as derivatives wrt to x and y rather than wrt pixel index
@@ -515,10 +582,8 @@ class DataProcessing():
                 ddy /= dy_per_px
             except:
                 error = "Error. Calculating gradient failed."
-        
-        gradient_image = ddx + 1j * ddy
 
-        return (gradient_image, error)
+        return (ddx, ddy, error)
 
     def compute_normal(self, image: np.ndarray, scan_range = None) -> tuple[np.ndarray, bool | str]:
         error = False
@@ -527,8 +592,9 @@ class DataProcessing():
             error = "Error. The provided image is not a numpy array."
             return (image, error)
         
-        sobel_x = .125 * np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]], dtype = float)
-        sobel_y = .125 * np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]], dtype = float)
+        kernel_dtype = self.get_real_dtype(image)
+        sobel_x = .125 * np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]], dtype = kernel_dtype)
+        sobel_y = .125 * np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]], dtype = kernel_dtype)
         ddx = convolve2d(image, sobel_x, mode = "valid") # These are the gradients computed using normalized sobel kernels
         ddy = convolve2d(image, sobel_y, mode = "valid")
 
@@ -566,7 +632,7 @@ class DataProcessing():
             error = "Error. The provided image is not a numpy array."
             return (image, error)
         
-        laplace_kernel = np.array([[0, 1, 0], [1, -4, 1], [0, 1, 0]], dtype = float)
+        laplace_kernel = np.array([[0, 1, 0], [1, -4, 1], [0, 1, 0]], dtype = self.get_real_dtype(image))
         laplacian = convolve2d(image, laplace_kernel, mode = "valid")
 
         if isinstance(scan_range, np.ndarray) or isinstance(scan_range, list):
@@ -648,7 +714,7 @@ class DataProcessing():
 
                 image_subtracted.append(line_subtracted)
 
-            image_subtracted = np.array(image_subtracted, dtype = float)
+            image_subtracted = np.array(image_subtracted, dtype = self.get_real_dtype(image))
         
         except:
             error = "Error. Line subtraction algorithm failed."
@@ -674,7 +740,8 @@ class DataProcessing():
                 hsv_matrix = np.dstack((phase_norm, np.ones_like(phase_norm), magnitude))
             
             # Convert from HSV color space to RGB
-            rgb_array = colors.hsv_to_rgb(hsv_matrix)
+            rgb_array = colors.hsv_to_rgb(hsv_matrix).astype(self.get_real_dtype(image), copy = False)
+            rgb_array[~np.isfinite(magnitude)] = np.nan # Pixels that were not recorded stay NaN, independent of how hsv_to_rgb casts them
         
         except:
             error = "Error. Computing the colorized complex image failed."
@@ -700,19 +767,17 @@ class DataProcessing():
             if non_nan_rows < 3: # Do not perform data processing if the scan is all NaNs
                 return (input_image, error)
 
-            avg_image = np.mean(image.flatten()) # The average value of the image, or the offset
-            (gradient_image, error) = self.image_gradient(image) # The (complex) gradient of the image
-            if error: return (image, error)
-            avg_gradient = np.mean(gradient_image.flatten()) # The average value of the gradient
-            if not isinstance(avg_gradient, complex):
-                error = "Error. Could not compute average gradient for background subtraction."
-                return (input_image, error)
+            real_dtype = self.get_real_dtype(image)
+            avg_image = np.mean(image) # The average value of the image, or the offset
+            (ddx, ddy, error) = self.image_gradient_components(image) # The components of the gradient of the image
+            if error: return (input_image, error)
+            (avg_gradient_x, avg_gradient_y) = (np.mean(ddx), np.mean(ddy)) # The average value of the gradient
 
             pix_y, pix_x = np.shape(image)
-            x_values = np.arange(-(pix_x - 1) / 2, pix_x / 2, 1)
-            y_values = np.arange(-(pix_y - 1) / 2, pix_y / 2, 1)
+            x_values = np.arange(-(pix_x - 1) / 2, pix_x / 2, 1, dtype = real_dtype)
+            y_values = np.arange(-(pix_y - 1) / 2, pix_y / 2, 1, dtype = real_dtype)
 
-            plane = np.array([[-x * np.real(avg_gradient) - y * np.imag(avg_gradient) for x in x_values] for y in y_values])
+            plane = -np.add.outer(y_values * avg_gradient_y, x_values * avg_gradient_x)
 
             match mode:
                 case "plane":
@@ -740,8 +805,7 @@ class DataProcessing():
         error = False
 
         try:
-            data_sorted_c = np.sort(image.flatten())
-            data_sorted = np.real(data_sorted_c)
+            data_sorted = np.sort(np.real(image), axis = None) # Sorting the real part directly avoids a sorted complex copy
             n_pixels = len(data_sorted)
             data_firsthalf = data_sorted[:int(n_pixels / 2)]
             data_secondhalf = data_sorted[-int(n_pixels / 2):]
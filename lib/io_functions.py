@@ -1,8 +1,13 @@
-import re, os, sys, yaml, pint, h5py
+import re, os, io, sys, yaml, pint, h5py, threading, zipfile, gzip, hashlib, itertools, sqlite3, bisect
 import importlib.util
 import numpy as np
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import nanonispy2 as nap
 from datetime import datetime
+from dataclasses import dataclass, field, replace
+from collections import OrderedDict
+from contextlib import nullcontext, closing
 from .data_processing import DataProcessing
 
 
@@ -17,6 +22,20 @@ class HDF5Functions:
     def find_datasets(self, root_or_group: h5py.File | h5py.Group) -> list:
         return [key for key, value in root_or_group.items() if isinstance(value, h5py.Dataset)]
 
+    def find_channel_datasets(self, entry_group: h5py.Group) -> tuple[list, list]:
+        """ Names and titles of the channel datasets of an NXentry """
+        # The signals of its NXdata groups with the shape of the default group, such as the channel groups written by setup_file
+        (dataset_names, titles) = ([], [])
+        default_group = entry_group[entry_group.attrs.get("default")]
+        shape = default_group[default_group.attrs.get("signal", "data")].shape
+        for group_name in self.find_groups(entry_group):
+            group = entry_group[group_name]
+            signal_name = group.attrs.get("signal")
+            if group.attrs.get("NX_class") != "NXdata" or signal_name not in group or group[signal_name].shape != shape: continue
+            dataset_names.append(group[signal_name].name)
+            titles.append(str(group.attrs.get("title", group_name)))
+        return (dataset_names, titles)
+
     def create_attributes(self, h5object: h5py.Group | h5py.Dataset, attributes: dict = {}) -> None:
         for key, value in attributes.items():
             try:
@@ -25,6 +44,11 @@ class HDF5Functions:
             except: pass
         return
 
+    def copy_attributes(self, h5object: h5py.Group | h5py.Dataset) -> dict:
+        """ Attributes of an object without the dimension scales """
+        # Dimension scales refer to objects in its own file
+        return {key: value for key, value in h5object.attrs.items() if key not in ["CLASS", "NAME", "REFERENCE_LIST", "DIMENSION_LIST", "DIMENSION_LABELS"]}
+
     def create_group(self, root_or_group: h5py.File | h5py.Group, name: str = "", attributes: dict = {}) -> h5py.Group:
         try:
             new_group = root_or_group.create_group(name)
@@ -54,10 +78,10 @@ class HDF5Functions:
 
     def create_dataset(self, root_or_group: h5py.File | h5py.Group, name: str = "", attributes: dict = {}, *, data: np.ndarray = None, dtype: h5py.Datatype | np.dtype = None, shape: tuple = None, **kwargs) -> h5py.Dataset:
         try:
-            if isinstance(data, np.ndarray): dataset = root_or_group.create_dataset(name, data = data, *kwargs)
-            else: dataset = root_or_group.create_dataset(name, dtype = dtype, shape = shape, *kwargs)
+            if isinstance(data, np.ndarray): dataset = root_or_group.create_dataset(name, data = data, **kwargs)
+            else: dataset = root_or_group.create_dataset(name, dtype = dtype, shape = shape, **kwargs)
             
-            attributes.update({"title": name, "long_name": name})
+            attributes = {"title": name, "long_name": name, **attributes}
             self.create_attributes(dataset, attributes)
             return dataset
         except:
@@ -92,9 +116,201 @@ class HDF5Functions:
             print(f"Failed to attach dataset {axis_dataset_name} to axis {dimension} of {target_dataset_name}")
         return
 
+    def export_scan(self, file_path: str, output_path: str, process = None, chunks: tuple | bool = None, compression: str | None = "gzip", compression_opts: int = 4, shuffle: bool = True) -> bool | str:
+        """ Write all channels and directions of an .sxm scan to an NSID HDF5 file """
+        # One channel at a time is decoded, processed and written, to bound the memory use. process maps every (line, pixel) image
+        error = False
+        
+        try:
+            (scan_object, error) = self.parent.sxm.get_scan_object(file_path, lazy = True)
+            if error: raise Exception(error)
+            tensor = scan_object.tensor
+            (n_channels, n_directions, lines, pixels) = tensor.shape
+            if chunks is None: chunks = (1, lines, pixels) # One image per chunk, matching the order in which the images are written
+            dataset_options = {"chunks": chunks, "compression": compression, "compression_opts": compression_opts if compression == "gzip" else None, "shuffle": shuffle and compression is not None}
+            scan_range_nm = [float(dimension.magnitude) for dimension in scan_object.scan_range]
+            
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok = True)
+            with h5py.File(output_path, "w") as root:
+                (entry_group, channel_groups) = self.setup_file(root, [f"Channel_{channel_index:03d}" for channel_index in range(n_channels)])
+                self.create_attributes(entry_group, {"source_file": file_path, "date_time": scan_object.date_time.strftime("%Y-%m-%d %H:%M:%S"), "bias (V)": scan_object.bias.magnitude,
+                                                     "center (nm)": scan_object.frame["center (nm)"], "scan_range (nm)": scan_range_nm, "angle (deg)": scan_object.frame["angle (deg)"]})
+                
+                for channel_index, channel_group in enumerate(channel_groups):
+                    channel = str(scan_object.channels[channel_index])
+                    (quantity, unit, backward, error) = self.parent.split_physical_quantity(channel)
+                    self.create_attributes(channel_group, {"title": channel})
+
+                    axes_datasets = [
+                        self.create_dataset(channel_group, "direction", {"units": "none", "quantity": "direction", "dimension_type": "frame"}, data = np.arange(n_directions)),
+                        self.create_dataset(channel_group, "y", {"units": "nm", "quantity": "Length", "dimension_type": "spatial"}, data = np.linspace(0, scan_range_nm[1], lines)),
+                        self.create_dataset(channel_group, "x", {"units": "nm", "quantity": "Length", "dimension_type": "spatial"}, data = np.linspace(0, scan_range_nm[0], pixels))
+                    ]
+                    dataset = self.create_dataset(channel_group, "data", {"quantity": quantity, "units": unit or "none", "data_type": "IMAGE_STACK", "modality": channel, "source": "Nanonis"},
+                                                  dtype = np.float32, shape = (n_directions, lines, pixels), **dataset_options)
+                    
+                    for direction_index in range(n_directions):
+                        image = tensor[channel_index, direction_index]
+                        if process: image = process(image)
+                        dataset[direction_index] = np.real(image).astype(np.float32, copy = False)
+                    tensor.release(channel_index) # The decoded images of this channel are not needed anymore
+                    
+                    self.attach_axes_to_dataset(dataset, axes_datasets)
+            error = False
+        except Exception as e:
+            error = f"Error exporting {file_path} to HDF5: {e}"
+        
+        return error
+
+    def create_live_scan(self, output_path: str, channel_names: list[str], pixels: int, lines: int = None, n_directions: int = 2, scan_range_nm: list = None, chunk_lines: int = 16, flush_interval: float = 1.) -> tuple["HDF5LiveWriter", bool | str]:
+        """ Create an NSID HDF5 file whose channels grow by scan lines """
+        # Every channel is (direction, line, pixel), resizable along the lines. writer.append takes lines of shape (channel, direction, n_lines, pixel)
+        (writer, root) = (None, None)
+        error = False
+        
+        try:
+            if scan_range_nm is None: scan_range_nm = [float(pixels), float(lines or pixels)]
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok = True)
+            root = h5py.File(output_path, "w", libver = "latest") # SWMR needs the latest file format
+            (entry_group, channel_groups) = self.setup_file(root, [f"Channel_{channel_index:03d}" for channel_index in range(len(channel_names))])
+            root.create_dataset("live", data = True) # Cleared when the writer is closed. Unlike attributes, datasets can still be written in SWMR mode
+            self.create_attributes(entry_group, {"date_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "scan_range (nm)": scan_range_nm})
+            
+            datasets = []
+            for channel_name, channel_group in zip(channel_names, channel_groups):
+                (quantity, unit, backward, error) = self.parent.split_physical_quantity(channel_name)
+                self.create_attributes(channel_group, {"title": channel_name})
+                axes_datasets = [
+                    self.create_dataset(channel_group, "direction", {"units": "none", "quantity": "direction", "dimension_type": "frame"}, data = np.arange(n_directions)),
+                    self.create_dataset(channel_group, "y", {"units": "nm", "quantity": "Length", "dimension_type": "spatial"}, data = np.linspace(0, scan_range_nm[1], lines or chunk_lines)),
+                    self.create_dataset(channel_group, "x", {"units": "nm", "quantity": "Length", "dimension_type": "spatial"}, data = np.linspace(0, scan_range_nm[0], pixels))
+                ]
+                dataset = self.create_dataset(channel_group, "data", {"quantity": quantity, "units": unit or "none", "data_type": "IMAGE_STACK", "modality": channel_name, "source": "Nanonis"},
+                                              dtype = np.float32, shape = (n_directions, 0, pixels), maxshape = (n_directions, lines, pixels), chunks = (1, chunk_lines, pixels), fillvalue = np.nan)
+                self.attach_axes_to_dataset(dataset, axes_datasets)
+                datasets.append(dataset)
+            
+            writer = HDF5LiveWriter(root, datasets, axis = 1, flush_interval = flush_interval)
+            error = False
+        except Exception as e:
+            error = f"Error creating the live HDF5 file {output_path}: {e}"
+            if root is not None: root.close()
+        
+        return (writer, error)
+
+    def create_live_spectra(self, output_path: str, channel_names: list[str], points: int, sweep: np.ndarray = None, chunk_spectra: int = 16, flush_interval: float = 1.) -> tuple["HDF5LiveWriter", bool | str]:
+        """ Create an NSID HDF5 file whose channels grow by spectra """
+        # Every channel is (spectrum, point), resizable along the spectra, with the positions (nm) in a shared dataset. writer.append takes spectra of shape (channel, n_spectra, point)
+        (writer, root) = (None, None)
+        error = False
+        
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok = True)
+            root = h5py.File(output_path, "w", libver = "latest") # SWMR needs the latest file format
+            (entry_group, channel_groups) = self.setup_file(root, [f"Channel_{channel_index:03d}" for channel_index in range(len(channel_names))])
+            root.create_dataset("live", data = True) # Cleared when the writer is closed. Unlike attributes, datasets can still be written in SWMR mode
+            self.create_attributes(entry_group, {"date_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+            positions = self.create_dataset(entry_group, "positions", {"units": "nm", "quantity": "Length"}, dtype = np.float64, shape = (0, 3), maxshape = (None, 3), chunks = (chunk_spectra, 3))
+            
+            datasets = []
+            for channel_name, channel_group in zip(channel_names, channel_groups):
+                (quantity, unit, backward, error) = self.parent.split_physical_quantity(channel_name)
+                self.create_attributes(channel_group, {"title": channel_name})
+                axes_datasets = [
+                    self.create_dataset(channel_group, "spectrum", {"units": "none", "quantity": "spectrum", "dimension_type": "frame"}, data = np.arange(chunk_spectra)),
+                    self.create_dataset(channel_group, "sweep", {"units": "none", "quantity": "sweep", "dimension_type": "spectral"}, data = np.arange(points) if sweep is None else np.asarray(sweep))
+                ]
+                dataset = self.create_dataset(channel_group, "data", {"quantity": quantity, "units": unit or "none", "data_type": "SPECTRUM", "modality": channel_name, "source": "Nanonis"},
+                                              dtype = np.float32, shape = (0, points), maxshape = (None, points), chunks = (chunk_spectra, points), fillvalue = np.nan)
+                self.attach_axes_to_dataset(dataset, axes_datasets)
+                datasets.append(dataset)
+            
+            writer = HDF5LiveWriter(root, datasets, axis = 0, positions = positions, flush_interval = flush_interval)
+            error = False
+        except Exception as e:
+            error = f"Error creating the live HDF5 file {output_path}: {e}"
+            if root is not None: root.close()
+        
+        return (writer, error)
+
+    def create_stack(self, file_paths: list[str], output_path: str, channel: int | str = 0, direction: int = 0) -> bool | str:
+        """ Stack one channel and direction of N exported scans into a virtual dataset """
+        # The (N, lines, pixels) dataset refers to the per-scan NSID files, without copying any data. The channel is an index, a title like 'Z (nm)' or a quantity like 'Z'
+        # Scans whose images differ in shape from the first are left out; missing data reads as NaN
+        error = False
+        
+        try:
+            output_folder = os.path.dirname(os.path.abspath(output_path))
+            sources = [] # (path relative to the stack, dataset name, shape) of the scans
+            (date_times, first_group) = ([], None)
+            for file_path in file_paths:
+                with h5py.File(file_path, "r", swmr = True) as root:
+                    entry_group = root[root.attrs.get("default", "Measurement_000")]
+                    (dataset_names, titles) = self.find_channel_datasets(entry_group)
+                    if isinstance(channel, str): channel_index = next((index for index, title in enumerate(titles) if channel in [title, self.parent.split_physical_quantity(title)[0]]), None)
+                    else: channel_index = channel
+                    if channel_index is None: raise ValueError(f"No channel {channel} in {file_path}")
+                    dataset_name = dataset_names[channel_index]
+                    shape = root[dataset_name].shape
+                    if first_group is None: (first_group, first_shape, first_title) = (root[dataset_name].parent.name, shape, titles[dataset_names.index(dataset_name)])
+                    elif shape[1:] != first_shape[1:]:
+                        print(f"Skipping {file_path} in the stack, since its images are {shape[1:]} rather than {first_shape[1:]}")
+                        continue
+                    
+                    # Relative paths are resolved against the folder of the stack, so that the stack and its scans can be moved together
+                    sources.append((os.path.relpath(os.path.abspath(file_path), output_folder), dataset_name, shape))
+                    date_times.append(str(entry_group.attrs.get("date_time", "")))
+            if not sources: raise ValueError("No scans to stack")
+            
+            (lines, pixels) = first_shape[1:]
+            layout = h5py.VirtualLayout(shape = (len(sources), lines, pixels), dtype = np.float32)
+            for scan_index, (source_path, dataset_name, shape) in enumerate(sources):
+                layout[scan_index] = h5py.VirtualSource(source_path, dataset_name, shape = shape)[direction]
+            
+            os.makedirs(output_folder, exist_ok = True)
+            with h5py.File(output_path, "w", libver = "latest") as root, h5py.File(file_paths[0], "r", swmr = True) as first_root:
+                (entry_group, channel_groups) = self.setup_file(root, "Channel_000")
+                channel_group = channel_groups[0]
+                self.create_attributes(channel_group, {"title": first_title})
+                
+                # The shared axes: the scan index, with the source files and their dates as auxiliary datasets, and the y and x axes of the first scan
+                axes_datasets = [self.create_dataset(channel_group, "scan", {"units": "none", "quantity": "scan", "dimension_type": "temporal"}, data = np.arange(len(sources)))]
+                axes_datasets.extend([self.create_dataset(channel_group, name, self.copy_attributes(first_root[first_group][name]), data = first_root[first_group][name][()]) for name in ["y", "x"]])
+                self.create_dataset(channel_group, "source_files", data = np.array([source_path for (source_path, _, _) in sources], dtype = h5py.string_dtype()))
+                self.create_dataset(channel_group, "date_times", data = np.array(date_times, dtype = h5py.string_dtype()))
+                
+                dataset = channel_group.create_virtual_dataset("data", layout, fillvalue = np.nan)
+                self.create_attributes(dataset, {**self.copy_attributes(first_root[first_group]["data"]), "data_type": "IMAGE_STACK", "direction": direction})
+                self.attach_axes_to_dataset(dataset, axes_datasets)
+        except Exception as e:
+            error = f"Error creating the HDF5 stack {output_path}: {e}"
+        
+        return error
+
+    def export_folder(self, folder: str, output_folder: str, progress_callback = None, **export_options) -> tuple[list, bool | str]:
+        """ Export every .sxm scan in a folder (or archive) with export_scan """
+        error = False
+        output_paths = []
+        
+        try:
+            archives = self.parent.archives
+            file_names = sorted([file_name for file_name in archives.list_folder(folder) if archives.get_extension(file_name) == ".sxm"])
+            for n_done, file_name in enumerate(file_names, start = 1):
+                output_path = os.path.join(output_folder, os.path.splitext(file_name.removesuffix(".gz"))[0] + ".hdf5")
+                scan_error = self.export_scan(os.path.join(folder, file_name), output_path, **export_options)
+                if scan_error:
+                    print(scan_error)
+                    error = scan_error
+                else: output_paths.append(output_path)
+                if progress_callback: progress_callback(n_done, len(file_names))
+        except Exception as e:
+            error = f"Error exporting the folder {folder} to HDF5: {e}"
+        
+        return (output_paths, error)
+
 
 
-    def read_file(self, file_path: str) -> dict:
+    def read_file(self, file_path: str, lazy: bool = False) -> dict:
         if not os.path.isfile(file_path):
             print("Invalid file path provided to read_hdf5")
             return {}
@@ -105,9 +321,10 @@ class HDF5Functions:
         main_group = None
         axes_names = []
         axis_data = {}
+        channel_datasets = ([], []) # Names and titles of the channel datasets of an NSID file, which lazy datasets stack
 
         try:
-            with h5py.File(file_path, "r") as root:
+            with (nullcontext(self.parent.h5_files.get(file_path)) if lazy else h5py.File(file_path, "r", swmr = True)) as root: # Lazy datasets keep the file open in the pool. SWMR mode allows reading files that are still being written
                 """
                 Parsing the root
                 """
@@ -150,6 +367,11 @@ class HDF5Functions:
                     print("Could not determine the main group in HDF5 file")
                     return(output_dict)
                 
+                # Follow the NeXus default from an NXentry to its NXdata group, as in the files written by setup_file
+                if main_group.attrs.get("NX_class") == "NXentry" and main_group.attrs.get("default") in main_group:
+                    if lazy: channel_datasets = self.find_channel_datasets(main_group)
+                    main_group = main_group[main_group.attrs.get("default")]
+                
                 
                 
                 """
@@ -170,7 +392,9 @@ class HDF5Functions:
                     signal_name = main_group.attrs.get("signal", "")
                     if isinstance(signal_name, bytes): signal_name = signal_name.decode("utf-8")
 
-                    dataset = main_group[signal_name][:]
+                    if not lazy: dataset = main_group[signal_name][:]
+                    elif len(channel_datasets[0]) > 1: dataset = HDF5Dataset(self.parent.h5_files, file_path, channel_datasets[0])
+                    else: dataset = HDF5Dataset(self.parent.h5_files, file_path, main_group[signal_name].name)
                     output_dict.update({"signal": signal_name, "dataset": dataset})
 
                 if "axes" in main_group.attrs:
@@ -183,7 +407,7 @@ class HDF5Functions:
                     for axis_index, axis_name in enumerate(axes_names): # Loop over axis names
                         split_name = axis_name.split()
                         if not "indices" in split_name[-1]:
-                            axis_data.update({axis_name: main_group[axis_name][:]})
+                            axis_data.update({axis_name: HDF5Dataset(self.parent.h5_files, file_path, main_group[axis_name].name) if lazy else main_group[axis_name][:]})
                             continue
                         
                         quantity = " ".join(split_name[:-1]) # Discard 'indices' from the name
@@ -194,16 +418,18 @@ class HDF5Functions:
                             axis_data.update({new_name: new_axis_data})
                             axes_names[axis_index] = new_name
                 
+                    if isinstance(dataset, HDF5Dataset) and dataset.stacked: (axes_names, axis_data) = (["channels"] + axes_names, {"channels": channel_datasets[1], **axis_data})
+                    if isinstance(dataset, HDF5Dataset): dataset.axes = axes_names
                     output_dict.update({"axes": axes_names, "axes_data": axis_data})
 
 
 
                 # If Nexus parsing failed: extract the scan or spectroscopy data
-                if not isinstance(dataset, np.ndarray):
+                if dataset is None:
                     recognized_tags = ["main", "sweep", "scan", "measurement", "spectrum", "spectroscopy", "data", "array"]
                     for tag in recognized_tags:
                         if tag in main_group.keys():
-                            dataset = main_group[tag][:]
+                            dataset = HDF5Dataset(self.parent.h5_files, file_path, main_group[tag].name) if lazy else main_group[tag][:]
                             output_dict.update({"dataset": dataset})
                             break
                 
@@ -250,85 +476,1773 @@ class HDF5Functions:
 
 
 
+@dataclass
+class SXMHeader:
+    """ Typed record of an .sxm header, in the units written by Nanonis """
+    tags: dict = field(default_factory = dict) # {":TAG:": [lines following the tag]}
+    lines_raw: list = field(default_factory = list)
+    header_size: int = 0
+    payload_offset: int = 0
+    pixels: int = 1
+    lines: int = 1
+    up_or_down: str = "up"
+    scan_range: list = field(default_factory = lambda: [1E-8, 1E-8])
+    offset: list = field(default_factory = lambda: [0., 0.])
+    angle: float = 0.
+    bias: float = 0.
+    scan_date: str = "01.01.1900"
+    start_time: str = "00:00:00"
+    channels: list = field(default_factory = list) # Like 'Z (m)' or 'Current (A)'
+    z_controller: dict = field(default_factory = dict)
+
+    @property
+    def date_time(self) -> datetime:
+        return datetime.strptime(f"{self.scan_date} {self.start_time}", "%d.%m.%Y %H:%M:%S")
+
+    def to_sct_dict(self) -> dict:
+        sct_dict = {"scan_range (m)": self.scan_range, "angle (deg)": self.angle, "offset (m)": self.offset, "start_time": self.start_time, "scan_date": self.scan_date,
+                    "grid_size": [self.pixels, self.lines], "up_or_down": self.up_or_down, "V_nanonis (V)": self.bias, "payload_offset": self.payload_offset}
+        return sct_dict
+
+
+
 class SXMFunctions:
+    header_end_tag = b":SCANIT_END:"
+    read_size = 65536 # Nanonis headers are typically a few kB, so a single read almost always contains the whole header
+    number_pattern = re.compile(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?")
+    file_units = {"nm": ("m", 1E-9), "pA": ("A", 1E-12)} # Units of get_scan_object and the factor that converts them back to the units of the file
+
     def __init__(self, parent):
         self.parent: IOFunctions = parent
 
-    def get_raw_header(self, file_path: str) -> list:
-        header_end_tag = ":SCANIT_END:"
-        raw_header = []
+    def read_header_bytes(self, file_path: str) -> tuple[bytes, int, int]:
+        """ Read the raw header bytes and find the header size and the offset of the payload """
+        with self.parent.archives.open(file_path) as file:
+            buffer = file.read(self.read_size)
+            end_index = buffer.find(self.header_end_tag)
+            while end_index == -1:
+                chunk = file.read(self.read_size)
+                if not chunk: raise ValueError(f"No {self.header_end_tag.decode()} tag found in {file_path}")
+                buffer += chunk
+                end_index = buffer.find(self.header_end_tag, max(0, len(buffer) - len(chunk) - len(self.header_end_tag)))
+            
+            # The header ends with the newline after the end tag. The payload starts after the 0x1A 0x04 marker that follows it
+            header_size = buffer.find(b"\n", end_index) + 1
+            if len(buffer) < header_size + 16: buffer += file.read(16)
+        
+        marker_index = buffer.find(b"\x1a\x04", header_size, header_size + 16)
+        payload_offset = marker_index + 2 if marker_index != -1 else header_size + 4
+        return (buffer[:header_size], header_size, payload_offset)
+
+    def split_tags(self, lines: list) -> dict:
+        tags = {}
+        values = []
+        for line in lines:
+            if line.startswith(":") and line.endswith(":") and len(line) > 1:
+                values = []
+                tags.update({line: values})
+            else: values.append(line)
+        return tags
+
+    def get_numbers(self, line: str) -> list:
+        return [float(number) for number in self.number_pattern.findall(line)]
+
+    def tokenize_header(self, file_path: str) -> SXMHeader:
+        (header_bytes, header_size, payload_offset) = self.read_header_bytes(file_path)
+        lines_raw = header_bytes.decode(errors = "replace").splitlines(keepends = True)
+        header = self.parse_tags(self.split_tags([line.rstrip("\r\n") for line in lines_raw]))
+        (header.lines_raw, header.header_size, header.payload_offset) = (lines_raw, header_size, payload_offset)
+        return header
+
+    def parse_tags(self, tags: dict) -> SXMHeader:
+        header = SXMHeader(tags = tags)
+        first_line = lambda tag: (tags.get(tag) or [""])[0] # Most tags have their value on the first line after the tag
         
         try:
-            with open(file_path, "rb") as file:
-                for line in file:
-                    decoded = line.decode()
-                    
-                    raw_header.append(decoded)
-                    if header_end_tag in decoded: break
+            (header.pixels, header.lines) = [int(number) for number in self.get_numbers(first_line(":SCAN_PIXELS:"))[:2]]
+        except Exception:
+            print("Problem reading tag :SCAN_PIXELS: from .sxm file")
+        
+        for (tag, attribute) in [(":SCAN_RANGE:", "scan_range"), (":SCAN_OFFSET:", "offset")]:
+            numbers = self.get_numbers(first_line(tag))
+            if len(numbers) == 2: setattr(header, attribute, numbers)
+            else: print(f"Problem reading tag {tag} from .sxm file")
+        
+        for (tag, attribute) in [(":SCAN_ANGLE:", "angle"), (":BIAS:", "bias")]:
+            numbers = self.get_numbers(first_line(tag))
+            if len(numbers) > 0: setattr(header, attribute, numbers[0])
+            else: print(f"Problem reading tag {tag} from .sxm file")
+        
+        for (tag, attribute) in [(":SCAN_DIR:", "up_or_down"), (":REC_DATE:", "scan_date"), (":REC_TIME:", "start_time")]:
+            values_split = first_line(tag).split()
+            if len(values_split) > 0: setattr(header, attribute, values_split[0])
+            else: print(f"Problem reading tag {tag} from .sxm file")
+
+        # Z_controller: a row of column names followed by a row of values
+        try:
+            [_, z_controller_name, feedback, setpoint, p_gain, i_gain, t_const] = tags[":Z-CONTROLLER:"][1].split("\t")
+            header.z_controller = {"name": z_controller_name, "feedback": feedback.strip() not in ["0", "FALSE", "Off"], "setpoint": setpoint, "p_gain": p_gain, "i_gain": i_gain, "t_const": t_const}
         except Exception as e:
-            print(f"Unable to retrieve raw sxm header: {e}")
-        return raw_header
+            print(f"Problem retrieving z-controller data from .sxm file: {e}")
 
-    def read_header_quick(self, file_path: str) -> tuple[np.ndarray, dict]:
+        # Channels: a row of column names followed by one row per channel
         try:
-            raw_header = self.get_raw_header(file_path)
-            header = np.array(raw_header, dtype = np.str_)
+            for channel_line in tags[":DATA_INFO:"][1:]:
+                channel_data = channel_line.split()
+                if len(channel_data) < 1: break
+                [channel_index, quantity, unit, direction, calibration, offset] = channel_data
+                header.channels.append(f"{quantity} ({unit})")
+        except Exception as e:
+            print(f"Problem retrieving channel data from .sxm file: {e}")
+        
+        return header
 
-            nanonis_tags = [":SCAN_RANGE:\n", ":SCAN_ANGLE:\n", ":SCAN_OFFSET:\n", ":REC_TIME:\n", ":REC_DATE:\n", ":SCAN_PIXELS:\n", ":SCAN_DIR:\n", ":BIAS:\n"]
-            sct_tags = ["scan_range (m)", "angle (deg)", "offset (m)", "start_time", "scan_date", "grid_size", "up_or_down", "V_nanonis (V)"]
+    def get_scan_object(self, file_path: str, units: dict = {"length": "m", "current": "A"}, default_channel_units: dict = {}, lazy: bool = True, live_tail: "SXMLiveTail" = None, dtype: np.dtype = np.float32) -> tuple[object, bool | str]:
+        """ Scan object whose tensor memory-maps the payload """
+        # Only the channel/direction slices that are accessed are decoded
+        error = False
+        ureg = self.parent.ureg
 
-            sct_dict = {}
-            for nanonis_tag, sct_tag in zip(nanonis_tags, sct_tags):
-                try:
-                    index = np.where(header == nanonis_tag)[0][0]
-                    values_split = header[index + 1].split()
+        try:
+            # A live tail already holds the header and the lines recorded so far, so the file is not read again
+            if live_tail: header = live_tail.header
+            else: header = self.tokenize_header(file_path)
+            (pixels, lines_uncropped) = (header.pixels, header.lines)
+            scan_range_uncropped = np.array(header.scan_range, dtype = float)
+            feedback = header.z_controller.get("feedback", True)
+            setpoint_str = header.z_controller.get("setpoint", "0 A")
+
+            # Translate the channels to preferred units. The scale factors are applied per slice when it is decoded
+            channels = []
+            scale_factors = []
+            for channel_name in header.channels:
+                (quantity, channel_unit, _, _) = self.parent.split_physical_quantity(channel_name)
+                match channel_unit:
+                    case "A": (channel_unit, scale_factor) = ("pA", 1E12)
+                    case "m": (channel_unit, scale_factor) = ("nm", 1E9)
+                    case _: scale_factor = 1
+                channels.append(f"{quantity} ({channel_unit})")
+                scale_factors.append(scale_factor)
+            channels = np.array(channels)
+            channel_units = {key: value for key, value in default_channel_units.items() if key in channels}
+
+            if live_tail: raw_tensor = live_tail.raw
+            else: raw_tensor = self.parent.archives.get_array(file_path, ">f4", header.payload_offset, (len(channels), 2, lines_uncropped, pixels))
+            scan_tensor_uncropped = LazyScanTensor(raw_tensor, scale_factors, header.up_or_down, crop = False, dtype = dtype)
+            scan_tensor = LazyScanTensor(raw_tensor, scale_factors, header.up_or_down, crop = True, dtype = dtype)
+            if not lazy: (scan_tensor_uncropped, scan_tensor) = (np.asarray(scan_tensor_uncropped), np.asarray(scan_tensor))
 
-                    if nanonis_tag in [":REC_TIME:\n", ":REC_DATE:\n", ":SCAN_DIR:\n"]:
-                        sct_dict.update({sct_tag: values_split[0]})
-                    else:
-                        values_num = [self.parent.get_scientific_numbers(value)[0] for value in values_split]
-                        if len(values_num) < 2: values_num = values_num[0]
-                        sct_dict.update({sct_tag: values_num})
-                except Exception as e:
-                    print(f"Problem reading tag {nanonis_tag.split()[0]} from .sxm file")
+            # Recalculate the scan range on the basis of the fraction of leftover lines (after cropping) to lines before cropping
+            [lines, pixels] = scan_tensor.shape[2:]
+            scan_range = np.array([scan_range_uncropped[0], scan_range_uncropped[1] * lines / lines_uncropped])
+            scan_range_unitized = [ureg.Quantity(range_dim, "m").to("nm") for range_dim in scan_range]
+
+            setpoint_unitized = ureg.Quantity(float(setpoint_str.split()[0]), "A").to("pA")
+            x_center = ureg.Quantity(float(header.offset[0]), "m").to("nm")
+            y_center = ureg.Quantity(float(header.offset[1]), "m").to("nm")
+            angle = ureg.Quantity(float(header.angle), "degree")
+            center = [x_center, y_center]
+            center_nm = [dim.magnitude for dim in center]
+            frame = {
+                "x (nm)": x_center.magnitude,
+                "y (nm)": y_center.magnitude,
+                "center (nm)": center_nm,
+                "offset (nm)": center_nm,
+                "scan_range (nm)": [dim.magnitude for dim in scan_range_unitized],
+                "angle (deg)": angle.magnitude
+            }
+
+            scan_object = SXMScan(file_path, header)
+            attributes = {"default_channel_units": default_channel_units, "channel_units": channel_units, "units": units, "bias": ureg.Quantity(round(header.bias, 3), "V"), "channels": channels,
+                          "tensor_uncropped": scan_tensor_uncropped, "pixels_uncropped": pixels, "lines_uncropped": lines_uncropped, "scan_range_uncropped": scan_range_uncropped,
+                          "scan_range_uncropped_unitized": [ureg.Quantity(range_dim, "m") for range_dim in scan_range_uncropped], "tensor": scan_tensor, "pixels": pixels, "lines": lines,
+                          "scan_range": scan_range_unitized, "feedback": feedback, "setpoint": setpoint_unitized, "date_time": header.date_time, "angle": angle, "x": x_center, "y": y_center,
+                          "center": center, "offset": center, "frame": frame}
+            for name, value in attributes.items(): setattr(scan_object, name, value)
+
+            return (scan_object, error)
+
+        except Exception as e:
+            error = f"Error reading sxm file: {e}"
+            return (error, error)
+
+    def open_live_tail(self, file_path: str) -> "SXMLiveTail":
+        live_tail = SXMLiveTail(self, file_path)
+        live_tail.poll()
+        return live_tail
+
+    def get_raw_header(self, file_path: str) -> list:
+        raw_header = []
+        try:
+            raw_header = self.tokenize_header(file_path).lines_raw
+        except Exception as e:
+            print(f"Unable to retrieve raw sxm header: {e}")
+        return raw_header
+
+    def read_header_quick(self, file_path: str) -> tuple[list, dict]:
+        header_lines = []
+        sct_dict = {}
+        try:
+            header = self.tokenize_header(file_path)
+            header_lines = header.lines_raw
+            sct_dict = header.to_sct_dict()
         except Exception as e:
             print(f"Error getting the SXM file header: {e}")
-        return (header, sct_dict)
+        return (header_lines, sct_dict)
 
-    def read_header_full(self, file_path: str) -> tuple[np.ndarray, dict]:
+    def read_header_full(self, file_path: str) -> tuple[list, dict]:
+        header_lines = []
+        sct_dict = {}
         try:
-            (header_array, sct_dict) = self.read_header_quick(file_path)
-            [pixels, lines] = [int(sct_dict.get("grid_size", [1, 1])[i]) for i in range(2)]
-            sct_dict.update({"pixels": pixels, "lines": lines})
-            
+            header = self.tokenize_header(file_path)
+            header_lines = header.lines_raw
+            sct_dict = header.to_sct_dict()
+            sct_dict.update({"pixels": header.pixels, "lines": header.lines, "z_controller": header.z_controller, "channels": header.channels})
+
             frame = self.parent.convert_to_sct_frame(sct_dict)
             sct_dict.update({"frame": frame})
         except Exception as e:
             print(f"Problem reading the SXM file header: {e}")
+        return (header_lines, sct_dict)
+
+    def get_header_bytes(self, header: SXMHeader) -> bytes:
+        """ Header of an .sxm file, including the 0x1A 0x04 marker """
+        # Tags that are not described by the fields of the header are written as they are
+        tags = {tag: list(values) for tag, values in header.tags.items() if tag != ":SCANIT_END:"}
+        tags.update({
+            ":REC_DATE:": [header.scan_date],
+            ":REC_TIME:": [header.start_time],
+            ":SCAN_PIXELS:": [f"       {header.pixels}       {header.lines}"],
+            ":SCAN_RANGE:": ["".join(f"{value:>22.6E}" for value in header.scan_range)],
+            ":SCAN_OFFSET:": ["".join(f"{value:>22.6E}" for value in header.offset)],
+            ":SCAN_ANGLE:": [f"{header.angle:>20.3E}"],
+            ":SCAN_DIR:": [header.up_or_down],
+            ":BIAS:": [f"{header.bias:>21.3E}"]
+        })
+        if header.z_controller and ":Z-CONTROLLER:" not in tags:
+            z_controller = header.z_controller
+            values = [z_controller.get("name", ""), "1" if z_controller.get("feedback", True) else "0"] + [z_controller.get(key, "") for key in ["setpoint", "p_gain", "i_gain", "t_const"]]
+            tags.update({":Z-CONTROLLER:": ["\tName\ton\tSetpoint\tP-gain\tI-gain\tT-const", "\t" + "\t".join(values)]})
         
-        # Z_controller
+        # Channels: a row of column names followed by one row per channel, and an empty row
+        channel_rows = []
+        for channel_index, channel_name in enumerate(header.channels):
+            (quantity, unit, _, _) = self.parent.split_physical_quantity(channel_name)
+            channel_rows.append(f"\t{14 + channel_index}\t{quantity.replace(" ", "_")}\t{unit}\tboth\t1.000E+0\t0.000E+0")
+        tags.update({":DATA_INFO:": ["\tChannel\tName\tUnit\tDirection\tCalibration\tOffset"] + channel_rows + [""]})
+
+        header_lines = []
+        for tag, values in tags.items(): header_lines.extend([tag] + values)
+        header_lines.append(":SCANIT_END:")
+        return ("\n".join(header_lines) + "\n\n\n").encode() + b"\x1a\x04"
+
+    def write_sxm(self, file_path: str, tensor, channels: list, header: SXMHeader = None, chunk_lines: int = 256) -> bool | str:
+        """ Write a tensor (channel, direction, line, pixel) to an .sxm file """
+        # The tensor is oriented and in the units of get_scan_object. The slices are converted to big-endian float32 in file units through one reusable buffer and streamed in file order
+        error = False
+
         try:
-            z_controller_index = np.where(header_array == ":Z-CONTROLLER:\n")[0][0]
-            z_controller_data = header_array[z_controller_index + 2].split("\t")
-            [_, z_controller_name, feedback, setpoint, p_gain, i_gain, t_const] = z_controller_data
-            sct_dict.update({"z_controller": {"name": z_controller_name, "feedback": bool(feedback), "setpoint": setpoint, "p_gain": p_gain, "i_gain": i_gain, "t_const": t_const}})
+            (n_channels, n_directions, lines, pixels) = np.shape(tensor)
+            if n_directions != 2 or len(channels) != n_channels: raise ValueError(f"Expected a tensor with {len(channels)} channels and 2 directions, got shape {np.shape(tensor)}")
+            
+            # A cropped tensor keeps the scan range per line of the original scan
+            if header is None: header = SXMHeader(lines = lines)
+            header = replace(header, tags = dict(header.tags))
+            if header.lines != lines: header.scan_range = [header.scan_range[0], header.scan_range[1] * lines / header.lines]
+            (header.pixels, header.lines, header.channels) = (pixels, lines, [])
+            
+            scale_factors = []
+            for channel_name in channels:
+                (quantity, unit, _, _) = self.parent.split_physical_quantity(channel_name)
+                (file_unit, scale_factor) = self.file_units.get(unit, (unit, 1.))
+                header.channels.append(f"{quantity} ({file_unit})")
+                scale_factors.append(scale_factor)
+            
+            buffer = np.empty((min(chunk_lines, lines), pixels), dtype = ">f4")
+            with open(file_path, "wb") as file:
+                file.write(self.get_header_bytes(header))
+                
+                for channel_index in range(n_channels):
+                    for direction_index in range(2):
+                        # Undo the flips of decoding with views: lines in the order of recording, and backward lines from right to left
+                        image = tensor[channel_index, direction_index]
+                        if header.up_or_down == "down": image = image[::-1]
+                        if direction_index == 1: image = image[:, ::-1]
+                        
+                        for start_line in range(0, lines, len(buffer)):
+                            block = buffer[: min(len(buffer), lines - start_line)]
+                            np.multiply(image[start_line : start_line + len(block)], scale_factors[channel_index], out = block, casting = "unsafe")
+                            file.write(block)
         except Exception as e:
-            print(f"Problem retrieving z-controller data from .sxm file: {e}")
+            error = f"Error writing sxm file: {e}"
+
+        return error
+
+    def write_scan_object(self, file_path: str, scan_object: "SXMScan", tensor = None) -> bool | str:
+        """ Write a scan object, or a processed tensor of its channels, to an .sxm file """
+        if tensor is None: tensor = scan_object.tensor
+        return self.write_sxm(file_path, tensor, list(scan_object.channels), scan_object.header)
+
+
+
+class DATFunctions:
+    """ Native reader for Nanonis point spectroscopy (.dat) files """
+    data_tag = b"[DATA]"
+    read_size = 16384
+    header_read_size = 4096 # A typical header fits in the first block
+    large_file_size = 1 << 28 # Files from this size on (time traces) are read through a binary sidecar instead of being decoded into memory
+    matrix_dtype = np.dtype(np.float32) # Of the matrices of get_matrix, whether they come from the spectra cache, the decoded spectra or a binary sidecar
+    coordinate_pattern = re.compile(rb"^([XYZ]) \(([^)\t]+)\)\t([^\t\r\n]+)", re.MULTILINE) # The X (m), Y (m) and Z (m) lines
+    date_pattern = re.compile(rb"^Saved Date\t(\d+)\.(\d+)\.(\d+) (\d+):(\d+):(\d+)", re.MULTILINE)
+    unit_scales = {b"m": 1., b"mm": 1E-3, b"um": 1E-6, "µm".encode(): 1E-6, b"nm": 1E-9, b"pm": 1E-12} # Length units to m
+
+    def __init__(self, parent, cache_size: int = 64):
+        self.parent: IOFunctions = parent
+        self.cache_size = cache_size # Maximum number of decoded spectra kept in memory
+        self.cache = OrderedDict() # {file_path: (column names, matrix)}, least recently used first
+        self.lock = threading.Lock()
+        self.spectra_cache = None # SpectraCache of the open folder, set by populate_spec_objects
+
+    def parse_header(self, header_bytes: bytes) -> dict:
+        """ {key: value} of the tab-separated lines before the [DATA] tag """
+        # Values are kept as strings, as nanonispy2 does
+        header = {}
+        for line in header_bytes.decode(errors = "replace").splitlines():
+            (key, _, value) = line.rstrip("\t").partition("\t")
+            if key: header.update({key: value})
+        return header
+
+    def split_file(self, data: bytes) -> tuple[dict, list, int]:
+        """ Header, column names and the offset of the first data row in the content of a .dat file """
+        tag_index = data.find(self.data_tag)
+        if tag_index == -1: raise ValueError(f"No {self.data_tag.decode()} tag found")
+        
+        names_start = data.find(b"\n", tag_index) + 1
+        names_end = data.find(b"\n", names_start)
+        if names_end == -1: names_end = len(data)
+        column_names = data[names_start : names_end].decode(errors = "replace").rstrip("\r\t").split("\t")
+        return (self.parse_header(data[:tag_index]), column_names, names_end + 1)
+
+    def read_header(self, file_path: str) -> tuple[dict, list]:
+        """ Header and column names of a .dat file, without reading the data """
+        with self.parent.archives.open(file_path) as file:
+            data = file.read(self.read_size)
+            while True:
+                tag_index = data.find(self.data_tag)
+                if tag_index != -1 and data.find(b"\n", data.find(b"\n", tag_index) + 1) != -1: break # The line with the column names is complete
+                chunk = file.read(self.read_size)
+                if not chunk: break
+                data += chunk
+        (header, column_names, data_offset) = self.split_file(data)
+        return (header, column_names)
+
+    def scan_header(self, file_path: str) -> tuple[list, datetime]:
+        """ Coordinates [x, y, z] (m) and the saved date of a .dat file """
+        # A byte-level scan of the header that stops as soon as all tags are found. Tags that are not found are None
+        coordinates = {}
+        date_match = None
+        with self.parent.archives.open(file_path) as file:
+            data = b""
+            while True:
+                chunk = file.read(self.header_read_size)
+                data += chunk
+                tag_index = data.find(self.data_tag)
+                header_end = tag_index if tag_index != -1 else data.rfind(b"\n") + 1 # Only complete header lines are scanned
+                
+                for match in self.coordinate_pattern.finditer(data, 0, header_end):
+                    if match.group(1) not in coordinates and match.group(2) in self.unit_scales: coordinates.update({match.group(1): float(match.group(3)) * self.unit_scales[match.group(2)]})
+                if not date_match: date_match = self.date_pattern.search(data, 0, header_end)
+                
+                if (len(coordinates) == 3 and date_match) or tag_index != -1 or not chunk: break
+        
+        dt_object = None
+        if date_match:
+            (day, month, year, hour, minute, second) = [int(group) for group in date_match.groups()]
+            dt_object = datetime(year, month, day, hour, minute, second)
+        return ([coordinates.get(axis) for axis in [b"X", b"Y", b"Z"]], dt_object)
+
+    def read_dat(self, file_path: str, columns: list = None, dtype: np.dtype = np.float64) -> tuple[dict, list, np.ndarray]:
+        """ Header, column names and (column, point) matrix of a .dat file """
+        # Only the requested columns (all if None) are converted
+        data = self.parent.archives.read_bytes(file_path)
+        (header, column_names, data_offset) = self.split_file(data)
+        
+        if columns is None: indices = list(range(len(column_names)))
+        else: indices = [column_names.index(column) for column in columns if column in column_names]
+        column_names = [column_names[index] for index in indices]
+        
+        if len(indices) == 0 or not data[data_offset:].strip(): return (header, column_names, np.empty((len(indices), 0), dtype = dtype))
+        values = self.parse_values(memoryview(data)[data_offset:], indices, dtype)
+        return (header, column_names, values.T)
+
+    def read_chunks(self, file_path: str, columns: list = None, chunk_size: int = 1 << 20, dtype: np.dtype = np.float64):
+        """ Generator of (column, point) chunks of a .dat file that does not fit in memory """
+        with self.parent.archives.open(file_path) as file:
+            for line in file:
+                if line.startswith(self.data_tag): break
+            column_names = file.readline().decode(errors = "replace").rstrip("\r\n\t").split("\t")
+            
+            if columns is None: indices = list(range(len(column_names)))
+            else: indices = [column_names.index(column) for column in columns if column in column_names]
+            if len(indices) == 0: return
+            
+            while True:
+                block = b"".join(itertools.islice(file, chunk_size))
+                if not block.strip(): return
+                yield self.parse_values(block, indices, dtype).T
+
+    def parse_values(self, block, indices: list, dtype: np.dtype) -> np.ndarray:
+        """ (point, column) matrix of the tab-separated lines in block """
+        # Empty fields, as of a sweep that was aborted, are read as NaN
+        try: return np.loadtxt(io.BytesIO(block), delimiter = "\t", usecols = indices, ndmin = 2, dtype = dtype, comments = None)
+        except ValueError: return np.genfromtxt(io.BytesIO(block), delimiter = "\t", usecols = indices, ndmin = 2, dtype = dtype, comments = None, filling_values = np.nan)
+
+    def get_binary_path(self, file_path: str) -> str:
+        return self.parent.archives.get_sidecar_path(os.path.dirname(file_path), os.path.basename(file_path) + ".npy")
+
+    def convert_to_binary(self, file_path: str, chunk_size: int = 1 << 20, dtype: np.dtype = np.float64) -> str:
+        """ Convert a .dat file to a (column, point) .npy sidecar and return its path """
+        binary_path = self.get_binary_path(file_path)
+        (header, column_names) = self.read_header(file_path)
+        
+        # The number of points is counted first, so that the sidecar can be written in place through a memory map
+        n_points = 0
+        with self.parent.archives.open(file_path) as file:
+            for line in file:
+                if line.startswith(self.data_tag): break
+            file.readline()
+            last_block = b"\n"
+            while block := file.read(self.read_size * 64): (n_points, last_block) = (n_points + block.count(b"\n"), block)
+            if not last_block.endswith(b"\n"): n_points += 1 # A last line without a line break
+        
+        temporary_path = binary_path + ".tmp.npy"
+        matrix = np.lib.format.open_memmap(temporary_path, mode = "w+", dtype = dtype, shape = (len(column_names), n_points))
+        n_done = 0
+        for chunk in self.read_chunks(file_path, chunk_size = chunk_size, dtype = dtype):
+            matrix[:, n_done : n_done + chunk.shape[1]] = chunk
+            n_done += chunk.shape[1]
+        matrix.flush()
+        del matrix
+        
+        if n_done < n_points: # Points that were counted for blank lines are cut off
+            matrix = np.load(temporary_path, mmap_mode = "r")
+            trimmed = np.lib.format.open_memmap(binary_path + ".trim.npy", mode = "w+", dtype = dtype, shape = (len(column_names), n_done))
+            for start in range(0, n_done, chunk_size): trimmed[:, start : start + chunk_size] = matrix[:, start : min(start + chunk_size, n_done)]
+            trimmed.flush()
+            del (matrix, trimmed)
+            os.replace(binary_path + ".trim.npy", temporary_path)
+        os.replace(temporary_path, binary_path)
+        return binary_path
+
+    def get_binary(self, file_path: str) -> tuple[list, np.ndarray]:
+        """ Column names and memory-mapped matrix of a .dat file from its sidecar """
+        # The sidecar is made when it is missing or older than the file
+        binary_path = self.get_binary_path(file_path)
+        if not os.path.isfile(binary_path) or os.stat(binary_path).st_mtime_ns < self.parent.archives.stat(file_path)[1]: self.convert_to_binary(file_path, dtype = self.matrix_dtype)
+        (header, column_names) = self.read_header(file_path)
+        matrix = np.load(binary_path, mmap_mode = "r")
+        if matrix.dtype != self.matrix_dtype: # A sidecar of an older version
+            del matrix
+            self.convert_to_binary(file_path, dtype = self.matrix_dtype)
+            matrix = np.load(binary_path, mmap_mode = "r")
+        return (column_names, matrix)
+
+    def get_matrix(self, file_path: str) -> tuple[list, np.ndarray]:
+        """ Column names and matrix of a .dat file, from the spectra cache if possible """
+        # Decoded spectra are kept in an LRU cache of cache_size spectra
+        key = (file_path, *self.parent.archives.stat(file_path)) # A file that is written again has a new size or modification time, and is decoded again
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.move_to_end(key)
+                return cached
+        
+        if self.spectra_cache is not None: # A view of the memory-mapped cache of the folder, which needs no decoding
+            file_name = os.path.relpath(file_path, self.spectra_cache.folder)
+            packed = self.spectra_cache.get(file_name) if self.spectra_cache.is_current(file_name) else None
+            if packed is not None: return packed
+        
+        if key[1] >= self.large_file_size: return self.get_binary(file_path)
+        (header, column_names, matrix) = self.read_dat(file_path, dtype = self.matrix_dtype)
+        with self.lock:
+            for stale_key in [cached_key for cached_key in self.cache if cached_key[0] == file_path]: del self.cache[stale_key]
+            self.cache.update({key: (column_names, matrix)})
+            while len(self.cache) > self.cache_size: self.cache.popitem(last = False)
+        return (column_names, matrix)
+
+
+
+class GridFunctions:
+    """ Reader for Nanonis grid spectroscopy (.3ds) files """
+    end_tag = b":HEADER_END:"
+    read_size = 16384
+
+    def __init__(self, parent):
+        self.parent: IOFunctions = parent
+
+    def parse_header(self, header_bytes: bytes) -> dict:
+        """ {key: value} of the key=value lines of the header """
+        # Values are unquoted, and values with ; separators are split into lists, as nanonispy2 does
+        header = {}
+        for line in header_bytes.decode(errors = "replace").splitlines():
+            (key, separator, value) = line.partition("=")
+            if not separator: continue
+            value = value.strip('"')
+            header.update({key: value.split(";") if ";" in value else value})
+        return header
+
+    def read_header(self, file_path: str) -> tuple[dict, int]:
+        """ Header and the offset of the binary data of a .3ds file """
+        with self.parent.archives.open(file_path) as file:
+            data = file.read(self.read_size)
+            while True:
+                tag_index = data.find(self.end_tag)
+                if tag_index != -1 and data.find(b"\n", tag_index) != -1: break
+                chunk = file.read(self.read_size)
+                if not chunk: raise ValueError(f"No {self.end_tag.decode()} tag found")
+                data += chunk
+        return (self.parse_header(data[:tag_index]), data.find(b"\n", tag_index) + 1)
+
+    def get_grid(self, file_path: str) -> "GridPayload":
+        (header, data_offset) = self.read_header(file_path)
+        (archive_path, member) = self.parent.archives.split_path(file_path)
+        if archive_path and not member: file_size = len(self.parent.archives.read_bytes(file_path)) # The decompressed size of a .gz file
+        else: file_size = self.parent.archives.stat(file_path)[0]
+        return GridPayload(file_path, header, data_offset, file_size, archives = self.parent.archives)
+
+
+
+class SessionFunctions:
+    """ Writer of session containers: a whole folder packed into one HDF5 file """
+    extension = ".session.hdf5"
+    file_extensions = (".sxm", ".dat")
+    index_dtype = np.dtype([("file_name", "S256"), ("kind", "S8"), ("file_size", "i8"), ("mtime_ns", "i8"), ("hash", "S16"), ("offset", "i8"), ("date_time", "S19"),
+                            ("x (nm)", "f8"), ("y (nm)", "f8"), ("z (nm)", "f8"), ("center_x (nm)", "f8"), ("center_y (nm)", "f8"), ("range_x (nm)", "f8"), ("range_y (nm)", "f8"), ("angle (deg)", "f8")])
 
-        # Channels
+    def __init__(self, parent):
+        self.parent: IOFunctions = parent
+
+    def get_record(self, file_path: str, file_name: str, data: bytes) -> np.void:
+        """ Index record of a file; fields that do not apply are NaN """
+        record = np.zeros(1, dtype = self.index_dtype)[0]
+        for name in self.index_dtype.names[7:]: record[name] = np.nan
+        (file_size, mtime_ns) = self.parent.archives.stat(file_path)
+        (record["file_name"], record["file_size"], record["mtime_ns"]) = (file_name.encode(), len(data), mtime_ns)
+        record["hash"] = hashlib.blake2b(data, digest_size = 8).hexdigest().encode()
+        
+        date_time = None
+        match self.parent.archives.get_extension(file_name):
+            case ".sxm":
+                record["kind"] = b"scan"
+                header = self.parent.sxm.tokenize_header(file_path)
+                (record["center_x (nm)"], record["center_y (nm)"]) = [value * 1E9 for value in header.offset]
+                (record["range_x (nm)"], record["range_y (nm)"]) = [value * 1E9 for value in header.scan_range]
+                record["angle (deg)"] = header.angle
+                try: date_time = header.date_time
+                except ValueError: pass
+            case ".dat":
+                record["kind"] = b"spectrum"
+                (coordinates, date_time) = self.parent.dat.scan_header(file_path)
+                if coordinates: (record["x (nm)"], record["y (nm)"], record["z (nm)"]) = [np.nan if value is None else value * 1E9 for value in coordinates]
+        if date_time: record["date_time"] = date_time.isoformat(timespec = "seconds").encode()
+        return record
+
+    def pack_folder(self, folder: str, output_path: str | None = None, progress_callback = None) -> tuple[str, bool | str]:
+        """ Pack the scans and spectra of a folder (or archive) into a session container """
+        # Every file is a contiguous, uncompressed byte dataset whose offset goes into the index, so members are read without HDF5 and scans are memory-mapped
+        error = False
+        if not output_path: output_path = folder.rstrip("/" + os.sep) + self.extension
+        temporary_path = output_path + ".tmp"
+        
         try:
-            channel_data_index = np.where(header_array == ":DATA_INFO:\n")[0][0]
-            channel_names = []
-            for channel_index in range(100):
-                channel_data = header_array[channel_data_index + 2 + channel_index].split()
-                if len(channel_data) < 1: break
-                [channel_index, quantity, unit, direction, calibration, offset] = channel_data
-                channel_names.append(" ".join((quantity, f"({unit})")))
+            archives = self.parent.archives
+            file_names = sorted([file_name for file_name in archives.list_folder(folder) if archives.get_extension(file_name) in self.file_extensions])
+            records = []
+            with h5py.File(temporary_path, "w") as h5_file:
+                files_group = h5_file.create_group("files")
+                for n_done, file_name in enumerate(file_names, start = 1):
+                    file_path = os.path.join(folder, file_name)
+                    member = file_name.removesuffix(".gz")
+                    try:
+                        data = archives.read_bytes(file_path) # Decompressed, such that members can be memory-mapped
+                        record = self.get_record(file_path, member, data)
+                    except Exception as e:
+                        print(f"Error packing {file_path}: {e}")
+                        continue
+                    
+                    group = files_group.create_group(member)
+                    group.attrs.update({"kind": record["kind"].decode(), "file_name": member})
+                    if data:
+                        dataset = group.create_dataset("raw", data = np.frombuffer(data, dtype = np.uint8)) # Contiguous, since it is neither chunked nor compressed
+                        record["offset"] = dataset.id.get_offset()
+                    else: record["offset"] = -1
+                    records.append(record)
+                    if progress_callback: progress_callback(n_done, len(file_names))
+                
+                index = h5_file.create_dataset("index", data = np.array(records, dtype = self.index_dtype))
+                index.attrs.update({"folder": folder, "created": datetime.now().isoformat(timespec = "seconds")})
             
-            sct_dict.update({"channels": channel_names})
+            # The container replaces an older one only once it is complete
+            os.replace(temporary_path, output_path)
         except Exception as e:
-            print(f"Problem retrieving channel data from .sxm file: {e}")
-        return (header_array, sct_dict)
+            error = f"Error packing the folder {folder} into a session container: {e}"
+            if os.path.isfile(temporary_path): os.remove(temporary_path)
+        
+        return (output_path, error)
+
+    def read_index(self, container_path: str) -> np.ndarray:
+        """ Index of a session container, as a structured array with a record per file """
+        return self.parent.archives.get_session(container_path).index
+
+
+
+class GridPayload:
+    """ Memory-mapped access to the data of a .3ds grid, indexed as (x, y, point) """
+    def __init__(self, file_path: str, header: dict, data_offset: int, file_size: int, archives: "ArchiveSource" = None):
+        self.file_path = file_path
+        self.header = header
+        as_list = lambda value: value if isinstance(value, list) else [value] # Single entries are not split into lists
+        
+        (self.pixels, self.lines) = [int(number) for number in header.get("Grid dim").split("x")]
+        self.grid_settings = [float(number) for number in header.get("Grid settings")] # Center x, center y, width, height (m) and angle (deg)
+        self.channels = as_list(header.get("Channels"))
+        self.points = int(header.get("Points"))
+        self.sweep_signal_name = header.get("Sweep Signal")
+        self.parameter_names = as_list(header.get("Fixed parameters")) + as_list(header.get("Experiment parameters"))
+        self.n_parameters = int(header.get("# Parameters (4 byte)"))
+        self.dtype = np.dtype(np.float32)
+
+        # Every pixel holds its parameters followed by the sweeps of all channels. A grid that is still being recorded (or was aborted) exposes its completed lines
+        pixel_size = self.n_parameters + len(self.channels) * self.points
+        self.lines_done = min(self.lines, (file_size - data_offset) // (4 * pixel_size * self.pixels))
+        raw_shape = (self.lines_done, self.pixels, pixel_size)
+        if self.lines_done < 1: self.raw = np.empty(raw_shape, dtype = ">f4")
+        elif archives: self.raw = archives.get_array(file_path, ">f4", data_offset, raw_shape)
+        else: self.raw = np.memmap(file_path, dtype = ">f4", mode = "r", offset = data_offset, shape = raw_shape)
+        
+        self.parameters = self.raw[:, :, : self.n_parameters].transpose(1, 0, 2) # (x, y, parameter)
+        self.sweeps = self.raw[:, :, self.n_parameters :].reshape(self.lines_done, self.pixels, len(self.channels), self.points).transpose(2, 1, 0, 3) # (channel, x, y, point)
+        self.shape = self.sweeps.shape
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple): key = (key,)
+        return self.sweeps[(slice(None),) + key].astype(self.dtype)
+
+    def __len__(self) -> int:
+        return self.pixels
+
+    @property
+    def sweep_signal(self) -> np.ndarray:
+        """ The swept signal, from the sweep start and end of the first pixel """
+        if self.lines_done < 1: return np.full(self.points, np.nan, dtype = self.dtype)
+        (sweep_start, sweep_end) = self.parameters[0, 0, :2]
+        return np.linspace(sweep_start, sweep_end, self.points, dtype = self.dtype)
+
+    def get_channel(self, channel: str) -> np.ndarray:
+        """ Memory-mapped (x, y, point) view of a single channel, in the byte order of the file """
+        return self.sweeps[self.channels.index(channel)]
+
+    def get_parameter(self, parameter: str) -> np.ndarray:
+        """ (x, y) map of a per-pixel parameter, such as X (m) or Z (m) """
+        return self.parameters[:, :, self.parameter_names.index(parameter)].astype(self.dtype)
+
+    def get_position(self, x: int, y: int) -> tuple[float, float]:
+        """ (x, y) in nm of a pixel, from the grid settings """
+        # The per-pixel parameters are spread over the whole file, so they are not read
+        (center_x, center_y, width, height, angle) = self.grid_settings[:5]
+        (u, v) = ((x / max(1, self.pixels - 1) - .5) * width, (y / max(1, self.lines - 1) - .5) * height)
+        angle_rad = np.radians(angle) # Clockwise, as the angle of a scan frame
+        return ((center_x + u * np.cos(angle_rad) + v * np.sin(angle_rad)) * 1E9, (center_y - u * np.sin(angle_rad) + v * np.cos(angle_rad)) * 1E9)
+
+    def get_date_time(self) -> datetime | None:
+        try: return datetime.strptime(self.header.get("Start time", ""), "%d.%m.%Y %H:%M:%S")
+        except ValueError: return None
+
+    def get_spectrum(self, x: int, y: int, lazy: bool = False) -> "DATSpectrum | LazyGridSpectrum":
+        """ The spectrum of a pixel, with the swept signal as its first signal """
+        if lazy: return LazyGridSpectrum(self, x, y)
+        signals = {self.sweep_signal_name: self.sweep_signal}
+        signals.update(dict(zip(self.channels, self[x, y])))
+        parameters = dict(zip(self.parameter_names, self.parameters[x, y].astype(float)))
+        return DATSpectrum(f"{self.file_path}[{x}, {y}]", parameters, signals)
+
+
+
+class SXMLiveTail:
+    """ Follows an .sxm file that is still being recorded """
+    def __init__(self, parent: SXMFunctions, file_path: str, chunk_lines: int = 16, timeout: float = 600.):
+        self.parent = parent
+        self.file_path = file_path
+        self.chunk_lines = chunk_lines # Number of lines read at once per channel and direction
+        self.timeout = timeout # Seconds without a write after which the scan is taken to be aborted. Longer than the time of a line of the slowest scans
+        self.reset()
+
+    def reset(self) -> None:
+        self.header = self.parent.tokenize_header(self.file_path)
+        (self.pixels, self.lines, self.payload_offset) = (self.header.pixels, self.header.lines, self.header.payload_offset)
+        self.line_size = 4 * self.pixels
+        
+        # Lines in file order and file units. Lines that were not recorded yet stay NaN, so they are cropped like those of an unfinished scan
+        self.raw = np.full((len(self.header.channels), 2, self.lines, self.pixels), np.nan, dtype = np.float32)
+        self.complete_lines = np.zeros((len(self.header.channels), 2), dtype = int) # Number of complete lines per channel and direction
+
+    def check_payload_offset(self) -> bool:
+        with open(self.file_path, "rb") as file:
+            file.seek(max(0, self.payload_offset - 2))
+            return file.read(2) == b"\x1a\x04"
+
+    @property
+    def finished(self) -> bool:
+        return bool(np.all(self.complete_lines == self.lines))
+
+    @property
+    def abandoned(self) -> bool:
+        """ Whether the file was not written for timeout seconds """
+        # As for a scan that was aborted and will never be completed
+        return datetime.now().timestamp() - os.path.getmtime(self.file_path) > self.timeout
+
+    def poll(self) -> bool:
+        """ Read the lines completed since the previous poll; returns whether there were any """
+        new_lines = False
+        file_size = os.path.getsize(self.file_path)
+
+        # Nanonis rewrites the header when the scan is finished. Start over if the payload moved
+        if not self.check_payload_offset():
+            self.reset()
+            if not self.check_payload_offset(): return False
+
+        with open(self.file_path, "rb") as file:
+
+            for channel_index in range(len(self.raw)):
+                for direction_index in range(2):
+                    complete_lines = self.complete_lines[channel_index, direction_index]
+                    block_offset = self.payload_offset + (2 * channel_index + direction_index) * self.lines * self.line_size
+                    
+                    while complete_lines < self.lines:
+                        line_offset = block_offset + complete_lines * self.line_size
+                        n_lines = min(self.chunk_lines, self.lines - complete_lines, (file_size - line_offset) // self.line_size)
+                        if n_lines < 1: break
+
+                        file.seek(line_offset)
+                        chunk = np.frombuffer(file.read(n_lines * self.line_size), dtype = ">f4").reshape(n_lines, self.pixels)
+                        incomplete = np.isnan(chunk).any(axis = 1)
+                        n_complete = int(np.argmax(incomplete)) if incomplete.any() else n_lines
+                        
+                        self.raw[channel_index, direction_index, complete_lines : complete_lines + n_complete] = chunk[:n_complete]
+                        complete_lines += n_complete
+                        if n_complete < n_lines: break
+                    
+                    if complete_lines > self.complete_lines[channel_index, direction_index]:
+                        self.complete_lines[channel_index, direction_index] = complete_lines
+                        new_lines = True
+        return new_lines
+
+
+
+class LazyScanTensor:
+    """ Scan tensor (channel, direction, line, pixel) that decodes slices on first access """
+    def __init__(self, raw: np.ndarray, scale_factors: list, up_or_down: str = "up", crop: bool = True, dtype: np.dtype = np.float32):
+        self.raw = raw # Array-like of shape (channels, directions, lines, pixels) in file order and file units, such as a memory map
+        self.scale_factors = list(scale_factors)
+        self.up_or_down = up_or_down
+        self.crop = crop
+        self.dtype = dtype
+        self.good_rows = None
+        self.cache = {}
+
+    @property
+    def shape(self) -> tuple:
+        (n_channels, n_directions, lines, pixels) = self.raw.shape
+        if self.crop: lines = len(self.get_good_rows())
+        return (n_channels, n_directions, lines, pixels)
+
+    def get_good_rows(self) -> np.ndarray:
+        # All channels have the same number of NaN values. The backward scan has more NaN values because the scan always starts in the forward direction
+        if self.good_rows is None:
+            backward_image = self.decode(0, 1)
+            self.good_rows = np.where(~np.isnan(backward_image).any(axis = 1))[0]
+        return self.good_rows
+
+    def decode(self, channel_index: int, direction_index: int) -> np.ndarray:
+        image = np.array(self.raw[channel_index, direction_index], dtype = self.dtype)
+        scale_factor = self.scale_factors[channel_index]
+        if scale_factor != 1: image *= scale_factor
+
+        # Flip the backward scan, and flip the scan if it was recorded in the downward direction
+        if direction_index == 1: image = image[:, ::-1]
+        if self.up_or_down == "down": image = image[::-1]
+        return image
+
+    def get_slice(self, channel_index: int, direction_index: int) -> np.ndarray:
+        key = (channel_index, direction_index)
+        if key in self.cache: return self.cache[key]
+
+        image = self.decode(channel_index, direction_index)
+        if self.crop: image = image[self.get_good_rows()]
+        else: image = np.ascontiguousarray(image)
+
+        self.cache.update({key: image})
+        return image
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple): key = (key,)
+        channel_index = int(key[0])
+        if len(key) == 1: return np.stack([self.get_slice(channel_index, direction_index) for direction_index in range(self.raw.shape[1])])
+
+        image = self.get_slice(channel_index, int(key[1]))
+        if len(key) > 2: return image[key[2:]]
+        return image
+
+    def release(self, channel_index: int) -> None:
+        """ Drop the cached slices of a channel """
+        for key in [key for key in self.cache if key[0] == channel_index]: self.cache.pop(key)
+
+    def __len__(self) -> int:
+        return self.raw.shape[0]
+
+    def __array__(self, dtype = None, copy = None) -> np.ndarray:
+        tensor = np.stack([self[channel_index] for channel_index in range(len(self))])
+        if dtype is not None: tensor = tensor.astype(dtype, copy = False)
+        return tensor
+
+
+
+class SXMScan:
+    """ Scan object with the parsed header and a lazily decoded tensor """
+    def __init__(self, file_path: str, header: SXMHeader = None):
+        self.fname = file_path
+        self.basename = os.path.basename(file_path)
+        self.header = header
+
+
+
+class DATSpectrum:
+    """ Spectroscopy object with the attributes of a nanonispy2 Spec object """
+    def __init__(self, file_path: str, header: dict, signals: dict):
+        self.fname = file_path
+        self.basename = os.path.basename(file_path)
+        self.header = header
+        self.signals = signals # {column name: data}
+
+
+
+class LazySpectrum:
+    """ Spectroscopy object that reads its signals when they are requested """
+    def __init__(self, parent: DATFunctions, file_path: str, header: dict, channels: list):
+        self.parent = parent
+        self.fname = file_path
+        self.basename = os.path.basename(file_path)
+        self.header = header
+        self.channels = channels
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.parent.get_matrix(self.fname)[1]
+
+    @property
+    def signals(self) -> dict:
+        (column_names, matrix) = self.parent.get_matrix(self.fname)
+        return dict(zip(column_names, matrix))
+
+
+
+class LazyGridSpectrum:
+    """ Spectroscopy object of a single grid pixel, read on request """
+    def __init__(self, grid: GridPayload, x: int, y: int):
+        self.grid = grid
+        (self.x, self.y) = (x, y)
+        self.fname = f"{grid.file_path}[{x}, {y}]"
+        self.basename = os.path.basename(self.fname)
+        self.channels = [grid.sweep_signal_name] + list(grid.channels)
+
+    @property
+    def header(self) -> dict:
+        return dict(zip(self.grid.parameter_names, self.grid.parameters[self.x, self.y].astype(float)))
+
+    @property
+    def signals(self) -> dict:
+        signals = {self.grid.sweep_signal_name: self.grid.sweep_signal}
+        signals.update(dict(zip(self.grid.channels, self.grid[self.x, self.y])))
+        return signals
+
+
+
+class ThumbnailCache:
+    """ Sidecar .npz with a small preview per scan and channel """
+    index_dtype = np.dtype([("file_name", "U256"), ("channel", "U64"), ("file_size", "i8"), ("mtime_ns", "i8"), ("inode", "i8"), ("hash", "U16"), ("rows", "i4"), ("columns", "i4"), ("offset", "f4"), ("scale", "f4")])
+
+    def __init__(self, parent, folder: str, size: int = 48, file_name: str = "thumbnails.npz"):
+        self.parent = parent # IOFunctions or FileFunctions, for the sxm reader and the background subtraction
+        self.folder = folder
+        self.path = parent.archives.get_sidecar_path(folder, file_name) # Next to the archive if the folder is an archive
+        self.size = size
+        self.entries = {} # {(file_name, channel): (index record, uint8 thumbnail of shape (size, size))}
+        self.files = {} # {file_name: fingerprint}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.isfile(self.path): return
+        try:
+            with np.load(self.path) as npz_file: (index, thumbnails) = (npz_file["index"], npz_file["thumbnails"])
+            if thumbnails.shape[1:] != (self.size, self.size) or index.dtype != self.index_dtype: return # Thumbnails of a different size or format are rebuilt
+            
+            for record, thumbnail in zip(index, thumbnails):
+                self.entries.update({(str(record["file_name"]), str(record["channel"])): (record, thumbnail)})
+                self.files.update({str(record["file_name"]): {"file_size": int(record["file_size"]), "mtime_ns": int(record["mtime_ns"]), "inode": int(record["inode"]), "hash": str(record["hash"])}})
+        except Exception as e:
+            print(f"Problem loading the thumbnail cache {self.path}: {e}")
+
+    def save(self) -> None:
+        with self.lock: items = list(self.entries.values())
+        index = np.array([record for (record, thumbnail) in items], dtype = self.index_dtype)
+        thumbnails = np.array([thumbnail for (record, thumbnail) in items], dtype = np.uint8).reshape(-1, self.size, self.size)
+
+        # Write to a temporary file first, so that an interrupted save never leaves a corrupt cache behind
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "wb") as file: np.savez(file, index = index, thumbnails = thumbnails)
+        os.replace(temporary_path, self.path)
+
+    def is_current(self, file_name: str) -> bool:
+        return self.parent.fingerprints.is_current(os.path.join(self.folder, file_name), self.files.get(file_name))
+
+    def get(self, file_name: str, channel: str) -> np.ndarray | None:
+        entry = self.entries.get((file_name, channel))
+        if entry is None: return None
+        (record, thumbnail) = entry
+        return thumbnail[: record["rows"], : record["columns"]].astype(np.float32) * record["scale"] + record["offset"]
+
+    def get_preview(self, file_name: str, channel: str) -> np.ndarray | None:
+        """ Thumbnail of a scan for browsing, or None if it is missing or the scan changed since """
+        if not self.is_current(file_name): return None
+        return self.get(file_name, channel)
+
+    def downsample(self, image: np.ndarray) -> np.ndarray:
+        # Block mean over factor x factor pixels, such that the longest side fits in the thumbnail size
+        factor = max(1, int(np.ceil(max(image.shape) / self.size)))
+        (rows, columns) = (image.shape[0] // factor, image.shape[1] // factor)
+        return image[: rows * factor, : columns * factor].reshape(rows, factor, columns, factor).mean(axis = (1, 3))
+
+    def make_thumbnails(self, file_path: str) -> dict:
+        thumbnails = {}
+        (scan_object, error) = self.parent.sxm.get_scan_object(file_path, lazy = True)
+        if error: raise Exception(error)
+        
+        for channel_index, channel in enumerate(scan_object.channels):
+            thumbnail = self.downsample(scan_object.tensor[channel_index, 0])
+            (thumbnail, error) = self.parent.data.subtract_background(thumbnail, mode = "plane")
+            thumbnails.update({str(channel): np.asarray(thumbnail, dtype = np.float32)})
+        return thumbnails
+
+    def add(self, file_name: str, thumbnails: dict, fingerprint: dict) -> None:
+        entries = {}
+        for channel, thumbnail in thumbnails.items():
+            # Quantize to 8 bits between the 1st and 99th percentile to keep the sidecar small for folders with thousands of scans
+            (minimum, maximum) = np.nanpercentile(thumbnail, [1, 99]) if np.isfinite(thumbnail).any() else (0., 0.)
+            scale = (maximum - minimum) / 255 if maximum > minimum else 1.
+            quantized = np.zeros((self.size, self.size), dtype = np.uint8)
+            quantized[: thumbnail.shape[0], : thumbnail.shape[1]] = np.clip(np.nan_to_num((thumbnail - minimum) / scale), 0, 255).round()
+            record = np.array((file_name, channel, fingerprint["file_size"], fingerprint["mtime_ns"], fingerprint["inode"], fingerprint["hash"], thumbnail.shape[0], thumbnail.shape[1], minimum, scale), dtype = self.index_dtype)
+            entries.update({(file_name, channel): (record, quantized)})
+
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == file_name]: self.entries.pop(key)
+            self.entries.update(entries)
+            self.files.update({file_name: fingerprint})
+
+    def build(self, file_names: list, progress_callback = None, save_interval: int = 500) -> None:
+        """ Make thumbnails for the new and changed files and save the cache """
+        stale_file_names = [file_name for file_name in file_names if not self.is_current(file_name)]
+        n_built = 0
+        
+        for n_done, file_name in enumerate(stale_file_names, start = 1):
+            if self.stop_event.is_set(): break
+            try:
+                # The fingerprint is taken before reading, so a file that changes while it is read is picked up by the next build
+                file_path = os.path.join(self.folder, file_name)
+                fingerprint = self.parent.fingerprints.get(file_path)
+                self.add(file_name, self.make_thumbnails(file_path), fingerprint)
+                n_built += 1
+                if n_built % save_interval == 0: self.save() # Once per save_interval new thumbnails, not again for the files that fail after them
+            except Exception as e:
+                print(f"Problem making thumbnails for {file_name}: {e}")
+            
+            if progress_callback: progress_callback(n_done, len(stale_file_names))
+        
+        if n_built % save_interval != 0: self.save()
+
+    def build_in_background(self, file_names: list, progress_callback = None) -> threading.Thread:
+        self.stop_event.clear()
+        self.thread = threading.Thread(target = self.build, args = (file_names, progress_callback), daemon = True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None: self.thread.join()
+
+
+
+class SpectraCache:
+    """ Columnar sidecar of the spectra in a folder, read through a single memory map """
+    index_dtype = np.dtype([("file_name", "U256"), ("file_size", "i8"), ("mtime_ns", "i8"), ("inode", "i8"), ("hash", "U16"), ("offset", "i8"), ("columns", "i4"), ("points", "i4"), ("channel_set", "i4")])
+    dtype = np.dtype("<f4") # The matrix_dtype of DATFunctions
+
+    def __init__(self, parent, folder: str, file_name: str = "spectra"):
+        self.parent = parent # IOFunctions or FileFunctions, for the .dat reader and the fingerprints
+        self.folder = folder
+        self.data_path = parent.archives.get_sidecar_path(folder, f"{file_name}.bin") # Next to the archive if the folder is an archive
+        self.index_path = parent.archives.get_sidecar_path(folder, f"{file_name}.npz")
+        self.records = {} # {file_name: index record}
+        self.channel_sets = [] # Tab-joined column names. Spectra of the same kind share one entry, which the records refer to by index
+        self.size = 0 # Number of values in the data file that the index refers to. Anything beyond is left over from an interrupted build
+        self.data = None # Memory map of the data file, opened on first use
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.isfile(self.index_path) or not os.path.isfile(self.data_path): return
+        try:
+            with np.load(self.index_path) as npz_file: (index, channel_sets, size) = (npz_file["index"], npz_file["channel_sets"], int(npz_file["size"]))
+            if index.dtype != self.index_dtype or os.path.getsize(self.data_path) < size * self.dtype.itemsize: return # A cache of a different format or a truncated data file is rebuilt
+            
+            self.records = {str(record["file_name"]): record for record in index}
+            self.channel_sets = [str(channel_set) for channel_set in channel_sets]
+            self.size = size
+        except Exception as e:
+            print(f"Problem loading the spectra cache {self.index_path}: {e}")
+
+    def save(self) -> None:
+        if self.size > 2 * sum(int(record["columns"]) * int(record["points"]) for record in self.records.values()): self.compact() # Mostly replaced or removed spectra
+        index = np.array(list(self.records.values()), dtype = self.index_dtype)
+
+        # Write to a temporary file first, so that an interrupted save never leaves a corrupt index behind
+        temporary_path = self.index_path + ".tmp"
+        with open(temporary_path, "wb") as file: np.savez(file, index = index, channel_sets = np.array(self.channel_sets, dtype = str), size = np.int64(self.size))
+        os.replace(temporary_path, self.index_path)
+
+    def compact(self) -> None:
+        """ Rewrite the data file with only the spectra in the index """
+        data = np.memmap(self.data_path, dtype = self.dtype, mode = "r", shape = (self.size,))
+        temporary_path = self.data_path + ".tmp"
+        (records, offset) = ({}, 0)
+        with open(temporary_path, "wb") as file:
+            for file_name, record in list(self.records.items()):
+                length = int(record["columns"]) * int(record["points"])
+                file.write(data[record["offset"] : record["offset"] + length].tobytes())
+                record = record.copy()
+                record["offset"] = offset
+                records.update({file_name: record})
+                offset += length
+        del data
+        
+        # The new offsets and the new data file are swapped in together, such that get never combines one with the other
+        with self.lock:
+            self.data = None
+            os.replace(temporary_path, self.data_path)
+            (self.records, self.size) = (records, offset)
+
+    def is_current(self, file_name: str) -> bool:
+        record = self.records.get(file_name)
+        fingerprint = None if record is None else {"file_size": int(record["file_size"]), "mtime_ns": int(record["mtime_ns"]), "inode": int(record["inode"]), "hash": str(record["hash"])}
+        return self.parent.fingerprints.is_current(os.path.join(self.folder, file_name), fingerprint)
+
+    def get(self, file_name: str) -> tuple[list, np.ndarray] | None:
+        """ Column names and (column, point) matrix of a cached spectrum """
+        # A view of the memory map: writes to the matrix are not written back to the file
+        with self.lock:
+            record = self.records.get(file_name)
+            if record is None: return None
+            (offset, columns, points) = (int(record["offset"]), int(record["columns"]), int(record["points"]))
+            if self.data is None or len(self.data) < self.size: self.data = np.memmap(self.data_path, dtype = self.dtype, mode = "c", shape = (self.size,))
+            data = self.data
+        return (self.channel_sets[record["channel_set"]].split("\t"), np.asarray(data[offset : offset + columns * points]).reshape(columns, points))
+
+    def add(self, file, file_name: str, channels: list, matrix: np.ndarray, fingerprint: dict) -> None:
+        """ Append the matrix of a spectrum to the open data file """
+        file.seek(self.size * self.dtype.itemsize)
+        file.write(np.ascontiguousarray(matrix, dtype = self.dtype).tobytes())
+        file.flush() # The spectrum is on disk before the index refers to it, since get may map it right away
+        
+        with self.lock:
+            channel_set = "\t".join(channels)
+            if channel_set not in self.channel_sets: self.channel_sets.append(channel_set)
+            record = np.array((file_name, fingerprint["file_size"], fingerprint["mtime_ns"], fingerprint["inode"], fingerprint["hash"], self.size, matrix.shape[0], matrix.shape[1], self.channel_sets.index(channel_set)), dtype = self.index_dtype)
+            self.records.update({file_name: record})
+            self.size += matrix.size
+
+    def build(self, file_names: list, progress_callback = None) -> None:
+        """ Append the new and changed spectra, drop removed ones and save the cache """
+        (n_records, file_name_set) = (len(self.records), set(file_names))
+        stale_file_names = [file_name for file_name in file_names if not self.is_current(file_name)]
+        with self.lock: self.records = {file_name: record for file_name, record in self.records.items() if file_name in file_name_set and file_name not in stale_file_names} # Outdated spectra are never served
+        stale_file_names = [file_name for file_name in stale_file_names if self.parent.archives.stat(os.path.join(self.folder, file_name))[0] < self.parent.dat.large_file_size] # Time traces are read through their binary sidecars instead
+        if not stale_file_names and len(self.records) == n_records: return
+
+        try:
+            with open(self.data_path, "r+b" if os.path.isfile(self.data_path) else "wb") as file:
+                for n_done, file_name in enumerate(stale_file_names, start = 1):
+                    if self.stop_event.is_set(): break
+                    if progress_callback: progress_callback(n_done, len(stale_file_names))
+                    try:
+                        # The fingerprint is taken before reading, so a file that changes while it is read is picked up by the next build
+                        file_path = os.path.join(self.folder, file_name)
+                        fingerprint = self.parent.fingerprints.get(file_path)
+                        (header, channels, matrix) = self.parent.dat.read_dat(file_path, dtype = self.dtype)
+                    except Exception as e:
+                        print(f"Problem adding {file_name} to the spectra cache: {e}")
+                        continue
+                    self.add(file, file_name, channels, matrix, fingerprint) # A failing write ends the build
+                file.truncate(self.size * self.dtype.itemsize)
+            self.save()
+        except OSError as e:
+            print(f"Could not write the spectra cache {self.data_path}: {e}")
+
+    def build_in_background(self, file_names: list, progress_callback = None) -> threading.Thread:
+        """ Build the cache in a thread """
+        # Spectra that are not in the cache yet are decoded by get_matrix in the meantime
+        self.stop_event.clear()
+        self.thread = threading.Thread(target = self.build, args = (file_names, progress_callback), daemon = True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None: self.thread.join()
+
+
+
+class MetadataIndex:
+    """ SQLite sidecar with the metadata of the scans and spectra in a folder """
+    schema = """
+        CREATE TABLE IF NOT EXISTS scans (key INTEGER, file_name TEXT PRIMARY KEY, date_time TEXT, center_x_nm REAL, center_y_nm REAL, range_x_nm REAL, range_y_nm REAL, angle_deg REAL, bias_V REAL, setpoint_pA REAL, feedback INTEGER);
+        CREATE TABLE IF NOT EXISTS spectra (key INTEGER, file_name TEXT PRIMARY KEY, date_time TEXT, x_nm REAL, y_nm REAL, z_nm REAL, associated_scan_name TEXT, associated_scan_path TEXT);
+        CREATE TABLE IF NOT EXISTS channels (file_name TEXT, position INTEGER, channel TEXT, PRIMARY KEY (file_name, position));
+        CREATE TABLE IF NOT EXISTS fingerprints (file_name TEXT PRIMARY KEY, file_size INTEGER, mtime_ns INTEGER, inode INTEGER, hash TEXT);
+        CREATE INDEX IF NOT EXISTS scans_date_time ON scans (date_time);
+        CREATE INDEX IF NOT EXISTS scans_center ON scans (center_x_nm, center_y_nm);
+        CREATE INDEX IF NOT EXISTS spectra_date_time ON spectra (date_time);
+        CREATE INDEX IF NOT EXISTS spectra_position ON spectra (x_nm, y_nm);
+        CREATE INDEX IF NOT EXISTS spectra_associated_scan ON spectra (associated_scan_name);
+    """
+    tables = {"scan_files": "scans", "spectroscopy_files": "spectra"}
+
+    def __init__(self, path: str):
+        self.path = path # Like <folder>/metadata.sqlite, or next to the archive for archives
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.executescript(self.schema)
+        return connection
+
+    def get_rows(self, dict_name: str, key: int, single_file_dict: dict) -> tuple[tuple, list, tuple | None]:
+        """ (table row, channel rows, fingerprint row) of an entry of a files_dict """
+        file_name = single_file_dict.get("file_name")
+        if dict_name == "scan_files":
+            frame = single_file_dict.get("frame") or {}
+            (center, scan_range) = (frame.get("offset (nm)") or [None, None], frame.get("scan_range (nm)") or [None, None])
+            feedback = single_file_dict.get("feedback")
+            row = (key, file_name, single_file_dict.get("date_time_str"), *[None if value is None else float(value) for value in [*center, *scan_range, frame.get("angle_deg"), single_file_dict.get("bias (V)"), single_file_dict.get("setpoint (pA)")]],
+                   None if feedback is None else int(str(feedback) == "True" or feedback is True))
+        else:
+            row = (key, file_name, single_file_dict.get("date_time_str"), *[None if single_file_dict.get(name) is None else float(single_file_dict.get(name)) for name in ["x (nm)", "y (nm)", "z (nm)"]],
+                   single_file_dict.get("associated_scan_name"), single_file_dict.get("associated_scan_path"))
+        
+        channel_rows = [(file_name, position, str(channel)) for position, channel in enumerate(single_file_dict.get("channels") or [])]
+        fingerprint = single_file_dict.get("fingerprint")
+        fingerprint_row = (file_name, *[fingerprint.get(name) for name in ["file_size", "mtime_ns", "inode", "hash"]]) if fingerprint else None
+        return (row, channel_rows, fingerprint_row)
+
+    def write(self, connection: sqlite3.Connection, dict_name: str, key: int, single_file_dict: dict) -> None:
+        (row, channel_rows, fingerprint_row) = self.get_rows(dict_name, key, single_file_dict)
+        connection.execute(f"INSERT OR REPLACE INTO {self.tables[dict_name]} VALUES ({', '.join('?' * len(row))})", row)
+        connection.execute("DELETE FROM channels WHERE file_name = ?", (row[1],))
+        connection.executemany("INSERT INTO channels VALUES (?, ?, ?)", channel_rows)
+        if fingerprint_row: connection.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)", fingerprint_row)
+        else: connection.execute("DELETE FROM fingerprints WHERE file_name = ?", (row[1],))
+
+    def save(self, files_dict: dict) -> bool | str:
+        """ Replace the index by the entries of a files_dict, in a single transaction """
+        error = False
+        try:
+            with closing(self.connect()) as connection, connection: # The inner context commits, or rolls back on an exception
+                for table in ["scans", "spectra", "channels", "fingerprints"]: connection.execute(f"DELETE FROM {table}")
+                for dict_name, table in self.tables.items():
+                    rows = [self.get_rows(dict_name, key, single_file_dict) for key, single_file_dict in files_dict.get(dict_name, {}).items() if isinstance(single_file_dict, dict)]
+                    if not rows: continue
+                    connection.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' * len(rows[0][0]))})", [row for (row, _, _) in rows])
+                    connection.executemany("INSERT OR REPLACE INTO channels VALUES (?, ?, ?)", [channel_row for (_, channel_rows, _) in rows for channel_row in channel_rows])
+                    connection.executemany("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)", [fingerprint_row for (_, _, fingerprint_row) in rows if fingerprint_row])
+        except Exception as e:
+            error = f"Error saving the metadata index {self.path}: {e}"
+        return error
+
+    def update(self, dict_name: str, key: int, single_file_dict: dict) -> bool | str:
+        """ Insert or replace the entry of a single file """
+        # Without an index nothing is written: the first save of the folder creates it
+        error = False
+        if not os.path.isfile(self.path): return error
+        try:
+            if not single_file_dict.get("file_name"): raise ValueError("The entry has no file name")
+            with closing(self.connect()) as connection, connection: self.write(connection, dict_name, key, single_file_dict)
+        except Exception as e:
+            error = f"Error updating {single_file_dict.get('file_name')} in the metadata index {self.path}: {e}"
+        return error
+
+    def remove(self, file_names: list[str]) -> bool | str:
+        error = False
+        if not os.path.isfile(self.path): return error
+        try:
+            with closing(self.connect()) as connection, connection:
+                for table in ["scans", "spectra", "channels", "fingerprints"]: connection.executemany(f"DELETE FROM {table} WHERE file_name = ?", [(file_name,) for file_name in file_names])
+        except Exception as e:
+            error = f"Error removing files from the metadata index {self.path}: {e}"
+        return error
+
+    def load(self) -> tuple[dict, bool | str]:
+        """ The files_dict as it was saved, in the same layout as metadata.yml """
+        error = False
+        files_dict = {}
+        try:
+            with closing(self.connect()) as connection:
+                channels = {}
+                for (file_name, channel) in connection.execute("SELECT file_name, channel FROM channels ORDER BY file_name, position"): channels.setdefault(file_name, []).append(channel)
+                fingerprints = {row[0]: dict(zip(["file_size", "mtime_ns", "inode", "hash"], row[1:])) for row in connection.execute("SELECT * FROM fingerprints")}
+                
+                scans_dict = {"dict_name": "scan_files"}
+                for (key, file_name, date_time_str, center_x, center_y, range_x, range_y, angle, bias, setpoint, feedback) in connection.execute("SELECT * FROM scans ORDER BY key"):
+                    single_file_dict = {"dict_name": "single_file_dict", "file_name": file_name, "date_time_str": date_time_str, "fingerprint": fingerprints.get(file_name),
+                                        "frame": {"dict_name": "frame_dict", "offset (nm)": [center_x, center_y], "scan_range (nm)": [range_x, range_y], "angle_deg": angle}}
+                    for (name, value) in [("bias (V)", bias), ("setpoint (pA)", setpoint), ("feedback", None if feedback is None else bool(feedback)), ("channels", channels.get(file_name))]:
+                        if value is not None: single_file_dict.update({name: value})
+                    scans_dict.update({key: single_file_dict})
+                
+                specs_dict = {"dict_name": "spectroscopy_files"}
+                for (key, file_name, date_time_str, x, y, z, associated_scan_name, associated_scan_path) in connection.execute("SELECT * FROM spectra ORDER BY key"):
+                    single_file_dict = {"dict_name": "single_file_dict", "file_name": file_name, "date_time_str": date_time_str, "x (nm)": x, "y (nm)": y, "z (nm)": z,
+                                        "associated_scan_name": associated_scan_name, "associated_scan_path": associated_scan_path, "fingerprint": fingerprints.get(file_name)}
+                    if file_name in channels: single_file_dict.update({"channels": channels[file_name]})
+                    specs_dict.update({key: single_file_dict})
+            
+            files_dict = {"dict_name": "files_dict", "scan_files": scans_dict, "spectroscopy_files": specs_dict}
+        except Exception as e:
+            error = f"Error loading the metadata index {self.path}: {e}"
+        return (files_dict, error)
+
+    def find_scans(self, date_range: tuple = None, box: tuple = None) -> list[str]:
+        """ Names of the scans within a date range and a box in nm, in order of recording """
+        return self.find("scans", date_range, box, ("center_x_nm", "center_y_nm"))
+
+    def find_spectra(self, date_range: tuple = None, box: tuple = None, associated_scan_name: str = None) -> list[str]:
+        """ Names of the spectra within a date range and a box in nm, in order of recording """
+        return self.find("spectra", date_range, box, ("x_nm", "y_nm"), associated_scan_name)
+
+    def find(self, table: str, date_range: tuple, box: tuple, position_columns: tuple, associated_scan_name: str = None) -> list[str]:
+        (conditions, parameters) = ([], [])
+        if date_range:
+            conditions.append("date_time BETWEEN ? AND ?")
+            parameters.extend([value.strftime("%Y-%m-%d %H:%M:%S") if isinstance(value, datetime) else value for value in date_range])
+        if box:
+            conditions.append(f"{position_columns[0]} BETWEEN ? AND ? AND {position_columns[1]} BETWEEN ? AND ?")
+            parameters.extend(box)
+        if associated_scan_name is not None:
+            conditions.append("associated_scan_name = ?")
+            parameters.append(associated_scan_name)
+        
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with closing(self.connect()) as connection: return [file_name for (file_name,) in connection.execute(f"SELECT file_name FROM {table}{where} ORDER BY date_time, key", parameters)]
+
+    def export_yaml(self, yaml_path: str) -> bool | str:
+        """ Write the index as a metadata.yml file, for compatibility with older versions """
+        (files_dict, error) = self.load()
+        if error: return error
+        try:
+            with open(yaml_path, "w") as file: yaml.safe_dump(files_dict, file)
+        except Exception as e:
+            error = f"Error exporting the metadata index to {yaml_path}: {e}"
+        return error
+
+
+
+class HDF5FilePool:
+    """ Pool of read-only h5py files that are kept open for the lazy dataset handles """
+    def __init__(self, max_open: int = 8):
+        self.max_open = max_open
+        self.files = OrderedDict() # {file_path: ((mtime_ns, inode), h5py.File)}, least recently used first
+        self.lock = threading.RLock()
+
+    def get(self, file_path: str) -> h5py.File:
+        stat = os.stat(file_path)
+        with self.lock:
+            entry = self.files.get(file_path)
+            if entry is not None and entry[1].id.valid:
+                ((mtime_ns, inode), h5_file) = entry
+                if stat.st_ino == inode and (stat.st_mtime_ns == mtime_ns or self.is_live(h5_file)): # Live files change all the time, but stay the same file
+                    self.files.move_to_end(file_path)
+                    return h5_file
+            
+            if entry is not None: entry[1].close()
+            h5_file = h5py.File(file_path, "r", swmr = True)
+            self.files.update({file_path: ((stat.st_mtime_ns, stat.st_ino), h5_file)})
+            self.files.move_to_end(file_path)
+            while len(self.files) > self.max_open: self.files.popitem(last = False)[1][1].close()
+            return h5_file
+
+    def is_live(self, h5_file: h5py.File) -> bool:
+        """ Whether a file is still being written by an HDF5LiveWriter """
+        dataset = h5_file.get("live")
+        if not isinstance(dataset, h5py.Dataset): return False
+        if h5_file.swmr_mode: dataset.refresh()
+        return bool(dataset[()])
+
+    def close(self, file_path: str = None) -> None:
+        """ Close a file, or all files if file_path is None """
+        with self.lock:
+            file_paths = list(self.files) if file_path is None else [file_path]
+            for path in file_paths:
+                entry = self.files.pop(path, None)
+                if entry is not None: entry[1].close()
+
+
+
+class HDF5LiveWriter:
+    """ Appends scan lines or spectra to an HDF5 file in SWMR mode """
+    def __init__(self, root: h5py.File, datasets: list[h5py.Dataset], axis: int, positions: h5py.Dataset = None, flush_interval: float = 1.):
+        self.root = root
+        self.datasets = datasets # One per channel, all growing along the same axis
+        self.axis = axis
+        self.positions = positions # (n, 3) positions of the appended spectra, if any
+        self.flush_interval = flush_interval
+        self.length = datasets[0].shape[axis]
+        self.last_flush = perf_counter()
+        root.swmr_mode = True # From here on, no groups, datasets or attributes can be added
+
+    def append(self, data: np.ndarray, positions: np.ndarray = None) -> int:
+        """ Append a block with a leading channel axis to all channels; returns the new length """
+        data = np.asarray(data)
+        if len(data) != len(self.datasets): raise ValueError(f"Expected data for {len(self.datasets)} channels, got {len(data)}")
+        n_new = data.shape[self.axis + 1]
+        key = (slice(None),) * self.axis + (slice(self.length, self.length + n_new),)
+        
+        for dataset, channel_data in zip(self.datasets, data):
+            dataset.resize(self.length + n_new, axis = self.axis)
+            dataset[key] = channel_data
+        if self.positions is not None:
+            self.positions.resize(self.length + n_new, axis = 0)
+            if positions is not None: self.positions[self.length : self.length + n_new] = np.reshape(positions, (n_new, 3))
+            else: self.positions[self.length : self.length + n_new] = np.nan
+        
+        self.length += n_new
+        if perf_counter() - self.last_flush >= self.flush_interval: self.flush()
+        return self.length
+
+    def flush(self) -> None:
+        """ Make the appended data visible to readers """
+        for dataset in self.datasets: dataset.flush()
+        if self.positions is not None: self.positions.flush()
+        self.last_flush = perf_counter()
+
+    def close(self) -> None:
+        if not self.root.id.valid: return
+        self.root["live"][()] = False # The file pool reopens finished files again when they change
+        self.root["live"].flush()
+        self.flush()
+        self.root.close()
+
+    def __enter__(self) -> "HDF5LiveWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+
+class HDF5Dataset:
+    """ Lazy handle to a dataset of an HDF5 file, read only when it is sliced """
+    def __init__(self, pool: HDF5FilePool, file_path: str, dataset_names: list | str, axes: list = None):
+        self.pool = pool
+        self.file_path = file_path
+        self.dataset_names = [dataset_names] if isinstance(dataset_names, str) else list(dataset_names)
+        self.stacked = len(self.dataset_names) > 1
+        self.axes = list(axes) if axes else []
+        
+        dataset = self.get_dataset()
+        self.shape = ((len(self.dataset_names),) if self.stacked else ()) + dataset.shape
+        self.dtype = dataset.dtype
+        self.ndim = len(self.shape)
+
+    def get_dataset(self, index: int = 0) -> h5py.Dataset:
+        return self.pool.get(self.file_path)[self.dataset_names[index]]
+
+    def refresh(self) -> bool:
+        """ Update the shape of growing datasets; returns whether it changed """
+        h5_file = self.pool.get(self.file_path)
+        datasets = [h5_file[dataset_name] for dataset_name in self.dataset_names]
+        if h5_file.swmr_mode:
+            for dataset in datasets: dataset.refresh()
+        
+        shape = ((len(self.dataset_names),) if self.stacked else ()) + datasets[0].shape
+        changed = shape != self.shape
+        self.shape = shape
+        return changed
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple): key = (key,)
+        if not self.stacked: return self.get_dataset()[key]
+        
+        (channel_key, key) = (key[0] if key else slice(None), key[1:])
+        if isinstance(channel_key, (int, np.integer)): return self.get_dataset(int(channel_key))[key]
+        return np.stack([self.get_dataset(index)[key] for index in range(len(self.dataset_names))[channel_key]])
+
+    def get_image(self, channel: int = 0, direction: int = 0, rows: tuple = None) -> np.ndarray:
+        """ Image of a channel and direction, optionally of a (start, stop) range of rows """
+        key = []
+        rows_found = False
+        for axis_name in self.axes[: self.ndim] + [""] * (self.ndim - len(self.axes)):
+            name = str(axis_name).lower()
+            if "channel" in name: key.append(channel)
+            elif "direction" in name: key.append(direction)
+            elif not rows_found and name.split(" ")[0] in ["y", "line", "lines", "row", "rows"]:
+                key.append(slice(*rows) if rows else slice(None))
+                rows_found = True
+            else: key.append(slice(None))
+        return self[tuple(key)]
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __array__(self, dtype = None, copy = None) -> np.ndarray:
+        array = self[:] if self.stacked else self.get_dataset()[()]
+        if dtype is not None: array = array.astype(dtype, copy = False)
+        return array
+
+
+
+class ContainerMemberFile(io.RawIOBase):
+    """ Read-only binary file object over the byte range of a member of a session container """
+    def __init__(self, path: str, offset: int, size: int):
+        self.file = open(path, "rb")
+        self.offset = offset
+        self.size = size
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n_bytes = max(0, min(len(buffer), self.size - self.position))
+        if n_bytes == 0: return 0
+        self.file.seek(self.offset + self.position)
+        n_bytes = self.file.readinto(memoryview(buffer)[:n_bytes])
+        self.position += n_bytes
+        return n_bytes
+
+    def seek(self, position: int, whence: int = 0) -> int:
+        match whence:
+            case 0: self.position = position
+            case 1: self.position += position
+            case _: self.position = self.size + position
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def close(self) -> None:
+        self.file.close()
+        super().close()
+
+
+
+class SessionContainer:
+    """ Read side of a session container """
+    def __init__(self, path: str):
+        self.path = path
+        with h5py.File(path, "r") as h5_file: self.index = h5_file["index"][()]
+        self.members = {file_name.decode(): record for file_name, record in zip(self.index["file_name"], self.index)} # {file name: index record}, for lookups in constant time
+
+    def get_record(self, member: str) -> np.void:
+        record = self.members.get(member)
+        if record is None: raise FileNotFoundError(f"{member} is not in the session container {self.path}")
+        return record
+
+
+
+class ArchiveSource:
+    """ Lists and reads the members of archives and compressed files in place """
+    archive_extensions = (".zip", ".session.hdf5")
+    session_extensions = (".session.hdf5",)
+    compressed_extensions = (".gz",)
+
+    def __init__(self, cache_size: int = 512 * 1024**2):
+        self.cache_size = cache_size # Maximum number of decompressed bytes kept in memory
+        self.cache = OrderedDict() # {(archive_path, member, mtime_ns): decompressed bytes}, least recently used first
+        self.cache_bytes = 0
+        self.zip_files = {} # {archive_path: (mtime_ns, zipfile.ZipFile)}
+        self.sessions = {} # {archive_path: (mtime_ns, SessionContainer)}
+        self.lock = threading.RLock()
+
+    def split_path(self, path: str) -> tuple[str, str]:
+        """ Split a path into (archive_path, member) """
+        # Plain files give ('', path); archives themselves and gzip-compressed files give (path, '')
+        # Paths without an archive extension in any of their parts are plain files, which is decided without touching the disk
+        if not any(extension in path for extension in self.archive_extensions + self.compressed_extensions): return ("", path)
+        
+        path = os.path.normpath(path)
+        if path.endswith(self.archive_extensions + self.compressed_extensions) and os.path.isfile(path): return (path, "")
+        
+        # Look for the archive among the parents of the path, from the deepest up
+        head = path
+        while True:
+            (head, tail) = os.path.split(head)
+            if not tail or not head: return ("", path)
+            if head.endswith(self.archive_extensions) and os.path.isfile(head): break
+        member = os.path.relpath(path, head).replace(os.sep, "/")
+        return (head, "" if member == "." else member)
+
+    def is_virtual(self, path: str) -> bool:
+        return bool(self.split_path(path)[0])
+
+    def is_archive(self, path: str) -> bool:
+        return path.endswith(self.archive_extensions) and os.path.isfile(path)
+
+    def get_extension(self, path: str) -> str:
+        """ Extension of the file with the compression extension removed: Scan_001.sxm.gz -> .sxm """
+        (root, extension) = os.path.splitext(path)
+        if extension in self.compressed_extensions: (root, extension) = os.path.splitext(root)
+        return extension
+
+    def get_zip_file(self, archive_path: str) -> zipfile.ZipFile:
+        """ Open zip archives are kept, and reopened when the archive changes on disk """
+        mtime_ns = os.stat(archive_path).st_mtime_ns
+        with self.lock:
+            (cached_mtime_ns, zip_file) = self.zip_files.get(archive_path, (None, None))
+            if zip_file is None or cached_mtime_ns != mtime_ns:
+                if zip_file is not None: zip_file.close()
+                zip_file = zipfile.ZipFile(archive_path, "r")
+                self.zip_files.update({archive_path: (mtime_ns, zip_file)})
+            return zip_file
+
+    def get_session(self, archive_path: str) -> SessionContainer:
+        """ Session containers are kept, and reloaded when the container changes on disk """
+        mtime_ns = os.stat(archive_path).st_mtime_ns
+        with self.lock:
+            (cached_mtime_ns, session) = self.sessions.get(archive_path, (None, None))
+            if session is None or cached_mtime_ns != mtime_ns:
+                session = SessionContainer(archive_path)
+                self.sessions.update({archive_path: (mtime_ns, session)})
+            return session
+
+    def get_names(self, archive_path: str):
+        """ Names of the members of an archive """
+        if archive_path.endswith(self.session_extensions): return self.get_session(archive_path).members
+        return self.get_zip_file(archive_path).namelist()
+
+    def get_member_info(self, archive_path: str, member: str) -> tuple[int, bytes]:
+        """ (file_size, checksum) of an archive member, as stored by the archive """
+        if archive_path.endswith(self.session_extensions):
+            record = self.get_session(archive_path).get_record(member)
+            return (int(record["file_size"]), bytes(record["hash"]))
+        info = self.get_zip_file(archive_path).getinfo(member)
+        return (info.file_size, info.CRC.to_bytes(4, "little"))
+
+    def get_folder(self, path: str) -> str | None:
+        """ The folder that holds a file, or None; an archive counts as a folder """
+        (archive_path, member) = self.split_path(path)
+        if not archive_path:
+            if os.path.isdir(path): return path
+            if os.path.isfile(path): return os.path.dirname(path)
+            return None
+        if not member:
+            if self.is_archive(archive_path): return archive_path
+            return os.path.dirname(archive_path) # A gzip-compressed file
+        
+        names = self.get_names(archive_path)
+        if member in names: return os.path.dirname(path)
+        if any(name.startswith(member.rstrip("/") + "/") for name in names): return path
+        return None
+
+    def exists(self, path: str) -> bool:
+        (archive_path, member) = self.split_path(path)
+        if not archive_path or not member: return os.path.exists(path)
+        try: return self.get_folder(path) is not None
+        except Exception: return False
+
+    def scan_folder(self, folder: str) -> dict:
+        """ {file name: os.DirEntry} of a folder from a single os.scandir pass """
+        # DirEntry caches its stat result. Archive members have no entry (None)
+        (archive_path, member) = self.split_path(folder)
+        if not archive_path:
+            with os.scandir(folder) as entries: return {entry.name: entry for entry in entries if entry.is_file()}
+        
+        # Archive members in subfolders are included with their relative path
+        prefix = member.rstrip("/") + "/" if member else ""
+        names = self.get_names(archive_path)
+        return {name[len(prefix):]: None for name in names if name.startswith(prefix) and not name.endswith("/")}
+
+    def list_folder(self, folder: str) -> list[str]:
+        """ Names of the files in a folder or archive, relative to it """
+        return list(self.scan_folder(folder))
+
+    def stat(self, path: str) -> tuple[int, int]:
+        """ (file_size, mtime_ns) of a file """
+        # Archive members have the size of their decompressed data and the modification time of the archive
+        (archive_path, member) = self.split_path(path)
+        if not archive_path or not member:
+            stat = os.stat(path)
+            return (stat.st_size, stat.st_mtime_ns)
+        
+        return (self.get_member_info(archive_path, member)[0], os.stat(archive_path).st_mtime_ns)
+
+    def get_sidecar_path(self, folder: str, file_name: str) -> str:
+        """ Path of a sidecar file of a folder, such as the metadata index """
+        # Archives are never written to, so their sidecars are placed next to the archive
+        (archive_path, member) = self.split_path(folder)
+        if not archive_path: return os.path.join(folder, file_name)
+        
+        stem = archive_path[: -len(next(extension for extension in self.archive_extensions if archive_path.endswith(extension)))] if self.is_archive(archive_path) else os.path.splitext(archive_path)[0]
+        if member: stem += "_" + member.rstrip("/").replace("/", "_")
+        return f"{stem}_{file_name}"
+
+    def open(self, path: str):
+        """ Binary file object """
+        # Archive members are decompressed while they are read, so reading a header does not decompress the whole member
+        (archive_path, member) = self.split_path(path)
+        if not archive_path: return open(path, "rb")
+        if not member: return gzip.open(archive_path, "rb")
+        if archive_path.endswith(self.session_extensions):
+            record = self.get_session(archive_path).get_record(member)
+            return io.BufferedReader(ContainerMemberFile(archive_path, int(record["offset"]), int(record["file_size"])))
+        return self.get_zip_file(archive_path).open(member, "r")
+
+    def read_bytes(self, path: str) -> bytes:
+        """ Decompressed content of a file """
+        # Decompressed archive members are kept in an LRU cache of cache_size bytes
+        (archive_path, member) = self.split_path(path)
+        if not archive_path:
+            with open(path, "rb") as file: return file.read()
+        
+        key = (archive_path, member, os.stat(archive_path).st_mtime_ns)
+        with self.lock:
+            data = self.cache.get(key)
+            if data is not None:
+                self.cache.move_to_end(key)
+                return data
+        
+        with self.open(path) as file: data = file.read()
+        with self.lock:
+            if key not in self.cache:
+                self.cache.update({key: data})
+                self.cache_bytes += len(data)
+            while self.cache_bytes > self.cache_size and len(self.cache) > 1:
+                (_, evicted_data) = self.cache.popitem(last = False)
+                self.cache_bytes -= len(evicted_data)
+        return data
+
+    def get_array(self, path: str, dtype: np.dtype, offset: int, shape: tuple) -> np.ndarray:
+        """ Read-only array view of a block of a file """
+        # Plain files and uncompressed archive members are memory-mapped; compressed data is read from the cache
+        (archive_path, member) = self.split_path(path)
+        if not archive_path: return np.memmap(path, dtype = dtype, mode = "r", offset = offset, shape = shape)
+        
+        if member and archive_path.endswith(self.session_extensions): # Members of session containers are stored contiguously and uncompressed
+            record = self.get_session(archive_path).get_record(member)
+            return np.memmap(archive_path, dtype = dtype, mode = "r", offset = int(record["offset"]) + offset, shape = shape)
+        
+        if member:
+            info = self.get_zip_file(archive_path).getinfo(member)
+            if info.compress_type == zipfile.ZIP_STORED:
+                # The data of a stored member starts after its local header, whose variable-length fields are read from the archive itself
+                with open(archive_path, "rb") as file:
+                    file.seek(info.header_offset)
+                    local_header = file.read(30)
+                (name_length, extra_length) = (int.from_bytes(local_header[26:28], "little"), int.from_bytes(local_header[28:30], "little"))
+                data_offset = info.header_offset + 30 + name_length + extra_length
+                return np.memmap(archive_path, dtype = dtype, mode = "r", offset = data_offset + offset, shape = shape)
+        
+        data = self.read_bytes(path)
+        return np.frombuffer(data, dtype = dtype, count = int(np.prod(shape)), offset = offset).reshape(shape)
+
+    def close(self) -> None:
+        """ Close the open archives and empty the cache """
+        with self.lock:
+            for (_, zip_file) in self.zip_files.values(): zip_file.close()
+            self.zip_files.clear()
+            self.sessions.clear()
+            self.cache.clear()
+            self.cache_bytes = 0
+
+
+
+class FileFingerprints:
+    """ Cheap fingerprints that tell whether a file changed since it was indexed """
+    block_size = 4096
+    stat_keys = ("file_size", "mtime_ns", "inode")
+
+    def __init__(self, parent):
+        self.parent = parent # IOFunctions or FileFunctions, for the archive source
+        self.fingerprints = {} # {path: fingerprint}, such that a file is only hashed again when its stat changes
+        self.entries = {} # {path: os.DirEntry} from the latest folder scan. Its cached stat result is used once, by the next fingerprint of the file
+        self.lock = threading.Lock()
+
+    def add_entries(self, entries: dict) -> None:
+        with self.lock: self.entries.update(entries)
+
+    def stat(self, path: str) -> dict:
+        """ Fingerprint without the hash, from a single stat """
+        # Archive members have the inode and modification time of their archive
+        (archive_path, member) = self.parent.archives.split_path(path)
+        if archive_path and member:
+            stat = os.stat(archive_path)
+            file_size = self.parent.archives.get_member_info(archive_path, member)[0]
+        else:
+            with self.lock: entry = self.entries.pop(path, None)
+            stat = entry.stat() if entry is not None else os.stat(path)
+            file_size = stat.st_size
+        return {"file_size": file_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+
+    def get_hash(self, path: str, file_size: int) -> str:
+        hasher = hashlib.blake2b(digest_size = 8)
+        hasher.update(file_size.to_bytes(8, "little"))
+        
+        (archive_path, member) = self.parent.archives.split_path(path)
+        if archive_path and member: # The checksum that the archive stores covers the whole member, so nothing has to be decompressed
+            hasher.update(self.parent.archives.get_member_info(archive_path, member)[1])
+        else:
+            # The header block changes when a scan is saved again. The hash only tells copies apart, since lines that are recorded into a preallocated scan change neither block
+            with open(path, "rb") as file:
+                hasher.update(file.read(self.block_size))
+                if file_size > self.block_size:
+                    file.seek(max(self.block_size, file_size - self.block_size))
+                    hasher.update(file.read(self.block_size))
+        return hasher.hexdigest()
+
+    def get(self, path: str) -> dict:
+        """ Fingerprint of a file: {"file_size": int, "mtime_ns": int, "inode": int, "hash": str} """
+        fingerprint = self.stat(path)
+        with self.lock: cached_fingerprint = self.fingerprints.get(path)
+        if cached_fingerprint and all(cached_fingerprint[key] == fingerprint[key] for key in self.stat_keys): return dict(cached_fingerprint)
+        
+        fingerprint.update({"hash": self.get_hash(path, fingerprint["file_size"])})
+        with self.lock: self.fingerprints.update({path: fingerprint})
+        return dict(fingerprint)
+
+    def is_current(self, path: str, fingerprint: dict | None) -> bool:
+        """ Whether a stored fingerprint still describes the file """
+        # A changed size or modification time is a change. If only the inode changed (a copy that kept its modification time), the hash decides
+        if not fingerprint: return False
+        try: current_fingerprint = self.stat(path)
+        except Exception: return False
+        
+        if any(current_fingerprint[key] != fingerprint.get(key) for key in ["file_size", "mtime_ns"]): return False
+        if all(current_fingerprint[key] == fingerprint.get(key) for key in self.stat_keys): return True
+        return self.get(path)["hash"] == fingerprint.get("hash")
 
 
 
@@ -358,7 +2272,13 @@ class YAMLFunctions:
 class IOFunctions:
     def __init__(self):
         self.h5 = HDF5Functions(self)
+        self.h5_files = HDF5FilePool() # Open files of the lazy HDF5 datasets
         self.sxm = SXMFunctions(self)
+        self.dat = DATFunctions(self)
+        self.grid = GridFunctions(self)
+        self.session = SessionFunctions(self)
+        self.archives = ArchiveSource()
+        self.fingerprints = FileFingerprints(self)
         self.yaml = YAMLFunctions(self)
         self.ureg = pint.UnitRegistry()
         self.data = DataProcessing()
@@ -366,15 +2286,16 @@ class IOFunctions:
 
 
     # IO
-    def read_file(self, file_path: str) -> dict:
+    def read_file(self, file_path: str, lazy: bool = False) -> dict:
         output = {}
-        match os.path.splitext(file_path)[1]:
-            case ".hdf5" | ".h5": output = self.read_hdf5(file_path)
+        match self.archives.get_extension(file_path):
+            case ".hdf5" | ".h5": output = self.read_hdf5(file_path, lazy = lazy)
             case ".sxm": output = self.read_sxm(file_path)
+            case ".3ds": output = self.read_3ds(file_path)
             case _: print("I do not know how to read this file")        
         return output
     
-    def read_hdf5(self, file_path: str) -> dict:
+    def read_hdf5(self, file_path: str, lazy: bool = False) -> dict:
         if not os.path.isfile(file_path):
             print("Invalid file path provided to read_hdf5")
             return {}
@@ -385,9 +2306,10 @@ class IOFunctions:
         main_group = None
         axes_names = []
         axis_data = {}
+        channel_datasets = ([], []) # Names and titles of the channel datasets of an NSID file, which lazy datasets stack
 
         try:
-            with h5py.File(file_path, "r") as f:
+            with (nullcontext(self.h5_files.get(file_path)) if lazy else h5py.File(file_path, "r", swmr = True)) as f: # Lazy datasets keep the file open in the pool. SWMR mode allows reading files that are still being written
                 """
                 Parsing the root
                 """
@@ -428,6 +2350,11 @@ class IOFunctions:
                     print("Could not determine the main group in HDF5 file")
                     return(output_dict)
                 
+                # Follow the NeXus default from an NXentry to its NXdata group, as in the files written by setup_file
+                if main_group.attrs.get("NX_class") == "NXentry" and main_group.attrs.get("default") in main_group:
+                    if lazy: channel_datasets = self.h5.find_channel_datasets(main_group)
+                    main_group = main_group[main_group.attrs.get("default")]
+                
                 
                 
                 """
@@ -448,7 +2375,9 @@ class IOFunctions:
                     signal_name = main_group.attrs.get("signal", "")
                     if isinstance(signal_name, bytes): signal_name = signal_name.decode("utf-8")
 
-                    dataset = main_group[signal_name][:]
+                    if not lazy: dataset = main_group[signal_name][:]
+                    elif len(channel_datasets[0]) > 1: dataset = HDF5Dataset(self.h5_files, file_path, channel_datasets[0])
+                    else: dataset = HDF5Dataset(self.h5_files, file_path, main_group[signal_name].name)
                     output_dict.update({"signal": signal_name, "dataset": dataset})
 
                 if "axes" in main_group.attrs:
@@ -461,7 +2390,7 @@ class IOFunctions:
                     for axis_index, axis_name in enumerate(axes_names): # Loop over axis names
                         split_name = axis_name.split()
                         if not "indices" in split_name[-1]:
-                            axis_data.update({axis_name: main_group[axis_name][:]})
+                            axis_data.update({axis_name: HDF5Dataset(self.h5_files, file_path, main_group[axis_name].name) if lazy else main_group[axis_name][:]})
                             continue
                         
                         quantity = " ".join(split_name[:-1]) # Discard 'indices' from the name
@@ -472,16 +2401,18 @@ class IOFunctions:
                             axis_data.update({new_name: new_axis_data})
                             axes_names[axis_index] = new_name
                 
+                    if isinstance(dataset, HDF5Dataset) and dataset.stacked: (axes_names, axis_data) = (["channels"] + axes_names, {"channels": channel_datasets[1], **axis_data})
+                    if isinstance(dataset, HDF5Dataset): dataset.axes = axes_names
                     output_dict.update({"axes": axes_names, "axes_data": axis_data})
 
 
 
                 # If Nexus parsing failed: extract the scan or spectroscopy data
-                if not isinstance(dataset, np.ndarray):
+                if dataset is None:
                     recognized_tags = ["main", "sweep", "scan", "measurement", "spectrum", "spectroscopy", "data", "array"]
                     for tag in recognized_tags:
                         if tag in main_group.keys():
-                            dataset = main_group[tag][:]
+                            dataset = HDF5Dataset(self.h5_files, file_path, main_group[tag].name) if lazy else main_group[tag][:]
                             output_dict.update({"dataset": dataset})
                             break
                 
@@ -528,65 +2459,44 @@ class IOFunctions:
 
     def read_sxm(self, file_path: str, convert_to_sct_units: bool = True) -> dict:
         (header, file_data) = self.full_sxm_header_read(file_path)
-        [pixels, lines, channels, up_or_down] = [file_data.get(key) for key in ["pixels", "lines", "channels", "up_or_down"]]
+        [pixels, lines, channels, up_or_down, payload_offset] = [file_data.get(key) for key in ["pixels", "lines", "channels", "up_or_down", "payload_offset"]]
 
-        n_directions = 2
-        n_channels = len(channels)
-        axes = ["directions", "channels", "x (nm)", "y (nm)"]
+        axes = ["channels", "directions", "y (nm)", "x (nm)"]
         axes_data = {"directions": ["forward", "backward"], "channels": channels}
         file_data.update({"raw_header": header, "axes": axes, "axes_data": axes_data})
         
         try:
-            output_array = np.empty((n_directions, n_channels, pixels, lines), dtype = np.float32)
-            chunk_size = 256
-            tag = b":SCANIT_END:"
-            tag_len = len(tag)
-
-            with open(file_path, "rb") as f:
-                # First locate the tag
-                current_pos = 0
-                while True:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break
-
-                    idx = chunk.find(tag)
-                    if idx != -1:
-                        tag_pos = current_pos + idx
-                    
-                    if len(chunk) == chunk_size:
-                        f.seek(1 - tag_len, 1)  # 1 means relative to current position
-                        current_pos += chunk_size - tag_len + 1
-                    else:
-                        current_pos += len(chunk)
-                    
-                # Move the pointer, then read the scan data
-                f.seek(tag_pos + tag_len + 5)
-
-                new_channels = channels
-                for channel_index, channel_name in enumerate(channels):
-                    for direction_index in range(2):
-                        float_array = np.fromfile(f, dtype = ">f4", count = int(pixels * lines))
-                        image_slice = float_array.reshape(lines, pixels).transpose()
-                        
-                        if convert_to_sct_units:
-                            new_channel_name = self.convert_data_to_unit(image_slice, channel_name)
-                            new_channels[channel_index] = new_channel_name
-                        
-                        match (up_or_down, direction_index):
-                            case ("up", 0): output_array[direction_index, channel_index] = image_slice
-                            case ("up", 1): output_array[direction_index, channel_index] = np.flipud(image_slice)
-                            case (_, 0): output_array[direction_index, channel_index] = np.fliplr(image_slice)
-                            case (_, 1): output_array[direction_index, channel_index] = np.flipud(np.fliplr(image_slice))
-            
+            # Unit conversions are not applied to the data directly, but stored as a scale factor per channel
+            new_channels = list(channels)
+            scale_factors = [1. for _ in channels]
             if convert_to_sct_units:
+                for channel_index, channel_name in enumerate(channels):
+                    (scale_factors[channel_index], new_channels[channel_index]) = self.get_unit_factor(channel_name)
                 axes_data.update({"channels": new_channels})
                 file_data.update({"axes_data": axes_data})
-            file_data.update({"dataset": output_array})
+
+            # The payload offset is known from the header pass. The payload is memory-mapped, and a slice is only read and decoded when it is indexed
+            raw_tensor = self.archives.get_array(file_path, ">f4", payload_offset, (len(channels), 2, lines, pixels))
+            file_data.update({"dataset": LazyScanTensor(raw_tensor, scale_factors, up_or_down, crop = False)})
         except Exception as e:
             print(f"Problem reading .sxm file: {e}")
         return file_data
 
+    def read_3ds(self, file_path: str) -> dict:
+        file_data = {"file_path": file_path}
+        
+        try:
+            # Grids are never loaded into memory: the dataset is the memory-mapped grid, which reads only the pixels or slices that are indexed
+            grid = self.grid.get_grid(file_path)
+            (x, y, width, height, angle) = grid.grid_settings[:5]
+            axes = ["channels", "x (px)", "y (px)", grid.sweep_signal_name]
+            axes_data = {"channels": grid.channels, grid.sweep_signal_name: grid.sweep_signal}
+            file_data.update({"raw_header": grid.header, "pixels": grid.pixels, "lines": grid.lines, "lines_done": grid.lines_done, "points": grid.points, "channels": grid.channels,
+                              "center (nm)": [x * 1E9, y * 1E9], "size (nm)": [width * 1E9, height * 1E9], "angle (deg)": angle, "axes": axes, "axes_data": axes_data, "dataset": grid})
+        except Exception as e:
+            print(f"Problem reading .3ds file: {e}")
+        return file_data
+
     def save_yaml(self, data, path: str) -> bool | str:
         error = False
 
@@ -618,13 +2528,13 @@ class IOFunctions:
         try:
             spec_dict = files_dict.get("spectroscopy_files")
             scan_dict = files_dict.get("scan_files")
-            path = os.path.join(folder, "metadata.yml")
+            path = self.archives.get_sidecar_path(folder, "metadata.sqlite")
             
             # Parse the scan dictionary
             for key, single_file_dict in scan_dict.items():
                 if not isinstance(single_file_dict, dict): continue # Pass the dict_name entry; only parse single_file dictionaries
                 
-                allowed_entries = ["frame", "date_time_str", "file_name"] # Allowed entries for saving to yaml
+                allowed_entries = ["frame", "date_time_str", "file_name", "fingerprint", "channels"] # Allowed entries for saving to the metadata index
                 clean_single_file_dict = {entry: single_file_dict.get(entry) for entry in allowed_entries}
                 clean_single_file_dict.update({"dict_name": "single_file_dict"})
                 
@@ -634,7 +2544,7 @@ class IOFunctions:
             for key, single_file_dict in spec_dict.items():
                 if not isinstance(single_file_dict, dict): continue # Pass the dict_name entry; only parse single_file dictionaries
                 
-                allowed_entries = ["x (nm)", "y (nm)", "z (nm)", "date_time_str", "file_name", "associated_scan_name", "associated_scan_path"] # Allowed entries for saving to yaml
+                allowed_entries = ["x (nm)", "y (nm)", "z (nm)", "date_time_str", "file_name", "associated_scan_name", "associated_scan_path", "fingerprint"] # Allowed entries for saving to the metadata index
                 clean_single_file_dict = {entry: single_file_dict.get(entry) for entry in allowed_entries}
                 clean_single_file_dict.update({"dict_name": "single_file_dict"})
                 
@@ -647,15 +2557,21 @@ class IOFunctions:
                 "spectroscopy_files": clean_spec_dict
             }
             
-            error = self.save_yaml(clean_files_dict, path)
-            if error:
-                print(f"Error: {e}")
-                raise Exception(error)
+            error = MetadataIndex(path).save(clean_files_dict)
+            if error: raise Exception(error)
         except Exception as e:
             error = e
         
         return error
 
+    def update_file_metadata(self, folder: str, dict_name: str, key: int, single_file_dict: dict) -> bool | str:
+        """ Insert or replace the metadata of a single file in the metadata index """
+        return MetadataIndex(self.archives.get_sidecar_path(folder, "metadata.sqlite")).update(dict_name, key, single_file_dict)
+
+    def export_metadata_yaml(self, folder: str) -> bool | str:
+        """ Write the metadata index of a folder to metadata.yml """
+        return MetadataIndex(self.archives.get_sidecar_path(folder, "metadata.sqlite")).export_yaml(self.archives.get_sidecar_path(folder, "metadata.yml"))
+
     def find_experiment_files(self, directory: str) -> list:
         all_files = os.listdir(directory)
         python_files = [os.path.join(directory, file) for file in all_files if file.endswith(".py")]
@@ -801,6 +2717,12 @@ class IOFunctions:
             print(f"Error encountered while trying to convert data ({quantity}) to unit {target_unit}: {e}")
         return output_quantity
 
+    def get_unit_factor(self, quantity: str, target_unit: str = None) -> tuple[float, str]:
+        """ Multiplication factor that convert_data_to_unit would apply """
+        factor = np.ones(1, dtype = float)
+        output_quantity = self.convert_data_to_unit(factor, quantity, target_unit)
+        return (float(factor[0]), output_quantity)
+
     def convert_to_sct_frame(self, frame: dict) -> dict:
         w_nm = None
         h_nm = None
@@ -1037,63 +2959,11 @@ class IOFunctions:
 
 
     # Raw file functions
-    def minimal_sxm_header_read(self, file_path: str) -> tuple[np.ndarray, dict]:
-        try:
-            (raw_header, end_pos) = self.get_raw_sxm_header(file_path)
-            header = np.array(raw_header, dtype = np.str_)
-
-            nanonis_tags = [":SCAN_RANGE:\n", ":SCAN_ANGLE:\n", ":SCAN_OFFSET:\n", ":REC_TIME:\n", ":REC_DATE:\n", ":SCAN_PIXELS:\n", ":SCAN_DIR:\n", ":BIAS:\n"]
-            sct_tags = ["scan_range (m)", "angle (deg)", "offset (m)", "start_time", "scan_date", "grid_size", "up_or_down", "V_nanonis (V)"]
+    def minimal_sxm_header_read(self, file_path: str) -> tuple[list, dict]:
+        return self.sxm.read_header_quick(file_path)
 
-            sct_dict = {}
-            for nanonis_tag, sct_tag in zip(nanonis_tags, sct_tags):
-                try:
-                    index = np.where(header == nanonis_tag)[0][0]
-                    values_split = header[index + 1].split()
-
-                    if nanonis_tag in [":REC_TIME:\n", ":REC_DATE:\n", ":SCAN_DIR:\n"]:
-                        sct_dict.update({sct_tag: values_split[0]})
-                    else:
-                        values_num = [self.get_scientific_numbers(value)[0] for value in values_split]
-                        if len(values_num) < 2: values_num = values_num[0]
-                        sct_dict.update({sct_tag: values_num})
-                except Exception as e:
-                    print(f"Problem reading tag {nanonis_tag.split()[0]} from .sxm file")
-        except Exception as e:
-            print(f"Error getting the SXM file header: {e}")
-        return (header, sct_dict)
-
-    def full_sxm_header_read(self, file_path: str) -> tuple[np.ndarray, dict]:
-        (header_array, sct_dict) = self.minimal_sxm_header_read(file_path)
-        [pixels, lines] = [int(sct_dict.get("grid_size", [1, 1])[i]) for i in range(2)]
-        sct_dict.update({"pixels": pixels, "lines": lines})
-        
-        frame = self.convert_to_sct_frame(sct_dict)
-        sct_dict.update({"frame": frame})
-
-        # Z_controller
-        try:
-            z_controller_index = np.where(header_array == ":Z-CONTROLLER:\n")[0][0]
-            z_controller_data = header_array[z_controller_index + 2].split("\t")
-            [_, z_controller_name, feedback, setpoint, p_gain, i_gain, t_const] = z_controller_data
-            sct_dict.update({"z_controller": {"name": z_controller_name, "feedback": bool(feedback), "setpoint": setpoint, "p_gain": p_gain, "i_gain": i_gain, "t_const": t_const}})
-        except Exception as e:
-            print(f"Problem retrieving z-controller data from .sxm file: {e}")
-
-        # Channels
-        try:
-            channel_data_index = np.where(header_array == ":DATA_INFO:\n")[0][0]
-            channel_names = []
-            for channel_index in range(100):
-                channel_data = header_array[channel_data_index + 2 + channel_index].split()
-                if len(channel_data) < 1: break
-                [channel_index, quantity, unit, direction, calibration, offset] = channel_data
-                channel_names.append(" ".join((quantity, f"({unit})")))
-            
-            sct_dict.update({"channels": channel_names})
-        except Exception as e:
-            print(f"Problem retrieving channel data from .sxm file: {e}")
-        return (header_array, sct_dict)
+    def full_sxm_header_read(self, file_path: str) -> tuple[list, dict]:
+        return self.sxm.read_header_full(file_path)
 
     def get_file_name_lists(self, files_dict: dict = {}) -> tuple[list, list]:
         [scan_files, spec_files] = [files_dict.get(dict_name) for dict_name in ["scan_files", "spectroscopy_files"]]
@@ -1117,6 +2987,13 @@ class IOFunctions:
         files_dict = {}
 
         try:
+            if metadata_path.endswith(".sqlite") and os.path.isfile(metadata_path): # The metadata index already exists
+                (loaded_files_dict, error) = MetadataIndex(metadata_path).load()
+                if not error: files_dict = loaded_files_dict
+                return (files_dict, error)
+            
+            # Folders that were indexed before have a metadata.yml file instead, which is replaced by the index on the next save
+            metadata_path = metadata_path.removesuffix(".sqlite") + ".yml"
             if os.path.isfile(metadata_path): # Metadata file already exists. Load metadata from file
                 (loaded_files_dict, error) = self.load_yaml(metadata_path)
                 if "spectroscopy_files" in loaded_files_dict.keys() and "scan_files" in loaded_files_dict.keys(): # File loaded successfully. Roll with it
@@ -1127,43 +3004,64 @@ class IOFunctions:
         
         return (files_dict, error)
 
+    def find_changed_files(self, files_dict: dict, folder_path: str) -> tuple[list, list]:
+        """ Names of the scan and spectroscopy files whose fingerprint changed """
+        # Entries without a fingerprint count as changed
+        changed_file_names = []
+        for dict_name in ["scan_files", "spectroscopy_files"]:
+            single_file_dicts = [value for value in files_dict.get(dict_name, {}).values() if isinstance(value, dict)] # The dict_name entry is of type str and should be ignored
+            changed_file_names.append([value.get("file_name") for value in single_file_dicts if not self.fingerprints.is_current(os.path.join(folder_path, value.get("file_name")), value.get("fingerprint"))])
+        return tuple(changed_file_names)
+
     def create_empty_files_dict(self, directory_name: str) -> tuple[dict, bool | str]:
         error = False
         files_dict = {"dict_name": "files_dict"} # Self reference to facilitate the app recognizing what kind of dictionary this is
         
-        if os.path.isfile(directory_name): directory_name = os.path.dirname(directory_name)
-        if not os.path.isdir(directory_name):
+        # Zip archives are treated as folders, and gzip-compressed files as the files they contain
+        directory_name = self.archives.get_folder(directory_name)
+        if directory_name is None:
             error = "No valid directory was provided"
             return (files_dict, error)
         
         try:
-            all_files = os.listdir(directory_name)
-            dat_files = [os.path.join(directory_name, file) for file in all_files if file.endswith(".dat")]
-            sxm_files = [os.path.join(directory_name, file) for file in all_files if file.endswith(".sxm")]
+            # A single scandir pass. Members in subfolders of an archive keep their relative path as file name
+            entries = self.archives.scan_folder(directory_name)
+            (sxm_files, dat_files, grid_files) = ([], [], [])
+            for file in entries:
+                match self.archives.get_extension(file):
+                    case ".sxm": sxm_files.append(file)
+                    case ".dat": dat_files.append(file)
+                    case ".3ds": grid_files.append(file)
+            paths = {file: os.path.join(directory_name, file) for file in sxm_files + dat_files + grid_files}
+            
+            # Keep the directory entries, such that the fingerprint checks that follow do not stat the files again
+            self.fingerprints.add_entries({paths[file]: entries[file] for file in paths if entries[file] is not None})
 
             # Set up dictionaries
             scans_dict = {"dict_name": "scan_files"} # Self reference to facilitate the app recognizing what kind of dictionary this is
             specs_dict = {"dict_name": "spectroscopy_files"}
+            grids_dict = {"dict_name": "grid_files"} # Grid spectroscopy files, which are not part of the metadata index
 
             # Iterate over the sxm files (scan files)
             for index, file in enumerate(sxm_files):
-                file_basename = os.path.basename(file)
                 single_file_dict = {
                     "dict_name": "single_file_dict", # Self reference to facilitate the app recognizing what kind of dictionary this is
-                    "file_name": file_basename,
-                    "path": file
+                    "file_name": file,
+                    "path": paths[file]
                 }
                 scans_dict.update({index: single_file_dict})
             
             # Iterate over the dat files (potential spectroscopy files)            
             for index, file in enumerate(dat_files):
-                file_basename = os.path.basename(file)
                 single_file_dict = {
                     "dict_name": "single_file_dict",
-                    "file_name": file_basename,
-                    "path": file
+                    "file_name": file,
+                    "path": paths[file]
                 }
                 specs_dict.update({index: single_file_dict})
+            
+            for index, file in enumerate(grid_files):
+                grids_dict.update({index: {"dict_name": "single_file_dict", "file_name": file, "path": paths[file]}})
     
         except Exception as e:
             error = e
@@ -1172,7 +3070,8 @@ class IOFunctions:
         # Create and return the dictionary
         files_dict.update({
             "scan_files": scans_dict,
-            "spectroscopy_files": specs_dict
+            "spectroscopy_files": specs_dict,
+            "grid_files": grids_dict
         })
         
         return (files_dict, error)
@@ -1180,49 +3079,17 @@ class IOFunctions:
     def get_spectroscopy_header(self, file_path: str) -> tuple[dict, bool | str]:
         error = False
         header = {}
-        [x, y, z, dt_object] = [False for _ in range(4)]
         
         try:
-            # Read the file line by line until the tags are found
-            with open(file_path, "rb") as file:
-                for line in file:
-                    decoded = line.decode()
-
-                    (quantity, unit, backward_bool, error) = self.split_physical_quantity(decoded)
-                    if not error and isinstance(quantity, str):
-                        match quantity.lower():
-                            case "x":
-                                x_magnitude = self.get_scientific_numbers(decoded)[0]
-                                x = self.ureg.Quantity(x_magnitude, unit)
-                            case "y":
-                                y_magnitude = self.get_scientific_numbers(decoded)[0]
-                                y = self.ureg.Quantity(y_magnitude, unit)
-                            case "z":
-                                z_magnitude = self.get_scientific_numbers(decoded)[0]
-                                z = self.ureg.Quantity(z_magnitude, unit)
-                            case _:
-                                pass
-
-                    if "Saved Date" in decoded:
-                        try:
-                            format_string = "Saved Date\t%d.%m.%Y %H:%M:%S\t"
-                            dt_object = datetime.strptime(decoded, format_string)
-                        except:
-                            pass
-                        
-                    # Found all tags
-                    if x and y and z and dt_object: break
-                
-                # One of the tags was not found
-                if not x or not y or not z or not dt_object:
-                    error = True
-                    return (header, error)
+            # Byte-level scan of the header only, without pint. The coordinates are plain floats in m
+            ([x, y, z], dt_object) = self.dat.scan_header(file_path)
             
-            # x_nm, y_nm, z_nm are the (unitless) magnitudes of the pint Quantities when expressed in nm
-            x_nm = x.to("nm").magnitude
-            y_nm = y.to("nm").magnitude
-            z_nm = z.to("nm").magnitude
+            # One of the tags was not found
+            if x is None or y is None or z is None or dt_object is None:
+                error = True
+                return (header, error)
             
+            (x_nm, y_nm, z_nm) = (x * 1E9, y * 1E9, z * 1E9)
             dt_str = dt_object.strftime("%Y-%m-%d %H:%M:%S")
             
             header = {
@@ -1253,7 +3120,31 @@ class IOFunctions:
             
             return (header, error)
 
-    def populate_spectroscopy_headers(self, files_dict: dict, folder_path: str) -> tuple[dict, bool | str]:
+    def read_header_and_fingerprint(self, read_header, file_path: str) -> tuple[dict, bool | str]:
+        # The fingerprint is taken before the header is read, so a file that changes in between is parsed again on the next load
+        fingerprint = self.fingerprints.get(file_path)
+        (header, error) = read_header(file_path)
+        if not error: header.update({"fingerprint": fingerprint})
+        return (header, error)
+
+    def read_headers_concurrently(self, file_paths: dict, read_header, progress_callback = None, max_workers: int = None, fingerprint: bool = False) -> dict:
+        """ Read many headers in a bounded thread pool """
+        # Returns {key: (header, error)} in the order of file_paths
+        results = {}
+        if fingerprint: header_reader = lambda file_path: self.read_header_and_fingerprint(read_header, file_path)
+        else: header_reader = read_header
+        if max_workers is None: max_workers = min(16, (os.cpu_count() or 1) + 4) # Header reading is I/O-bound, so more threads than cores pay off
+        if progress_callback: progress_callback(0, len(file_paths)) # Marks the start, so that the caller can report the throughput
+
+        with ThreadPoolExecutor(max_workers = max_workers) as executor:
+            futures = {executor.submit(header_reader, file_path): key for key, file_path in file_paths.items()}
+            for n_done, future in enumerate(as_completed(futures), start = 1):
+                try: results.update({futures[future]: future.result()})
+                except Exception as e: results.update({futures[future]: ({}, e)})
+                if progress_callback: progress_callback(n_done, len(futures)) # Called from the calling thread, so it may update the GUI
+        return {key: results[key] for key in file_paths}
+
+    def populate_spectroscopy_headers(self, files_dict: dict, folder_path: str, progress_callback = None, max_workers: int = None) -> tuple[dict, bool | str]:
         error = False
         new_files_dict = {"dict_name": "files_dict"}
         new_spec_dict = {"dict_name": "spectroscopy_files"}
@@ -1262,11 +3153,11 @@ class IOFunctions:
             scan_dict = files_dict.get("scan_files")
             spec_dict = files_dict.get("spectroscopy_files")
             
-            for key, value in spec_dict.items():
-                if not isinstance(value, dict): continue # The dict_name entry is of type str and should be ignored
-                file_name = value.get("file_name")
-                (header, error) = self.get_spectroscopy_header(os.path.join(folder_path, file_name))
-                                
+            file_paths = {key: os.path.join(folder_path, value.get("file_name")) for key, value in spec_dict.items() if isinstance(value, dict)} # The dict_name entry is of type str and should be ignored
+            headers = self.read_headers_concurrently(file_paths, self.get_spectroscopy_header, progress_callback, max_workers, fingerprint = True)
+            
+            for key, (header, error) in headers.items():
+                value = spec_dict[key]
                 if not error:
                     value.update(header)
                     new_spec_dict.update({key: value})
@@ -1282,60 +3173,31 @@ class IOFunctions:
 
     def get_raw_sxm_header(self, file_path: str) -> tuple[list, bool | str]:
         error = False
-        header_end_tag = ":SCANIT_END:"
         raw_header = []
         
         try:
-            with open(file_path, "rb") as file:
-                for line in file:
-                    decoded = line.decode()
-                    
-                    raw_header.append(decoded)
-                    if header_end_tag in decoded: break
+            raw_header = self.sxm.tokenize_header(file_path).lines_raw
         except Exception as e:
             error = e
         
         return (raw_header, error)
 
-    def parse_scan_header(self, header_list: list) -> tuple[dict, bool | str]:
+    def parse_scan_header(self, header_list: list | SXMHeader) -> tuple[dict, bool | str]:
         error = False
         header = {}
         
         try:
-            date_tag = ":REC_DATE:"
-            time_tag = ":REC_TIME:"
-            range_tag = ":SCAN_RANGE:"
-            offset_tag = ":SCAN_OFFSET:"
-            angle_tag = ":SCAN_ANGLE:"
-            
-            date_line = ""
-            time_line = ""
-            range_line = ""
-            offset_line = ""
-            angle_line = ""
-
-            # Read the file line by line until the tags are found
-            for index, line in enumerate(header_list):                
-                if date_tag in line: date_line = header_list[index + 1]
-                if time_tag in line: time_line = header_list[index + 1]
-                if range_tag in line: range_line = header_list[index + 1]
-                if offset_tag in line: offset_line = header_list[index + 1]
-                if angle_tag in line: angle_line = header_list[index + 1]
-
-                if date_line and time_line and range_line and offset_line and angle_line: break
-
-            if not (date_line and time_line and range_line and offset_line and angle_line):
+            if isinstance(header_list, SXMHeader): sxm_header = header_list
+            else: sxm_header = self.sxm.parse_tags(self.sxm.split_tags([line.rstrip("\r\n") for line in header_list]))
+
+            if not all(tag in sxm_header.tags for tag in [":REC_DATE:", ":REC_TIME:", ":SCAN_RANGE:", ":SCAN_OFFSET:", ":SCAN_ANGLE:"]):
                 error = "Could not parse the header data from the sxm file"
                 return (header, error)
 
-            # Construct a datetime object from the found date and time
-            date_list = [int(number) for number in date_line.split(".")]
-            time_list = [int(number) for number in time_line.split(":")]
-            dt_object = datetime(date_list[2], date_list[1], date_list[0], time_list[0], time_list[1], time_list[2])
-
-            scan_range = self.get_scientific_numbers(range_line)
-            offset = self.get_scientific_numbers(offset_line)
-            angle = self.get_scientific_numbers(angle_line)[0]
+            dt_object = sxm_header.date_time
+            scan_range = sxm_header.scan_range
+            offset = sxm_header.offset
+            angle = sxm_header.angle
 
             x = self.ureg.Quantity(offset[0], "m").to("nm")
             y = self.ureg.Quantity(offset[1], "m").to("nm")
@@ -1366,6 +3228,7 @@ class IOFunctions:
                 "angle": angle,
                 "date_time": dt_object,
                 "date_time_str": dt_str,
+                "channels": list(sxm_header.channels),
 
                 "frame": {
                     "dict_name": "frame_dict",
@@ -1381,7 +3244,13 @@ class IOFunctions:
         
         return (header, error)
 
-    def populate_scan_headers(self, files_dict: dict, folder_path: str) -> tuple[dict, bool | str]:
+    def read_scan_header(self, file_path: str) -> tuple[dict, bool | str]:
+        try:
+            return self.parse_scan_header(self.sxm.tokenize_header(file_path))
+        except Exception as e:
+            return ({}, e)
+
+    def populate_scan_headers(self, files_dict: dict, folder_path: str, progress_callback = None, max_workers: int = None) -> tuple[dict, bool | str]:
         new_files_dict = {"dict_name": "files_dict"}
         new_scan_dict = {"dict_name": "scan_files"}
         
@@ -1389,18 +3258,14 @@ class IOFunctions:
             scan_dict = files_dict.get("scan_files")
             spec_dict = files_dict.get("spectroscopy_files")
             
-            for key, value in scan_dict.items():
-                if not isinstance(value, dict): continue # The dict_name entry is of type str and should be ignored
-                file_name = value.get("file_name")
-                (raw_header, error) = self.get_raw_sxm_header(os.path.join(folder_path, file_name))
-                if error:
-                    continue
-                else:
-                    (header, error) = self.parse_scan_header(raw_header)
-                    
-                    if not error:
-                        value.update(header)
-                        new_scan_dict.update({key: value})
+            file_paths = {key: os.path.join(folder_path, value.get("file_name")) for key, value in scan_dict.items() if isinstance(value, dict)} # The dict_name entry is of type str and should be ignored
+            headers = self.read_headers_concurrently(file_paths, self.read_scan_header, progress_callback, max_workers, fingerprint = True)
+            
+            for key, (header, error) in headers.items():
+                value = scan_dict[key]
+                if not error:
+                    value.update(header)
+                    new_scan_dict.update({key: value})
 
             # Update the total files_dict
             error = False
@@ -1412,53 +3277,109 @@ class IOFunctions:
         return (new_files_dict, error)
 
     def populate_associated_scans(self, files_dict: dict) -> tuple[dict, bool | str]:
-        error = False
-        new_files_dict = files_dict
+        """ Associate every spectrum with the last scan recorded before it """
+        spec_keys = [key for key, value in files_dict.get("spectroscopy_files", {}).items() if isinstance(value, dict)]
+        return self.associate_spectra(files_dict, spec_keys)
 
+    def associate_spectra(self, files_dict: dict, spec_keys: list, scan_times: set = None) -> tuple[dict, bool | str]:
+        """ Associate spectra with the last scan recorded before them """
+        # These are the spectra of spec_keys, and those recorded after any of scan_times (scans that were added, removed or changed), up to the next scan
+        error = False
+        
         try:
             scan_dict = files_dict.get("scan_files")
             spec_dict = files_dict.get("spectroscopy_files")
-
-            for spec_key, spec_file_dict in spec_dict.items():
-                if not isinstance(spec_file_dict, dict): continue
+            
+            # The date_time_str entries ('%Y-%m-%d %H:%M:%S') sort in the order of time
+            scans = sorted((value.get("date_time_str"), key) for key, value in scan_dict.items() if isinstance(value, dict) and value.get("date_time_str"))
+            spectra = sorted((value.get("date_time_str"), key) for key, value in spec_dict.items() if isinstance(value, dict) and value.get("date_time_str"))
+            (sorted_scan_times, sorted_spec_times) = ([scan_time for (scan_time, _) in scans], [spec_time for (spec_time, _) in spectra])
+            
+            # A scan at time t is the associated scan of the spectra after t, until the next scan
+            spec_keys = set(spec_keys)
+            for scan_time in scan_times or []:
+                if not scan_time: continue
+                next_index = bisect.bisect_right(sorted_scan_times, scan_time)
+                start = bisect.bisect_right(sorted_spec_times, scan_time)
+                stop = bisect.bisect_right(sorted_spec_times, sorted_scan_times[next_index]) if next_index < len(scans) else len(spectra)
+                spec_keys.update(key for (_, key) in spectra[start : stop])
+            
+            for spec_key in spec_keys:
+                spec_file_dict = spec_dict.get(spec_key)
+                if not isinstance(spec_file_dict, dict) or not spec_file_dict.get("date_time_str"): continue
                 
-                # Find the time at which the spectrum was acquired
-                spec_time = spec_file_dict.get("date_time")
+                scan_index = bisect.bisect_left(sorted_scan_times, spec_file_dict.get("date_time_str")) - 1 # The last scan acquired before the spectrum
+                previous_scan = scan_dict[scans[scan_index][1]] if scan_index >= 0 else {}
+                spec_file_dict.update({
+                    "associated_scan_name": previous_scan.get("file_name"),
+                    "associated_scan_path": previous_scan.get("path"),
+                    })
+        except Exception as e:
+            error = e
+        
+        return (files_dict, error)
+
+    def refresh_files_dict(self, files_dict: dict, loaded_files_dict: dict, folder_path: str, changed_file_names: tuple = ([], []), progress_callback = None, max_workers: int = None) -> tuple[dict, bool | str]:
+        """ Refresh a files_dict, reading only the headers of new and changed files """
+        # Entries of the loaded files_dict are reused for unchanged files, removed files drop out and only the spectra whose associated scan may have changed are associated again
+        error = False
+        new_files_dict = {"dict_name": "files_dict"}
+        
+        try:
+            read_header_functions = {"scan_files": self.read_scan_header, "spectroscopy_files": self.get_spectroscopy_header}
+            descriptions = {"scan_files": "scan headers", "spectroscopy_files": "spectroscopy headers"}
+            scan_times = set() # Times of the scans that were added, removed or changed, before and after the change
+            parsed_spec_keys = []
+            
+            for dict_name, changed_names in zip(["scan_files", "spectroscopy_files"], changed_file_names):
+                single_file_dicts = files_dict.get(dict_name, {})
+                loaded_single_file_dicts = {value.get("file_name"): value for value in loaded_files_dict.get(dict_name, {}).values() if isinstance(value, dict)}
+                changed_names = set(changed_names)
                 
-                # Loop over all scans
-                previous_scan = None
-                for scan_key, scan_file_dict in scan_dict.items():
-                    if not isinstance(scan_file_dict, dict): continue
-                    
-                    # Find the time at which the scan was acquired
-                    scan_time = scan_file_dict.get("date_time")
-                    
-                    # If the scan was acquired before the spectrum, it may be associated with it: check at the next iteration
-                    if scan_time < spec_time:
-                        previous_scan = scan_file_dict
-                    # If the scan was acquired after the spectrum, the previous scan was associated with the spectrum
+                (reused_keys, file_paths) = (set(), {})
+                for key, single_file_dict in single_file_dicts.items():
+                    if not isinstance(single_file_dict, dict): continue
+                    loaded_single_file_dict = loaded_single_file_dicts.pop(single_file_dict.get("file_name"), None)
+                    if loaded_single_file_dict is not None and single_file_dict.get("file_name") not in changed_names:
+                        single_file_dict.update({**loaded_single_file_dict, **single_file_dict}) # The loaded metadata, with the path of the current folder
+                        reused_keys.add(key)
                     else:
-                        if previous_scan: spec_file_dict.update({
-                            "associated_scan_name": previous_scan.get("file_name"),
-                            "associated_scan_path": previous_scan.get("path"),
-                            })
+                        file_paths.update({key: os.path.join(folder_path, single_file_dict.get("file_name"))})
+                        if loaded_single_file_dict is not None and dict_name == "scan_files": scan_times.add(loaded_single_file_dict.get("date_time_str"))
+                if dict_name == "scan_files": scan_times.update(value.get("date_time_str") for value in loaded_single_file_dicts.values()) # The scans that were removed
+                
+                # Read the headers of the new and changed files only. Files whose header cannot be read are left out, as by populate_scan_headers and populate_spectroscopy_headers
+                header_progress_callback = (lambda n_done, n_total, description = descriptions[dict_name]: progress_callback(n_done, n_total, description)) if progress_callback else None
+                headers = self.read_headers_concurrently(file_paths, read_header_functions[dict_name], header_progress_callback, max_workers, fingerprint = True) if file_paths else {}
+                parsed_keys = set()
+                for key, (header, header_error) in headers.items():
+                    if header_error: continue
+                    single_file_dicts[key].update(header)
+                    parsed_keys.add(key)
+                    if dict_name == "scan_files": scan_times.add(single_file_dicts[key].get("date_time_str"))
+                if dict_name == "spectroscopy_files": parsed_spec_keys = list(parsed_keys)
                 
-                spec_dict.update({spec_key: spec_file_dict})
+                kept_keys = reused_keys | parsed_keys
+                new_files_dict.update({dict_name: {key: value for key, value in single_file_dicts.items() if not isinstance(value, dict) or key in kept_keys}})
             
-            new_files_dict.update({"spectroscopy_files": spec_dict})
+            (new_files_dict, error) = self.associate_spectra(new_files_dict, parsed_spec_keys, scan_times)
         except Exception as e:
             error = e
         
         return (new_files_dict, error)
 
-    def get_spectroscopy_object(self, file_path: str) -> tuple[object, bool | str]:
+    def get_spectroscopy_object(self, file_path: str, columns: list = None, lazy: bool = False) -> tuple[object, bool | str]:
         error = False
         spec_object = None
         
         try:
-            spec_object = nap.read.Spec(file_path)
-            spec_spectra = spec_object.signals
-            spec_header = spec_object.header
+            if lazy: # Only the header is read. The signals are decoded when they are first requested
+                (spec_header, channels) = self.dat.read_header(file_path)
+                spec_object = LazySpectrum(self.dat, file_path, spec_header, channels)
+            else: # Only the requested columns (all if None) are converted. The signals are rows of the spectrum matrix, without copies
+                (spec_header, channels, spectrum_matrix) = self.dat.read_dat(file_path, columns)
+                spec_spectra = dict(zip(channels, spectrum_matrix))
+                spec_object = DATSpectrum(file_path, spec_header, spec_spectra)
             new_spec_header = spec_header.copy()
             
             # Extract physical quantitiies and create copies with the preferred nm, pA, s units
@@ -1498,8 +3419,7 @@ class IOFunctions:
             rec_time = [int(element) for element in spec_time.split(":")]
             dt_object = datetime(rec_date[2], rec_date[1], rec_date[0], rec_time[0], rec_time[1], rec_time[2])
             
-            channels = np.array(list(spec_spectra.keys()), dtype = str)
-            spectrum_matrix = np.array(list(spec_spectra.values()))
+            channels = np.array(channels, dtype = str)
 
             # Add the new attributes to the scan object
             # Redundant attribute names for the coordinates are for ease of use
@@ -1510,7 +3430,7 @@ class IOFunctions:
             setattr(spec_object, "y", spec_coords[1])
             setattr(spec_object, "z", spec_coords[2])
             setattr(spec_object, "channels", channels)
-            setattr(spec_object, "matrix", spectrum_matrix)
+            if not lazy: setattr(spec_object, "matrix", spectrum_matrix)
             setattr(spec_object, "date_time", dt_object)
         
         except Exception as e:
@@ -1525,16 +3445,29 @@ class IOFunctions:
         try:
             spec_dict = files_dict.get("spectroscopy_files")
 
-            for spec_key, spec_file_dict in spec_dict.items():
-                if not isinstance(spec_file_dict, dict): continue
-                
-                file_name = spec_file_dict.get("file_name")
-                file_path = os.path.join(folder_path, file_name)
-                (spec_object, error) = self.get_spectroscopy_object(file_path)
-                
+            # New and changed spectra are appended to the packed cache of the folder in the background, from which the signals are memory-mapped
+            if self.dat.spectra_cache is not None: self.dat.spectra_cache.stop()
+            spectra_cache = SpectraCache(self, folder_path)
+            self.dat.spectra_cache = spectra_cache
+            spectra_cache.build_in_background([value.get("file_name") for value in spec_dict.values() if isinstance(value, dict)])
+
+            # Only the headers are read here. The signals of a spectrum are taken from the spectra cache, or decoded when they are first requested and kept in an LRU cache of bounded size
+            file_paths = {key: os.path.join(folder_path, value.get("file_name")) for key, value in spec_dict.items() if isinstance(value, dict)}
+            spec_objects = self.read_headers_concurrently(file_paths, lambda file_path: self.get_spectroscopy_object(file_path, lazy = True))
+
+            for spec_key, (spec_object, error) in spec_objects.items():
                 if not error:
                     channels = spec_object.channels
-                    spec_file_dict.update({"spec_object": spec_object, "channels": channels})
+                    spec_dict[spec_key].update({"spec_object": spec_object, "channels": channels})
+            
+            # Grids are memory-mapped. Their pixels are listed as spectra by Spectralyzer, and only read when they are plotted
+            for grid_dict in [value for value in files_dict.get("grid_files", {}).values() if isinstance(value, dict)]:
+                try:
+                    grid = self.grid.get_grid(os.path.join(folder_path, grid_dict.get("file_name")))
+                    date_time = grid.get_date_time()
+                    grid_dict.update({"grid": grid, "channels": [grid.sweep_signal_name] + grid.channels, "date_time_str": date_time.strftime("%Y-%m-%d %H:%M:%S") if date_time else None})
+                except Exception as e:
+                    print(f"Problem opening the grid {grid_dict.get('file_name')}: {e}")
             
             new_files_dict.update({"spectroscopy_files": spec_dict})
         except Exception as e:
@@ -1651,185 +3584,21 @@ class IOFunctions:
 
         return (scan_list, spectrum_list, files_dict, error)
 
-    def get_scan(self, file_name, units: dict = {"length": "m", "current": "A"}, default_channel_units: dict = {"X": "m", "Y": "m", "Z": "m", "Current": "A", "LI Demod 1 X": "A", "LI Demod 1 Y": "A", "LI Demod 2 X": "A", "LI Demod 2 Y": "A"}) -> tuple[object, bool | str]:
+    def get_scan(self, file_name, units: dict = {"length": "m", "current": "A"}, default_channel_units: dict = {"X": "m", "Y": "m", "Z": "m", "Current": "A", "LI Demod 1 X": "A", "LI Demod 1 Y": "A", "LI Demod 2 X": "A", "LI Demod 2 Y": "A"}, lazy: bool = False, dtype: np.dtype = np.float32) -> tuple[object, bool | str]:
         error = False
 
-        if not os.path.exists(file_name):
+        if not self.archives.exists(file_name):
             error = f"Error: File \"{file_name}\" does not exist."
             return (error, error)
 
-        root, extension = os.path.splitext(file_name)
+        extension = self.archives.get_extension(file_name)
         if extension != ".sxm":
             error = "Error: attempting to open a scan that is not an sxm file."
             return (error, error)
 
-        try:
-            scan_object = nap.read.Scan(file_name) # Read the scan data. scan_data is an object whose attributes contain all the data of the scan
-            scans = scan_object.signals # Read the scans
-            scan_header = scan_object.header
-            data_info = scan_header.get("data_info")
-                                    
-            # Attach the units to the scan array keys
-            chan_names = np.array(data_info.get("Name"))
-            chan_units = np.array(data_info.get("Unit"))
-            unitized_scans = {}
-            for scan_channel, scan_array in scans.items():
-                if scan_channel in chan_names:
-                    index = np.where(scan_channel == chan_names)[0][0]
-                    channel_unit = chan_units[index]
-                    
-                    # Translate to preferred units
-                    match channel_unit:
-                        case "A":
-                            channel_unit = "pA"
-                            for array in scan_array.values(): array *= 1E12
-                        case "m":
-                            channel_unit = "nm"                            
-                            for array in scan_array.values(): array *= 1E9
-                        case _:
-                            pass
-                    unitized_scans.update({f"{scan_channel} ({channel_unit})": scan_array})
-                else:
-                    unitized_scans.update({f"{scan_channel}": scan_array})
-            scans = unitized_scans
-            channels = np.array(list(scans.keys())) # Read the channels. Only the quantity names are returned, no units
-            
-            
-            
-            up_or_down = scan_header.get("scan_dir", "down") # Read whether the scan was recorded in the upward or downward direction
-            (pixels, lines_uncropped) = scan_header.get("scan_pixels", np.array([100, 100], dtype = int)) # Read the number of pixels in the scan
-            scan_range_uncropped = scan_header.get("scan_range", np.array([1E-8, 1E-8], dtype = float)) # Read the size of the scan
-            bias = round(float(scan_header.get("bias", 0)), 3) # Get the bias (present in the header as a string, passed more directly as a float)
-            z_controller = scan_header.get("z-controller") # Extract and convert z-controller parameters
-            feedback = bool(z_controller.get("on")[0]) # Bool, true or false
-            setpoint_str = z_controller.get("Setpoint")[0]
-            angle = scan_header.get("scan_angle")
-            offset = scan_header.get("scan_offset")
-            
-            # Extract and convert time parameters and convert to datetime object
-            rec_date = [int(element) for element in scan_header.get("rec_date", "00.00.1900").split(".")]
-            rec_time = [int(element) for element in scan_header.get("rec_time", "00:00:00").split(":")]
-            dt_object = datetime(rec_date[2], rec_date[1], rec_date[0], rec_time[0], rec_time[1], rec_time[2])
-            
-            bias_unitized = self.ureg.Quantity(bias, "V")
-            scan_range_uncropped_unitized = [self.ureg.Quantity(range_dim, "m") for range_dim in scan_range_uncropped]
-
-            # Deprecate this after completing the switch to pint:
-            # Compute the re-unitization factors
-            # Lengths
-            channel_units = default_channel_units.copy() # Initialize channel_units to the default setting
-            match units.get("length", "m"):
-                case "m": L_multiplication_factor = 1
-                case "dm": L_multiplication_factor = 10
-                case "cm": L_multiplication_factor = 100
-                case "mm": L_multiplication_factor = 1E3
-                case "um": L_multiplication_factor = 1E6
-                case "nm": L_multiplication_factor = 1E9
-                case "A": L_multiplication_factor = 1E10
-                case "pm": L_multiplication_factor = 1E12
-                case "fm": L_multiplication_factor = 1E15
-                case _: L_multiplication_factor = 1
-            if L_multiplication_factor == 1: units["length"] = "m" # Fall back to m
-        
-            # Current
-            match units.get("current", "A"):
-                case "A": I_multiplication_factor = 1
-                case "dA": I_multiplication_factor = 10
-                case "cA": I_multiplication_factor = 100
-                case "mA": I_multiplication_factor = 1E3
-                case "uA": I_multiplication_factor = 1E6
-                case "nA": I_multiplication_factor = 1E9
-                case "pA": I_multiplication_factor = 1E12
-                case "fA": I_multiplication_factor = 1E15
-                case _: I_multiplication_factor = 1
-            if I_multiplication_factor == 1: units["current"] = "A" # Fall back to A
-            
-            # Update the unit in channel_units (which will now be different from default_channel_units)
-            length_channels = [key for key, value in default_channel_units.items() if value == "m"]
-            current_channels = [key for key, value in default_channel_units.items() if value == "A"]
-            for channel in length_channels:
-                if channel in channel_units: channel_units[channel] = units.get("length", "m")
-            for channel in current_channels:
-                if channel in channel_units: channel_units[channel] = units.get("current", "A")
-            filtered_channel_units = {str(key): channel_units[key] for key in channels if key in channel_units} # Remove channels that are not present in the scan
-            channel_units = filtered_channel_units
-            
-            # Rescale the scan data by the multiplication factors determined in the reunitization        
-            #for channel in channels:
-            #    for direction in ["forward", "backward"]:
-            #        if channel in length_channels: scans[channel][direction] = np.array(scans[channel][direction] * L_multiplication_factor, dtype = float)
-            #        elif channel in current_channels: scans[channel][direction] = np.array(scans[channel][direction] * I_multiplication_factor, dtype = float)
-          
-            # Stack the forward and backward scans for each channel in a tensor. Flip the backward scan
-            scan_tensor_uncropped = np.stack([np.stack((np.array(scans[channel]["forward"], dtype = float), np.flip(np.array(scans[channel]["backward"], dtype = float), axis = 1))) for channel in channels])
-            if up_or_down == "down": scan_tensor_uncropped = np.flip(scan_tensor_uncropped, axis = 2) # Flip the scan if it recorded in the upward direction
-            # scan_tensor: axis 0 = direction (0 for forward, 1 for backward); axis 1 = channel; axis 2 and 3 are x and y
-
-            # Determine which rows should be cropped off in case the scan was not completed
-            masked_array = np.isnan(scan_tensor_uncropped[0, 1]) # All channels have the same number of NaN values. The backward scan has more NaN values because the scan always starts in the forward direction.
-            nan_counts = np.array([sum([int(masked_array[j, i]) for i in range(len(masked_array))]) for j in range(len(masked_array[0]))])
-            good_rows = np.where(nan_counts == 0)[0]
-            scan_tensor = np.array([[scan_tensor_uncropped[channel, 0, good_rows], scan_tensor_uncropped[channel, 1, good_rows]] for channel in range(len(channels))])
-            
-            # Recalculate the scan range on the basis of the fraction of leftover lines (after cropping) to lines before cropping
-            [lines, pixels] = np.shape(scan_tensor[0, 0]) # The number of pixels is recalculated on the basis of the scans potentially being cropped
-            scan_range = np.array([scan_range_uncropped[0], scan_range_uncropped[1] * lines / lines_uncropped]) # Recalculate the size of the slow scan direction after cropping
-            scan_range_unitized = [self.ureg.Quantity(range_dim, "m").to("nm") for range_dim in scan_range]
+        return self.sxm.get_scan_object(file_name, units, default_channel_units, lazy = lazy, dtype = dtype)
 
-            # Apply the re-unitization to various attributes in the header
-            setpoint_unitized = self.ureg.Quantity(float(setpoint_str.split()[0]), "A").to("pA")
-            
-            x_center = self.ureg.Quantity(float(offset[0]), "m").to("nm")
-            y_center = self.ureg.Quantity(float(offset[1]), "m").to("nm")
-            angle = self.ureg.Quantity(float(angle), "degree")
-            center = [x_center, y_center]
-            
-            x_nm = x_center.magnitude
-            y_nm = y_center.magnitude
-            center_nm = [dim.magnitude for dim in center]
-            angle_deg = angle.magnitude
-            scan_range_nm = [dim.magnitude for dim in scan_range_unitized]
-            frame = {
-                "x (nm)": x_nm,
-                "y (nm)": y_nm,
-                "center (nm)": center_nm,
-                "offset (nm)": center_nm,                
-                "scan_range (nm)": scan_range_nm,
-                "angle (deg)": angle_deg
-            }
-
-            # Add new attributes to the scan object
-            setattr(scan_object, "default_channel_units", default_channel_units)
-            setattr(scan_object, "channel_units", channel_units)
-            setattr(scan_object, "units", units)
-            setattr(scan_object, "bias", bias_unitized)
-            setattr(scan_object, "channels", channels)
-            setattr(scan_object, "tensor_uncropped", scan_tensor_uncropped) # Uncropped means the size of the scan before deleting the rows that were not recorded
-            setattr(scan_object, "pixels_uncropped", pixels)
-            setattr(scan_object, "lines_uncropped", lines_uncropped)
-            setattr(scan_object, "scan_range_uncropped", scan_range_uncropped)
-            setattr(scan_object, "scan_range_uncropped_unitized", scan_range_uncropped_unitized)
-            setattr(scan_object, "tensor", scan_tensor)
-            setattr(scan_object, "pixels", pixels)
-            setattr(scan_object, "lines", lines)
-            setattr(scan_object, "scan_range", scan_range_unitized)
-            setattr(scan_object, "feedback", feedback)
-            setattr(scan_object, "setpoint", setpoint_unitized)
-            setattr(scan_object, "date_time", dt_object)
-            setattr(scan_object, "angle", angle)
-            setattr(scan_object, "x", x_center)
-            setattr(scan_object, "y", y_center)
-            setattr(scan_object, "center", center)
-            setattr(scan_object, "offset", center)
-            setattr(scan_object, "frame", frame)
-        
-            return (scan_object, error)
-
-        except Exception as e:
-            error = f"Error reading sxm file: {e}"
-            return (error, error)
-
-    def get_spectrum(self, file_name: str) -> tuple[object, bool | str]:
+    def get_spectrum(self, file_name: str, columns: list = None) -> tuple[object, bool | str]:
         error = False
         spec_object = None
         
@@ -1837,19 +3606,19 @@ class IOFunctions:
             error = "Provided file_name was not a valid string"
             return (spec_object, error)
 
-        if not os.path.exists(file_name):
+        if not self.archives.exists(file_name):
             error = f"Error: File \"{file_name}\" does not exist."
             return (spec_object, error)
 
-        root, extension = os.path.splitext(file_name)
+        extension = self.archives.get_extension(file_name)
         if extension != ".dat":
             error = "Error: attempting to open a spectroscopy file that is not a dat file."
             return (spec_object, error)
 
         try:
-            spec_object = nap.read.Spec(file_name)
-            spec_spectra = spec_object.signals
-            spec_header = spec_object.header
+            (spec_header, channels, spectrum_matrix) = self.dat.read_dat(file_name, columns)
+            spec_spectra = dict(zip(channels, spectrum_matrix))
+            spec_object = DATSpectrum(file_name, spec_header, spec_spectra)
 
             spec_coords = np.array([spec_header.get("X (m)", 0), spec_header.get("Y (m)", 0), spec_header.get("Z (m)", 0)], dtype = float)
             
@@ -1862,8 +3631,7 @@ class IOFunctions:
             rec_time = [int(element) for element in spec_time.split(":")]
             dt_object = datetime(rec_date[2], rec_date[1], rec_date[0], rec_time[0], rec_time[1], rec_time[2])
             
-            channels = np.array(list(spec_spectra.keys()), dtype = str)
-            spectrum_matrix = np.array(list(spec_spectra.values()))
+            channels = np.array(channels, dtype = str)
 
             # Add the new attributes to the scan object
             # Redundant attribute names for the coordinates are for ease of use
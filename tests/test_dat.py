@@ -0,0 +1,41 @@
+import os
+import numpy as np
+import nanonispy2 as nap
+from lib.io_functions import IOFunctions
+from benchmarks.fixtures import write_synthetic_dat
+
+
+
+def test_selected_columns_match_nanonispy2(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Bias_001.dat")
+    data = write_synthetic_dat(file_path, points = 32)
+    
+    (header, column_names, matrix) = IOFunctions().dat.read_dat(file_path, columns = ["Current (A)", "Z (m)"])
+    assert column_names == ["Current (A)", "Z (m)"] and matrix.shape == (2, 32)
+    np.testing.assert_allclose(matrix, data[:, [1, 4]].T, rtol = 1E-6)
+    
+    reference = nap.read.Spec(file_path)
+    np.testing.assert_array_equal(matrix[0], reference.signals["Current (A)"])
+    assert header["Date"] == reference.header["Date"]
+
+def test_spectroscopy_object_holds_the_selected_columns(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Bias_001.dat")
+    data = write_synthetic_dat(file_path, points = 32)
+    
+    (spectrum, error) = IOFunctions().get_spectroscopy_object(file_path, columns = ["LI Demod 1 X (A)"])
+    assert not error and list(spectrum.signals) == ["LI Demod 1 X (A)"]
+    np.testing.assert_allclose(spectrum.signals["LI Demod 1 X (A)"], data[:, 2], rtol = 1E-6)
+
+def test_empty_fields_are_read_as_nan(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Bias_001.dat")
+    write_synthetic_dat(file_path, points = 8)
+    
+    # A sweep that was aborted leaves the fields of the last points empty
+    with open(file_path, "rb") as file: lines = file.read().split(b"\r\n")
+    for index in [-3, -2]: lines[index] = b"\t".join([lines[index].split(b"\t")[0]] + [b""] * (len(lines[index].split(b"\t")) - 1))
+    with open(file_path, "wb") as file: file.write(b"\r\n".join(lines))
+    
+    (header, column_names, matrix) = IOFunctions().dat.read_dat(file_path, columns = ["Bias calc (V)", "Current (A)"])
+    assert matrix.shape == (2, 8)
+    assert not np.isnan(matrix[0]).any()
+    assert np.isnan(matrix[1, -2:]).all() and not np.isnan(matrix[1, :-2]).any()
@@ -0,0 +1,43 @@
+import os, shutil
+from lib.io_functions import IOFunctions
+from benchmarks.fixtures import write_synthetic_sxm
+
+
+
+def test_unchanged_file_is_current(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Scan_001.sxm")
+    write_synthetic_sxm(file_path, pixels = 64, lines = 64)
+    io = IOFunctions()
+    assert io.fingerprints.is_current(file_path, io.fingerprints.get(file_path))
+    assert not io.fingerprints.is_current(file_path, None)
+
+def test_write_in_the_middle_is_a_change(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Scan_001.sxm")
+    write_synthetic_sxm(file_path, pixels = 64, lines = 64)
+    io = IOFunctions()
+    fingerprint = io.fingerprints.get(file_path)
+    
+    # A scan that is being recorded keeps its size, and is written in the middle
+    with open(file_path, "r+b") as file:
+        file.seek(os.path.getsize(file_path) // 2)
+        file.write(b"\x00" * 16)
+    os.utime(file_path, ns = (fingerprint["mtime_ns"] + 1, fingerprint["mtime_ns"] + 1))
+    assert os.path.getsize(file_path) == fingerprint["file_size"]
+    assert not io.fingerprints.is_current(file_path, fingerprint)
+
+def test_copy_with_the_same_content_is_current(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Scan_001.sxm")
+    write_synthetic_sxm(file_path, pixels = 64, lines = 64)
+    io = IOFunctions()
+    fingerprint = io.fingerprints.get(file_path)
+    
+    # copy2 keeps the modification time, but the inode changes, so the hash decides
+    copy_path = os.path.join(str(tmp_path), "Copy.sxm")
+    shutil.copy2(file_path, copy_path)
+    assert io.fingerprints.stat(copy_path)["inode"] != fingerprint["inode"]
+    assert io.fingerprints.is_current(copy_path, fingerprint)
+    
+    # A copy of another scan with the same size and modification time is not
+    write_synthetic_sxm(copy_path, pixels = 64, lines = 64, seed = 1)
+    os.utime(copy_path, ns = (fingerprint["mtime_ns"], fingerprint["mtime_ns"]))
+    assert not io.fingerprints.is_current(copy_path, fingerprint)
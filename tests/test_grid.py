@@ -0,0 +1,33 @@
+import os
+import numpy as np
+from lib.io_functions import IOFunctions
+from benchmarks.fixtures import write_synthetic_3ds
+
+
+
+def test_pixel_spectra_match_the_file(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Grid_001.3ds")
+    data = write_synthetic_3ds(file_path, pixels = 8, lines = 6, points = 32)
+    
+    grid = IOFunctions().grid.get_grid(file_path)
+    assert grid.shape == (2, 8, 6, 32) and grid.lines_done == 6
+    np.testing.assert_array_equal(grid[3, 4], data[4, 3, 5:].reshape(2, 32))
+    np.testing.assert_array_equal(grid[:, :, 7][1], data[:, :, 5 + 32 + 7].T)
+    np.testing.assert_allclose(grid.sweep_signal, np.linspace(-1, 1, 32), atol = 1E-6)
+
+def test_unfinished_grid_exposes_its_completed_lines(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Grid_001.3ds")
+    write_synthetic_3ds(file_path, pixels = 8, lines = 6, points = 32, lines_done = 2)
+    
+    grid = IOFunctions().grid.get_grid(file_path)
+    assert grid.lines_done == 2 and grid.shape == (2, 8, 2, 32)
+
+def test_pixel_spectrum_object(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Grid_001.3ds")
+    data = write_synthetic_3ds(file_path, pixels = 8, lines = 6, points = 32)
+    
+    grid = IOFunctions().grid.get_grid(file_path)
+    assert np.allclose(grid.get_position(0, 0), (-1.5, -0.5)) and np.allclose(grid.get_position(7, 5), (3.5, 4.5)) # Center (1, 2) nm, size 5 nm
+    spectrum = grid.get_spectrum(2, 1, lazy = True)
+    assert list(spectrum.signals) == ["Bias (V)", "Current (A)", "LI Demod 1 X (A)"]
+    np.testing.assert_array_equal(spectrum.signals["LI Demod 1 X (A)"], data[1, 2, 5 + 32:])
@@ -0,0 +1,33 @@
+import os
+import numpy as np
+from lib.file_functions import FileFunctions
+from lib.io_functions import HDF5Dataset
+from benchmarks.fixtures import write_synthetic_sxm
+
+
+
+def export(folder: str) -> tuple[FileFunctions, str, np.ndarray]:
+    """ Export a scan to HDF5 and return the scan tensor in nm and pA """
+    (file_path, output_path) = (os.path.join(folder, "Scan_001.sxm"), os.path.join(folder, "Scan_001.hdf5"))
+    write_synthetic_sxm(file_path, pixels = 16, lines = 12)
+    file_functions = FileFunctions()
+    assert not file_functions.h5.export_scan(file_path, output_path)
+    return (file_functions, output_path, np.asarray(file_functions.read_sxm(file_path)["dataset"]))
+
+def test_export_and_read_back(tmp_path):
+    (file_functions, output_path, tensor) = export(str(tmp_path))
+    
+    output = file_functions.read_hdf5(output_path)
+    assert output["axes"] == ["direction", "y", "x"]
+    np.testing.assert_allclose(output["dataset"], tensor[0], rtol = 1E-6) # The default signal is the first channel
+
+def test_lazy_read_back(tmp_path):
+    (file_functions, output_path, tensor) = export(str(tmp_path))
+    
+    output = file_functions.read_hdf5(output_path, lazy = True)
+    dataset = output["dataset"]
+    assert isinstance(dataset, HDF5Dataset) and dataset.shape == tensor.shape
+    assert output["axes_data"]["channels"] == ["Z (nm)", "Current (pA)", "LI_Demod_1_X (pA)", "LI_Demod_1_Y (pA)"]
+    np.testing.assert_allclose(dataset[2, 1], tensor[2, 1], rtol = 1E-6)
+    np.testing.assert_allclose(dataset.get_image(channel = 1, direction = 0, rows = (3, 7)), tensor[1, 0, 3:7], rtol = 1E-6)
+    file_functions.h5_files.close()
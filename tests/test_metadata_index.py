@@ -0,0 +1,52 @@
+import os
+from datetime import datetime
+from lib.io_functions import IOFunctions, MetadataIndex
+from benchmarks.fixtures import write_synthetic_dat
+from benchmarks.bench_incremental_refresh import write_scan, full_refresh
+
+
+
+def write_folder(folder: str) -> None:
+    for index, minute in enumerate([0, 20]): write_scan(folder, index, datetime(2026, 7, 20, 12, minute))
+    for index in range(4): write_synthetic_dat(os.path.join(folder, f"Bias_{index:03d}.dat"), points = 8, position = [index * 1E-9, 2E-9, 3E-9], minute = 10 * index + 5, seed = index)
+
+def test_save_load_round_trip(tmp_path):
+    (io, folder) = (IOFunctions(), str(tmp_path))
+    write_folder(folder)
+    files_dict = full_refresh(io, folder)
+    assert not io.save_files_dict(files_dict, folder)
+    
+    (loaded_files_dict, error) = MetadataIndex(os.path.join(folder, "metadata.sqlite")).load()
+    assert not error
+    for key, single_file_dict in files_dict["scan_files"].items():
+        if not isinstance(single_file_dict, dict): continue
+        loaded = loaded_files_dict["scan_files"][key]
+        for name in ["file_name", "date_time_str", "fingerprint", "channels"]: assert loaded[name] == single_file_dict[name]
+        for name in ["offset (nm)", "scan_range (nm)"]: assert loaded["frame"][name] == list(single_file_dict["frame"][name])
+    for key, single_file_dict in files_dict["spectroscopy_files"].items():
+        if not isinstance(single_file_dict, dict): continue
+        loaded = loaded_files_dict["spectroscopy_files"][key]
+        for name in ["file_name", "date_time_str", "fingerprint", "associated_scan_name", "x (nm)", "y (nm)", "z (nm)"]: assert loaded[name] == single_file_dict[name]
+    
+    # The index answers queries without loading the files_dict
+    index = MetadataIndex(os.path.join(folder, "metadata.sqlite"))
+    assert index.find_spectra(associated_scan_name = "Scan_00001.sxm") == ["Bias_002.dat", "Bias_003.dat"]
+    assert index.find_scans(date_range = ("2026-07-20 12:10:00", "2026-07-20 12:30:00")) == ["Scan_00001.sxm"]
+
+def test_update_replaces_a_single_entry(tmp_path):
+    (io, folder) = (IOFunctions(), str(tmp_path))
+    write_folder(folder)
+    io.save_files_dict(full_refresh(io, folder), folder)
+    
+    index = MetadataIndex(os.path.join(folder, "metadata.sqlite"))
+    (files_dict, error) = index.load()
+    spectrum = files_dict["spectroscopy_files"][0]
+    spectrum.update({"associated_scan_name": "Renamed.sxm"})
+    assert not index.update("spectroscopy_files", 0, spectrum)
+    assert index.load()[0]["spectroscopy_files"][0]["associated_scan_name"] == "Renamed.sxm"
+    assert len(index.find_spectra()) == 4
+
+def test_update_without_an_index_writes_nothing(tmp_path):
+    index = MetadataIndex(os.path.join(str(tmp_path), "metadata.sqlite"))
+    assert not index.update("scan_files", 0, {"file_name": "Scan_00000.sxm"})
+    assert not os.path.exists(index.path)
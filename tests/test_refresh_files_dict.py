@@ -0,0 +1,66 @@
+import os
+from datetime import datetime
+from lib.io_functions import IOFunctions
+from benchmarks.fixtures import write_synthetic_dat
+from benchmarks.bench_incremental_refresh import write_scan, full_refresh, incremental_refresh, associations
+
+
+
+def write_folder(folder: str) -> None:
+    """ Scans at 11:58, 12:10 and 12:30, and a spectrum every 4 minutes from 12:00 to 12:56 """
+    for index, (hour, minute) in enumerate([(11, 58), (12, 10), (12, 30)]): write_scan(folder, index, datetime(2026, 7, 20, hour, minute))
+    for index in range(15): write_synthetic_dat(os.path.join(folder, f"Bias_{index:03d}.dat"), points = 8, minute = 4 * index, seed = index)
+
+def load_index(io: IOFunctions, folder: str) -> dict:
+    """ The files_dict of the folder as load_folder finds it in the saved metadata index """
+    io.save_files_dict(full_refresh(io, folder), folder)
+    (loaded_files_dict, error) = io.load_metadata_file(os.path.join(folder, "metadata.sqlite"))
+    assert not error
+    return loaded_files_dict
+
+def assert_matches_full_refresh(io: IOFunctions, folder: str, loaded_files_dict: dict) -> dict:
+    (files_dict, refresh_time) = incremental_refresh(io, folder, loaded_files_dict)
+    full_files_dict = full_refresh(io, folder)
+    for dict_name in ["scan_files", "spectroscopy_files"]:
+        assert sorted(value["file_name"] for value in files_dict[dict_name].values() if isinstance(value, dict)) == sorted(value["file_name"] for value in full_files_dict[dict_name].values() if isinstance(value, dict))
+    assert associations(files_dict) == associations(full_files_dict)
+    return associations(files_dict)
+
+def test_scan_added(tmp_path):
+    (io, folder) = (IOFunctions(), str(tmp_path))
+    write_folder(folder)
+    loaded_files_dict = load_index(io, folder)
+    write_scan(folder, 3, datetime(2026, 7, 20, 12, 21))
+    assert assert_matches_full_refresh(io, folder, loaded_files_dict)["Bias_006.dat"] == "Scan_00003.sxm" # Recorded at 12:24
+
+def test_scan_removed(tmp_path):
+    (io, folder) = (IOFunctions(), str(tmp_path))
+    write_folder(folder)
+    loaded_files_dict = load_index(io, folder)
+    os.remove(os.path.join(folder, "Scan_00001.sxm"))
+    assert assert_matches_full_refresh(io, folder, loaded_files_dict)["Bias_004.dat"] == "Scan_00000.sxm" # Recorded at 12:16
+
+def test_spectrum_changed(tmp_path):
+    (io, folder) = (IOFunctions(), str(tmp_path))
+    write_folder(folder)
+    loaded_files_dict = load_index(io, folder)
+    write_synthetic_dat(os.path.join(folder, "Bias_000.dat"), points = 8, minute = 40, seed = 0) # Rewritten with a time after the last scan
+    os.utime(os.path.join(folder, "Bias_000.dat"), ns = (0, 1))
+    assert assert_matches_full_refresh(io, folder, loaded_files_dict)["Bias_000.dat"] == "Scan_00002.sxm"
+
+def test_file_renamed(tmp_path):
+    (io, folder) = (IOFunctions(), str(tmp_path))
+    write_folder(folder)
+    loaded_files_dict = load_index(io, folder)
+    os.rename(os.path.join(folder, "Scan_00001.sxm"), os.path.join(folder, "Renamed.sxm"))
+    os.rename(os.path.join(folder, "Bias_014.dat"), os.path.join(folder, "Renamed.dat"))
+    refreshed_associations = assert_matches_full_refresh(io, folder, loaded_files_dict)
+    assert refreshed_associations["Bias_004.dat"] == "Renamed.sxm"
+    assert refreshed_associations["Renamed.dat"] == "Scan_00002.sxm"
+
+def test_associate_spectra_without_scan_times():
+    io = IOFunctions()
+    files_dict = {"scan_files": {0: {"file_name": "A.sxm", "path": "A.sxm", "date_time_str": "2026-07-20 12:00:00"}},
+                  "spectroscopy_files": {0: {"file_name": "B.dat", "date_time_str": "2026-07-20 12:01:00"}}}
+    (files_dict, error) = io.associate_spectra(files_dict, [0])
+    assert not error and files_dict["spectroscopy_files"][0]["associated_scan_name"] == "A.sxm"
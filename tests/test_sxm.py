@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import nanonispy2 as nap
+import pytest
+from lib.file_functions import FileFunctions
+from lib.io_functions import IOFunctions
+from benchmarks.fixtures import write_synthetic_sxm
+
+
+
+@pytest.mark.parametrize("up_or_down", ["up", "down"])
+@pytest.mark.parametrize("reader", [IOFunctions, FileFunctions])
+def test_memory_mapped_read_matches_nanonispy2(tmp_path, up_or_down, reader):
+    file_path = os.path.join(str(tmp_path), "Scan_001.sxm")
+    write_synthetic_sxm(file_path, pixels = 12, lines = 8, up_or_down = up_or_down)
+    
+    file_data = reader().read_sxm(file_path)
+    reference = nap.read.Scan(file_path)
+    assert file_data["axes_data"]["channels"] == ["Z (nm)", "Current (pA)", "LI_Demod_1_X (pA)", "LI_Demod_1_Y (pA)"]
+    assert file_data["dataset"].shape == (4, 2, 8, 12)
+    
+    for channel_index, (name, factor) in enumerate(zip(reference.signals, [1E9, 1E12, 1E12, 1E12])): # m to nm and A to pA
+        for direction_index, direction in enumerate(["forward", "backward"]):
+            image = np.asarray(file_data["dataset"][channel_index, direction_index], dtype = np.float64)
+            # nanonispy2 keeps the file orientation: backward lines from right to left, and the first line at the top for 'down' scans
+            expected = reference.signals[name][direction]
+            if direction == "backward": expected = np.fliplr(expected)
+            if up_or_down == "down": expected = np.flipud(expected)
+            np.testing.assert_allclose(image, expected * factor, rtol = 1E-6)
+
+def test_write_sxm_round_trip(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Scan_001.sxm")
+    payload = write_synthetic_sxm(file_path, pixels = 16, lines = 10, unfinished_lines = 2)
+    
+    # The file holds the payload as written, with the lines that were not recorded as NaN
+    raw = np.asarray(IOFunctions().read_sxm(file_path, convert_to_sct_units = False)["dataset"])
+    oriented = payload.astype(np.float32)
+    oriented[:, 1] = oriented[:, 1, :, ::-1]
+    np.testing.assert_array_equal(raw, oriented[:, :, ::-1])
+    assert np.isnan(raw[:, :, :2]).all() and not np.isnan(raw[:, :, 2:]).any()
+
+def test_write_scan_object_round_trip(tmp_path):
+    file_path = os.path.join(str(tmp_path), "Scan_001.sxm")
+    write_synthetic_sxm(file_path, pixels = 16, lines = 10, up_or_down = "up")
+    
+    # A scan object written back with the header of the original scan is the same scan
+    io = IOFunctions()
+    (scan_object, error) = io.sxm.get_scan_object(file_path)
+    assert not error
+    copy_path = os.path.join(str(tmp_path), "Scan_002.sxm")
+    assert not io.sxm.write_scan_object(copy_path, scan_object)
+    (original, copy) = (io.read_sxm(file_path, convert_to_sct_units = False), io.read_sxm(copy_path, convert_to_sct_units = False))
+    for key in ["pixels", "lines", "channels", "up_or_down", "scan_range (m)", "offset (m)", "angle (deg)"]: assert original[key] == copy[key]
+    np.testing.assert_allclose(np.asarray(copy["dataset"]), np.asarray(original["dataset"]), rtol = 1E-6) # The float32 unit conversion may round the last bit
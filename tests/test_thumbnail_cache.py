@@ -0,0 +1,45 @@
+import os
+import numpy as np
+from lib.file_functions import FileFunctions
+from lib.io_functions import ThumbnailCache
+from benchmarks.fixtures import write_synthetic_folder, write_synthetic_sxm
+
+
+
+def count_decodes(monkeypatch, file_functions: FileFunctions) -> list:
+    """ Record the files that are decoded through get_scan_object """
+    decoded = []
+    get_scan_object = file_functions.sxm.get_scan_object
+    def counting_get_scan_object(file_path, *args, **kwargs):
+        decoded.append(os.path.basename(file_path))
+        return get_scan_object(file_path, *args, **kwargs)
+    monkeypatch.setattr(file_functions.sxm, "get_scan_object", counting_get_scan_object)
+    return decoded
+
+def test_cache_hit_skips_decoding(tmp_path, monkeypatch):
+    file_names = [os.path.basename(file_path) for file_path in write_synthetic_folder(str(tmp_path), n_files = 3, pixels = 64, lines = 64)]
+    ThumbnailCache(FileFunctions(), str(tmp_path), size = 16).build(file_names)
+
+    # A new session loads the thumbnails from the sidecar and decodes nothing to show or rebuild them
+    file_functions = FileFunctions()
+    decoded = count_decodes(monkeypatch, file_functions)
+    thumbnail_cache = ThumbnailCache(file_functions, str(tmp_path), size = 16)
+    thumbnail_cache.build(file_names)
+    preview = thumbnail_cache.get_preview(file_names[1], "Z (nm)")
+    assert decoded == []
+    assert preview.shape == (16, 16) and np.isfinite(preview).all()
+
+def test_changed_scan_is_decoded_again(tmp_path, monkeypatch):
+    file_names = [os.path.basename(file_path) for file_path in write_synthetic_folder(str(tmp_path), n_files = 3, pixels = 64, lines = 64)]
+    file_functions = FileFunctions()
+    thumbnail_cache = ThumbnailCache(file_functions, str(tmp_path), size = 16)
+    thumbnail_cache.build(file_names)
+
+    write_synthetic_sxm(os.path.join(str(tmp_path), file_names[2]), pixels = 32, lines = 32, seed = 7)
+    os.utime(os.path.join(str(tmp_path), file_names[2]), ns = (0, 1)) # A modification time that differs from the one in the cache on any file system
+    assert thumbnail_cache.get_preview(file_names[2], "Z (nm)") is None # Stale previews are never shown
+    
+    decoded = count_decodes(monkeypatch, file_functions)
+    thumbnail_cache.build(file_names)
+    assert decoded == [file_names[2]]
+    assert thumbnail_cache.get_preview(file_names[2], "Z (nm)").shape == (16, 16)